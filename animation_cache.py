@@ -0,0 +1,414 @@
+# animation_cache.py - Cache khung hình animation đã giải mã cho Pet Screen
+import hashlib
+import json
+import os
+import weakref
+from collections import OrderedDict
+from PyQt5.QtGui import QImage, QImageReader, QPixmap
+from PyQt5.QtCore import Qt, QSize, QRect, QObject, QRunnable, QThreadPool, QBuffer, QByteArray, QIODevice, pyqtSignal
+from config import DEFAULT_SETTINGS, ASSETS_DIR, ATLAS_DIR, ACTIVITIES
+from pet_log import get_logger
+
+log = get_logger(__name__)
+
+# Thời gian mặc định cho một khung hình khi GIF không ghi delay
+DEFAULT_FRAME_DELAY_MS = 100
+
+
+# Hash nội dung đã tính: path -> (mtime_ns, size, digest)
+_content_hashes = {}
+
+
+def content_hash(path):
+    """Hash SHA-1 nội dung file, chỉ đọc lại khi file đổi mtime/kích thước"""
+    st = os.stat(path)
+    cached = _content_hashes.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    _content_hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+class DirectoryIndex:
+    """Chỉ mục một thư mục animation, xây bằng đúng một lần quét
+
+    Ánh xạ hoạt động -> các biến thể GIF và file -> hash nội dung.
+    """
+    def __init__(self, path, mtime_ns):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.gif_files = []
+        self.by_activity = {anim_type: [] for anim_type in ACTIVITIES}
+        self.hashes = {}
+        with os.scandir(path) as entries:
+            names = sorted(e.name for e in entries if e.name.endswith('.gif') and e.is_file())
+        for name in names:
+            file_path = os.path.join(path, name)
+            self.gif_files.append(file_path)
+            self.hashes[file_path] = content_hash(file_path)
+            for anim_type in ACTIVITIES:
+                if name.startswith(f"{anim_type}_"):
+                    self.by_activity[anim_type].append(file_path)
+
+    def variants(self, anim_type):
+        return self.by_activity.get(anim_type, [])
+
+
+# Chỉ mục dùng chung cho mọi AnimationManager: thư mục -> DirectoryIndex
+_directory_indexes = {}
+
+
+def directory_index(path):
+    """Lấy chỉ mục của thư mục, chỉ quét lại khi mtime thư mục thay đổi (None nếu không tồn tại)"""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        _directory_indexes.pop(path, None)
+        return None
+    index = _directory_indexes.get(path)
+    if index is None or index.mtime_ns != mtime_ns:
+        index = DirectoryIndex(path, mtime_ns)
+        _directory_indexes[path] = index
+    return index
+
+
+class FrameSet:
+    """Một chuỗi khung hình đã scale sẵn cùng thời gian hiển thị từng khung"""
+    # Mọi FrameSet còn sống (kể cả đã bị loại khỏi cache nhưng pet vẫn đang phát)
+    _live = weakref.WeakSet()
+
+    def __init__(self, frames, delays):
+        self.frames = frames
+        self.delays = delays
+        self.nbytes = sum(f.width() * f.height() * 4 for f in frames)
+        FrameSet._live.add(self)
+
+    @classmethod
+    def live_stats(cls):
+        """Số FrameSet còn sống và tổng số byte chúng giữ"""
+        live = list(cls._live)
+        return len(live), sum(fs.nbytes for fs in live)
+
+    def __len__(self):
+        return len(self.frames)
+
+    @classmethod
+    def from_images(cls, images, delays):
+        """Tạo FrameSet từ QImage (QPixmap chỉ được tạo trên luồng GUI)"""
+        return cls([QPixmap.fromImage(image) for image in images], list(delays))
+
+
+def bundle_name(path):
+    """Tên file trong gói asset ứng với đường dẫn trên đĩa (assets/animations/cat/x.gif -> animations/cat/x.gif)"""
+    return os.path.relpath(path, ASSETS_DIR).replace(os.sep, '/')
+
+
+def decode_gif_images(path, width, height):
+    """Đọc và scale toàn bộ khung hình của một GIF thành QImage + delay ms (an toàn khi chạy ở luồng phụ)"""
+    return _read_frames(QImageReader(path), width, height)
+
+
+def decode_gif_bytes(data, width, height):
+    """Như decode_gif_images nhưng đọc thẳng từ bytes/memoryview (ví dụ vùng nhớ mmap của gói asset)
+
+    QByteArray.fromRawData trỏ thẳng vào vùng nhớ của data (không copy); data được giữ tới khi
+    đọc xong mọi khung hình vì QImage giải mã ra là bản riêng.
+    """
+    raw = QByteArray.fromRawData(data)
+    buffer = QBuffer(raw)
+    buffer.open(QIODevice.ReadOnly)
+    frames = _read_frames(QImageReader(buffer, b'gif'), width, height)
+    buffer.close()
+    return frames
+
+
+def _read_frames(reader, width, height):
+    reader.setScaledSize(QSize(width, height))
+    images = []
+    delays = []
+    while reader.canRead():
+        image = reader.read()
+        if image.isNull():
+            break
+        delay = reader.nextImageDelay()
+        images.append(image)
+        delays.append(delay if delay > 0 else DEFAULT_FRAME_DELAY_MS)
+    return images, delays
+
+
+def decode_gif(path, width, height):
+    """Đọc và scale toàn bộ khung hình của một GIF (trả về QPixmap + delay ms)"""
+    return FrameSet.from_images(*decode_gif_images(path, width, height))
+
+
+class _DecodeSignals(QObject):
+    finished = pyqtSignal(object, object)  # key, (images, delays) hoặc None nếu lỗi
+
+
+class _DecodeJob(QRunnable):
+    """Chạy decoder trên QThreadPool, báo kết quả về luồng GUI qua signal"""
+    def __init__(self, key, decoder, signals):
+        super().__init__()
+        self.key = key
+        self.decoder = decoder
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = self.decoder()
+        except Exception as e:
+            log.error("Lỗi khi giải mã nền: %s", e)
+            result = None
+        self.signals.finished.emit(self.key, result)
+
+
+class FrameCache:
+    """Cache LRU các FrameSet theo (nội dung GIF, kích thước), giới hạn theo tổng số byte"""
+    def __init__(self, budget_bytes=None):
+        if budget_bytes is None:
+            budget_bytes = DEFAULT_SETTINGS['frame_cache_budget_bytes']
+        self.budget_bytes = budget_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        # Thống kê tra cứu/loại bỏ (xem stats())
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        # Giải mã nền: key đang chạy -> danh sách callback chờ kết quả
+        self._pending = {}
+        self._signals = None
+
+    def get(self, key):
+        """Lấy FrameSet đã cache (đánh dấu vừa dùng), None nếu chưa có"""
+        frame_set = self._entries.get(key)
+        if frame_set is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+        return frame_set
+
+    def put(self, key, frame_set):
+        """Thêm FrameSet vào cache rồi loại bớt mục cũ nếu vượt ngân sách"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old.nbytes
+        self._entries[key] = frame_set
+        self.total_bytes += frame_set.nbytes
+        self._evict()
+
+    def get_or_decode(self, path, width, height, content_key=None, decoder=None):
+        """Trả về khung hình của GIF ở kích thước cho trước, chỉ giải mã khi chưa có
+
+        Nếu có content_key (hash nội dung), các file giống hệt nhau dùng chung một FrameSet.
+        decoder (nếu có) trả về (QImage, delay) thay cho việc đọc GIF, ví dụ cắt khung từ sprite atlas.
+        """
+        key = (content_key or path, width, height)
+        frame_set = self.get(key)
+        if frame_set is None:
+            if decoder is None:
+                images, delays = decode_gif_images(path, width, height)
+            else:
+                images, delays = decoder()
+            if not images:
+                return None
+            frame_set = FrameSet.from_images(images, delays)
+            self.put(key, frame_set)
+        return frame_set
+
+    def request(self, path, width, height, callback, content_key=None, decoder=None):
+        """Như get_or_decode nhưng giải mã trên QThreadPool nếu chưa có trong cache
+
+        Trả về FrameSet ngay nếu đã cache; nếu không trả về None và gọi callback(frame_set)
+        trên luồng GUI khi giải mã xong (frame_set là None nếu thất bại).
+        Nhiều yêu cầu cùng key chỉ giải mã một lần.
+        """
+        key = (content_key or path, width, height)
+        frame_set = self.get(key)
+        if frame_set is not None:
+            return frame_set
+        if key in self._pending:
+            self._pending[key].append(callback)
+            return None
+        if decoder is None:
+            decoder = lambda: decode_gif_images(path, width, height)
+        if self._signals is None:
+            self._signals = _DecodeSignals()
+            self._signals.finished.connect(self._on_decoded)
+        self._pending[key] = [callback]
+        QThreadPool.globalInstance().start(_DecodeJob(key, decoder, self._signals))
+        return None
+
+    def _on_decoded(self, key, result):
+        callbacks = self._pending.pop(key, [])
+        frame_set = None
+        if result and result[0]:
+            frame_set = FrameSet.from_images(*result)
+            self.put(key, frame_set)
+        for callback in callbacks:
+            try:
+                callback(frame_set)
+            except Exception as e:
+                log.error("Lỗi trong callback giải mã: %s", e)
+
+    def set_budget(self, budget_bytes):
+        """Đổi ngân sách bộ nhớ và loại bớt ngay nếu cần"""
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def items(self):
+        """Các cặp (key, FrameSet) đang cache, cũ nhất trước (không tính là lượt truy cập)"""
+        return list(self._entries.items())
+
+    def stats(self):
+        """Số liệu tổng của cache: byte đang giữ, ngân sách, tỉ lệ trúng, số lần loại bỏ"""
+        lookups = self.hits + self.misses
+        live_sets, live_bytes = FrameSet.live_stats()
+        return {
+            'entries': len(self._entries),
+            'total_bytes': self.total_bytes,
+            'budget_bytes': self.budget_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes,
+            'pending_decodes': len(self._pending),
+            'live_frame_sets': live_sets,
+            'live_frame_bytes': live_bytes,
+        }
+
+    def _evict(self):
+        # Luôn giữ lại mục mới nhất kể cả khi một mình nó đã vượt ngân sách
+        while self.total_bytes > self.budget_bytes and len(self._entries) > 1:
+            _, frame_set = self._entries.popitem(last=False)
+            self.total_bytes -= frame_set.nbytes
+            self.evictions += 1
+            self.evicted_bytes += frame_set.nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+# Cache dùng chung cho mọi AnimationManager trong process
+_shared_cache = None
+
+
+def shared_frame_cache():
+    """Cache khung hình dùng chung (tạo lần đầu khi cần)"""
+    global _shared_cache
+    if _shared_cache is None:
+        _shared_cache = FrameCache()
+    return _shared_cache
+
+
+class SpriteAtlas:
+    """Sprite sheet của một pet: một ảnh chứa mọi khung hình + manifest vị trí/delay
+
+    Được tạo sẵn bởi scripts/make_5frame_gifs.py (stage atlas).
+    """
+    def __init__(self, manifest, image):
+        self.manifest = manifest
+        self.image = image
+        self.sequences = manifest.get('sequences', {})
+        self.activities = manifest.get('activities', {})
+        self.sizes = sorted(tuple(size) for size in manifest.get('sizes', []))
+
+    def has_sequence(self, content_key):
+        return content_key in self.sequences
+
+    def frame_images(self, content_key, width, height):
+        """Cắt khung hình (QImage) ở kích thước yêu cầu; nếu atlas không có sẵn size đó thì scale từ size gần nhất"""
+        sequence = self.sequences[content_key]
+        rects = sequence['frames'].get(f'{width}x{height}')
+        scale = rects is None
+        if scale:
+            base = next((s for s in self.sizes if s[0] >= width and s[1] >= height), self.sizes[-1])
+            rects = sequence['frames'][f'{base[0]}x{base[1]}']
+        images = []
+        for x, y, w, h in rects:
+            image = self.image.copy(QRect(x, y, w, h))
+            if scale:
+                image = image.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            images.append(image)
+        return images, list(sequence['durations'])
+
+
+# Atlas đã load: đường dẫn manifest -> SpriteAtlas (None nếu không có/không hợp lệ)
+_atlases = {}
+
+
+def _activity_gif(name):
+    return name.endswith('.gif') and any(name.startswith(f"{anim_type}_") for anim_type in ACTIVITIES)
+
+
+def _source_hashes(animations_path, bundle=None):
+    """Hash các GIF hoạt động hiện có (tên file -> SHA-1), từ gói asset hoặc thư mục; None nếu không có nguồn"""
+    if bundle is not None:
+        packed_dir = bundle_name(animations_path)
+        return {name: bundle.content_hash(f"{packed_dir}/{name}")
+                for name in bundle.listdir(packed_dir) if _activity_gif(name)} or None
+    index = directory_index(animations_path)
+    if index is None:
+        return None
+    return {os.path.basename(path): digest for path, digest in index.hashes.items()
+            if _activity_gif(os.path.basename(path))} or None
+
+
+def _atlas_is_current(manifest, animations_path, bundle=None):
+    """Atlas chỉ dùng được khi hash GIF đầu vào ghi trong manifest khớp với GIF hiện tại"""
+    current = _source_hashes(animations_path, bundle)
+    if current is None:
+        # Không có GIF nào để so (chỉ có atlas): không có gì để atlas bị cũ so với
+        return True
+    built = {name: digest for files in manifest.get('activities', {}).values() for name, digest in files.items()}
+    return built == current
+
+
+def load_atlas(pet_type, atlas_dir=ATLAS_DIR, bundle=None, animations_path=None):
+    """Load sprite atlas của pet một lần cho cả process, trả về None nếu chưa build hoặc đã cũ
+
+    Nếu có gói asset chứa atlas, đọc manifest + ảnh thẳng từ vùng nhớ mmap. Atlas bị bỏ qua
+    (kèm cảnh báo) khi GIF trong animations_path đã đổi so với lúc build atlas.
+    """
+    if animations_path is None:
+        animations_path = os.path.join(ASSETS_DIR, 'animations', pet_type)
+    manifest_path = os.path.join(atlas_dir, f"{pet_type}.json")
+    if manifest_path in _atlases:
+        return _atlases[manifest_path]
+    atlas = None
+    packed_manifest = bundle_name(manifest_path)
+    if bundle is not None and packed_manifest in bundle:
+        manifest = json.loads(str(bundle.read(packed_manifest), 'utf-8'))
+        packed_image = bundle_name(os.path.join(atlas_dir, manifest['image']))
+        image = QImage()
+        if not _atlas_is_current(manifest, animations_path, bundle):
+            log.warning("Sprite atlas %s cũ hơn GIF trong gói asset, bỏ qua", packed_manifest)
+        elif packed_image in bundle:
+            # Giải mã thẳng trên vùng nhớ mmap (fromRawData không copy); QImage kết quả là bản riêng
+            view = bundle.read(packed_image)
+            image = QImage.fromData(QByteArray.fromRawData(view))
+        if not image.isNull() and manifest.get('sizes'):
+            atlas = SpriteAtlas(manifest, image)
+    elif os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if not _atlas_is_current(manifest, animations_path):
+            log.warning("Sprite atlas %s cũ hơn GIF trong %s, bỏ qua (chạy lại scripts/make_5frame_gifs.py --stage atlas)",
+                        manifest_path, animations_path)
+        else:
+            image = QImage(os.path.join(atlas_dir, manifest['image']))
+            if not image.isNull() and manifest.get('sizes'):
+                atlas = SpriteAtlas(manifest, image)
+    _atlases[manifest_path] = atlas
+    return atlas
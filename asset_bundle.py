@@ -0,0 +1,115 @@
+# asset_bundle.py - Gói asset một file (đọc qua mmap) cho Pet Screen
+#
+# Định dạng:
+#   8 byte   magic b'PETPACK1'
+#   4 byte   độ dài bảng (uint32 little-endian)
+#   N byte   bảng JSON: {"files": {"animations/cat/idle_1.gif": [offset, length, sha1], ...}}
+#   ...      dữ liệu; offset tính từ đầu vùng dữ liệu, nội dung trùng nhau chỉ lưu một lần
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from config import ASSET_BUNDLE
+from pet_log import get_logger
+
+log = get_logger(__name__)
+
+BUNDLE_MAGIC = b'PETPACK1'
+_HEADER = struct.Struct('<8sI')
+
+
+class AssetBundle:
+    """Đọc file gói asset bằng mmap: tra bảng offset rồi cắt trực tiếp trên vùng nhớ đã map"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, table_len = _HEADER.unpack_from(self._map, 0)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f"{path} không phải gói asset hợp lệ")
+            table = json.loads(self._map[_HEADER.size:_HEADER.size + table_len].decode('utf-8'))
+        except Exception:
+            self._file.close()
+            raise
+        self._data_start = _HEADER.size + table_len
+        self.files = table.get('files', {})
+
+    def __contains__(self, name):
+        return name in self.files
+
+    def read(self, name):
+        """memoryview trỏ thẳng vào vùng nhớ đã map (không copy, không file tạm)"""
+        offset, length = self.files[name][:2]
+        start = self._data_start + offset
+        return memoryview(self._map)[start:start + length]
+
+    def content_hash(self, name):
+        return self.files[name][2]
+
+    def listdir(self, directory):
+        """Tên các file nằm trực tiếp trong một thư mục ảo của gói"""
+        prefix = directory.rstrip('/') + '/'
+        return sorted(n[len(prefix):] for n in self.files if n.startswith(prefix) and '/' not in n[len(prefix):])
+
+    def close(self):
+        try:
+            self._map.close()
+        finally:
+            self._file.close()
+
+
+def write_bundle(path, root, names):
+    """Ghi các file (đường dẫn tương đối so với root, dạng posix) thành một gói asset"""
+    table = {}
+    blobs = []
+    offsets = {}
+    size = 0
+    for name in sorted(names):
+        with open(os.path.join(root, name), 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha1(data).hexdigest()
+        if digest not in offsets:
+            offsets[digest] = size
+            blobs.append(data)
+            size += len(data)
+        table[name] = [offsets[digest], len(data), digest]
+    header = json.dumps({'files': table}, separators=(',', ':')).encode('utf-8')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(BUNDLE_MAGIC, len(header)))
+        f.write(header)
+        for data in blobs:
+            f.write(data)
+    os.replace(tmp_path, path)
+    return len(table), len(blobs), size
+
+
+_bundle = None
+_bundle_loaded = False
+
+
+def open_asset_bundle():
+    """Gói asset dùng chung cho cả process (None nếu không có → dùng thư mục assets/)
+
+    Khi chạy từ exe PyInstaller, gói nằm trong thư mục giải nén sys._MEIPASS.
+    """
+    global _bundle, _bundle_loaded
+    if _bundle_loaded:
+        return _bundle
+    _bundle_loaded = True
+    candidates = [ASSET_BUNDLE]
+    if hasattr(sys, '_MEIPASS'):
+        candidates.insert(0, os.path.join(sys._MEIPASS, ASSET_BUNDLE))
+    for path in candidates:
+        if os.path.exists(path):
+            try:
+                _bundle = AssetBundle(path)
+                log.info("Đã mở gói asset %s (%s file)", path, len(_bundle.files))
+                break
+            except Exception as e:
+                log.error("Lỗi khi mở gói asset %s: %s", path, e)
+    return _bundle
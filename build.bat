@@ -5,7 +5,7 @@ echo    Building Pet Screen Demo...
 echo ========================================
 
 echo.
-echo [1/5] Checking free disk space on TEMP drive...
+echo [1/6] Checking free disk space on TEMP drive...
 for /f "tokens=3" %%a in ('dir /-c "%TEMP%" ^| find "bytes free"') do set FREEBYTES=%%a
 echo Free bytes on TEMP drive: %FREEBYTES%
 rem Canh bao neu duoi ~1.5GB (1500000000). Onefile can du cho de nen archive khi build.
@@ -19,22 +19,41 @@ if %FREEBYTES% LSS 1500000000 (
 )
 
 echo.
-echo [2/5] Cleaning previous builds...
+echo [2/6] Cleaning previous builds...
 if exist "build" rmdir /s /q "build"
 if exist "dist" rmdir /s /q "dist"
 if exist "*.spec" del /q "*.spec"
 
 echo.
-echo [3/5] Cleaning stale PyInstaller temp folders (_MEI*)...
+echo [3/6] Cleaning stale PyInstaller temp folders (_MEI*)...
 for /d %%d in ("%TEMP%\_MEI*") do rmdir /s /q "%%d" 2>nul
 
 echo.
-echo [4/5] Building with PyInstaller...
+echo [4/6] Building sprite atlases and packing assets into assets.pack...
+rem Build lai atlas tu GIF hien tai (bo qua pet khong doi) truoc khi dong goi, de atlas khong bi cu.
+python scripts\make_5frame_gifs.py --stage atlas
+if errorlevel 1 (
+    echo.
+    echo [LOI] Khong build duoc sprite atlas
+    pause
+    exit /b 1
+)
+rem Mot file duy nhat (doc bang mmap) thay cho hang chuc file GIF phai giai nen ra %%TEMP%%.
+python scripts\make_5frame_gifs.py --stage pack
+if errorlevel 1 (
+    echo.
+    echo [LOI] Khong dong goi duoc assets.pack
+    pause
+    exit /b 1
+)
+
+echo.
+echo [5/6] Building with PyInstaller...
 rem --clean: xoa cache PyInstaller; --noconfirm: khong hoi de ghi de;
 rem --noupx: tat nen UPX (tranh loi giai nen / bi antivirus chan).
 pyinstaller --onefile --windowed --clean --noconfirm --noupx ^
     --name "Pet_Screen" ^
-    --add-data "assets;assets" ^
+    --add-data "assets.pack;." ^
     --add-data "config.py;." ^
     --add-data "pet_python.py;." ^
     demo.py
@@ -48,7 +67,7 @@ if not exist "dist\Pet_Screen.exe" (
 )
 
 echo.
-echo [5/5] Build completed!
+echo [6/6] Build completed!
 echo.
 echo File location: dist\Pet_Screen.exe
 echo File size:
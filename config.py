@@ -1,6 +1,9 @@
 # config.py - Cấu hình cho Pet Screen
 import json
 import os
+from pet_log import get_logger, LEVELS
+
+log = get_logger(__name__)
 
 # Các loại pet được hỗ trợ
 SUPPORTED_PETS = {
@@ -31,6 +34,15 @@ SUPPORTED_PETS = {
     }
 }
 
+# Thư mục asset gốc
+ASSETS_DIR = "assets"
+
+# Thư mục sprite atlas đã build sẵn (scripts/make_5frame_gifs.py --stage atlas)
+ATLAS_DIR = "assets/atlases"
+
+# Gói asset một file (scripts/make_5frame_gifs.py --stage pack); nếu không có sẽ đọc thư mục assets/
+ASSET_BUNDLE = "assets.pack"
+
 # Các loại hoạt động
 ACTIVITIES = {
     'idle': {
@@ -81,7 +93,13 @@ DEFAULT_SETTINGS = {
     'window_flags': 'frameless|topmost|tool',
     'background_transparent': True,
     'speech_interval': (8000, 15000),  # 8-15 giây
-    'speech_duration': 8000  # 3 giây hiển thị lời nói
+    'speech_duration': 8000,  # 3 giây hiển thị lời nói
+    'frame_cache_budget_bytes': 32 * 1024 * 1024,  # Giới hạn bộ nhớ cho khung hình đã giải mã
+    'render_mode': 'window',  # 'window' hoặc 'overlay' (một cửa sổ trong suốt mỗi màn hình vẽ mọi pet)
+    'log_level': 'INFO',  # 'DEBUG', 'INFO', 'WARNING', 'ERROR' hoặc 'OFF'
+    'batch_physics': True,  # PetWorld bước vật lý mọi pet bằng mảng NumPy (nếu có NumPy)
+    'pet_collisions': True,  # Pet đang bị ném va vào pet khác thì hất pet đó đi
+    'surface_provider': 'auto'  # Nguồn cửa sổ làm mặt đứng: 'auto', 'x11', 'fake' hoặc 'none'
 }
 
 # Cài đặt hiển thị
@@ -162,31 +180,31 @@ class ConfigManager:
             if os.path.exists(self.config_file):
                 with open(self.config_file, 'r', encoding='utf-8') as f:
                     config = json.load(f)
-                    print(f"Đã tải cấu hình từ {self.config_file}")
+                    log.info("Đã tải cấu hình từ %s", self.config_file)
                     return config
             else:
-                print(f"File cấu hình {self.config_file} không tồn tại, tạo cấu hình mặc định")
+                log.warning("File cấu hình %s không tồn tại, tạo cấu hình mặc định", self.config_file)
                 return self.get_default_config()
         except Exception as e:
-            print(f"Lỗi khi tải cấu hình: {e}")
+            log.error("Lỗi khi tải cấu hình: %s", e)
             return self.get_default_config()
     
     def reload_config(self):
         """Reload lại cấu hình từ file"""
         try:
             self.config = self.load_config()
-            print(f"Đã reload cấu hình từ {self.config_file}")
+            log.info("Đã reload cấu hình từ %s", self.config_file)
         except Exception as e:
-            print(f"Lỗi khi reload cấu hình: {e}")
+            log.error("Lỗi khi reload cấu hình: %s", e)
     
     def save_config(self):
         """Lưu cấu hình vào file"""
         try:
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(self.config, f, indent=2, ensure_ascii=False)
-            print(f"Đã lưu cấu hình vào {self.config_file}")
+            log.info("Đã lưu cấu hình vào %s", self.config_file)
         except Exception as e:
-            print(f"Lỗi khi lưu cấu hình: {e}")
+            log.error("Lỗi khi lưu cấu hình: %s", e)
     
     def get_default_config(self):
         """Lấy cấu hình mặc định"""
@@ -198,6 +216,13 @@ class ConfigManager:
             'speech_interval': DEFAULT_SETTINGS['speech_interval'],
             'speech_duration': DEFAULT_SETTINGS['speech_duration'],
             'custom_speeches': DEFAULT_SPEECH,  # Thêm câu nói tùy chỉnh
+            'animation_fps': DEFAULT_SETTINGS['animation_fps'],
+            'render_mode': DEFAULT_SETTINGS['render_mode'],
+            'log_level': DEFAULT_SETTINGS['log_level'],
+            'batch_physics': DEFAULT_SETTINGS['batch_physics'],
+            'pet_collisions': DEFAULT_SETTINGS['pet_collisions'],
+            'surface_provider': DEFAULT_SETTINGS['surface_provider'],
+            'frame_cache_budget_mb': DEFAULT_SETTINGS['frame_cache_budget_bytes'] // (1024 * 1024),
             'activity_emojis': {  # Emoji cho từng hoạt động
                 'idle': '😊',
                 'walk': '🚶‍♂️',
@@ -256,6 +281,48 @@ class ConfigManager:
             'height': self.get('pet_height', PET_SIZE_SETTINGS['default_height'])
         }
     
+    def get_frame_cache_budget(self):
+        """Ngân sách bộ nhớ (byte) cho khung hình đã giải mã, đọc từ 'frame_cache_budget_mb'"""
+        try:
+            budget_mb = float(self.get('frame_cache_budget_mb', 0))
+            if budget_mb > 0:
+                return int(budget_mb * 1024 * 1024)
+        except (TypeError, ValueError):
+            log.warning("Giá trị frame_cache_budget_mb không hợp lệ, dùng mặc định")
+        return DEFAULT_SETTINGS['frame_cache_budget_bytes']
+
+    def get_animation_fps(self):
+        """Tần số vẽ (lần/giây) của vòng lặp khung hình, đọc từ 'animation_fps'"""
+        try:
+            return max(10, min(240, int(self.get('animation_fps', DEFAULT_SETTINGS['animation_fps']))))
+        except (TypeError, ValueError):
+            log.warning("Giá trị animation_fps không hợp lệ, dùng mặc định")
+            return DEFAULT_SETTINGS['animation_fps']
+
+    def get_render_mode(self):
+        """Chế độ vẽ: 'window' (mỗi pet một cửa sổ) hoặc 'overlay' (một cửa sổ phủ mỗi màn hình)"""
+        mode = self.get('render_mode', DEFAULT_SETTINGS['render_mode'])
+        return mode if mode in ('window', 'overlay') else DEFAULT_SETTINGS['render_mode']
+
+    def get_batch_physics(self):
+        """Có bước vật lý gộp (physics_batch) cho các pet trong PetWorld hay không"""
+        return bool(self.get('batch_physics', DEFAULT_SETTINGS['batch_physics']))
+
+    def get_pet_collisions(self):
+        """Pet đang bị ném có va chạm với các pet khác trong PetWorld hay không"""
+        return bool(self.get('pet_collisions', DEFAULT_SETTINGS['pet_collisions']))
+
+    def get_surface_provider(self):
+        """Nguồn cửa sổ desktop cho mặt đứng của pet ('none' để pet chỉ đứng trên taskbar)"""
+        provider = str(self.get('surface_provider', DEFAULT_SETTINGS['surface_provider'])).lower()
+        return provider if provider in ('auto', 'x11', 'fake', 'none') else DEFAULT_SETTINGS['surface_provider']
+
+    def get_log_level(self):
+        """Cấp độ log, biến môi trường PET_LOG_LEVEL được ưu tiên hơn 'log_level' trong file cấu hình"""
+        level = os.environ.get('PET_LOG_LEVEL') or self.get('log_level', DEFAULT_SETTINGS['log_level'])
+        level = str(level).upper()
+        return level if level in LEVELS else DEFAULT_SETTINGS['log_level']
+
     def get_auto_start(self):
         """Lấy trạng thái auto-start"""
         return self.get('auto_start', False)
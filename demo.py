@@ -5,8 +5,11 @@ from pathlib import Path
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, QPushButton, QLabel, QComboBox, QSlider, QGroupBox, QGridLayout, QTextEdit, QSystemTrayIcon, QMenu, QAction, QCheckBox
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QIcon
-from pet_python import Pet
-from config import SUPPORTED_PETS, ACTIVITIES, PET_SIZE_SETTINGS, ConfigManager
+from pet_world import PetWorld
+from config import SUPPORTED_PETS, ACTIVITIES, PET_SIZE_SETTINGS, DISPLAY_SETTINGS, ConfigManager
+from pet_log import get_logger, set_log_level
+
+log = get_logger(__name__)
 
 # Các hành động cho phép điều khiển thủ công (loại trừ 'fall'/'die' vì là trạng thái phụ)
 MANUAL_ACTIVITIES = ['idle', 'walk', 'run', 'jump', 'fly', 'climb']
@@ -19,9 +22,11 @@ class PetCharacter(QMainWindow):
         
         # Khởi tạo config manager
         self.config_manager = ConfigManager()
+        set_log_level(self.config_manager.get_log_level())
         
-        # Khởi tạo pet
+        # Khởi tạo pet: pet chính + các pet phụ đều nằm trong một PetWorld (chung vòng lặp và asset)
         self.pet = None
+        self.world = PetWorld(controller=self, config_manager=self.config_manager)
         
         # Tải cấu hình từ file
         pet_settings = self.config_manager.get_pet_settings()
@@ -45,7 +50,7 @@ class PetCharacter(QMainWindow):
         try:
             # Kiểm tra xem system tray có được hỗ trợ không
             if not QSystemTrayIcon.isSystemTrayAvailable():
-                print("System tray không được hỗ trợ trên hệ thống này")
+                log.warning("System tray không được hỗ trợ trên hệ thống này")
                 self.tray_icon = None
                 return
             
@@ -108,7 +113,7 @@ class PetCharacter(QMainWindow):
             self.tray_icon.show()
             
         except Exception as e:
-            print(f"Lỗi khi khởi tạo system tray: {e}")
+            log.error("Lỗi khi khởi tạo system tray: %s", e)
     
     def show_window(self):
         """Hiện cửa sổ từ system tray"""
@@ -117,7 +122,7 @@ class PetCharacter(QMainWindow):
             self.activateWindow()
             self.raise_()
         except Exception as e:
-            print(f"Lỗi khi hiện cửa sổ: {e}")
+            log.error("Lỗi khi hiện cửa sổ: %s", e)
     
     def hide_window(self):
         """Ẩn cửa sổ xuống system tray"""
@@ -132,7 +137,7 @@ class PetCharacter(QMainWindow):
                     3000  # Hiển thị 3 giây
                 )
         except Exception as e:
-            print(f"Lỗi khi ẩn cửa sổ: {e}")
+            log.error("Lỗi khi ẩn cửa sổ: %s", e)
     
     def toggle_pet(self):
         """Chuyển đổi hiện/ẩn pet"""
@@ -153,23 +158,19 @@ class PetCharacter(QMainWindow):
                             action.setText("Ẩn Pet")
                             break
         except Exception as e:
-            print(f"Lỗi khi chuyển đổi pet: {e}")
+            log.error("Lỗi khi chuyển đổi pet: %s", e)
     
     def quit_application(self):
         """Thoát ứng dụng"""
         try:
             self.save_settings()
-            if self.pet:
-                if hasattr(self.pet, 'cleanup'):
-                    self.pet.cleanup()
-                else:
-                    self.pet.close()
-                self.pet = None
+            self.world.clear()
+            self.pet = None
             if self.tray_icon:
                 self.tray_icon.hide()
             QApplication.quit()
         except Exception as e:
-            print(f"Lỗi khi thoát ứng dụng: {e}")
+            log.error("Lỗi khi thoát ứng dụng: %s", e)
     
     def tray_icon_activated(self, reason):
         """Xử lý sự kiện click vào tray icon"""
@@ -178,7 +179,7 @@ class PetCharacter(QMainWindow):
                 # Double click để hiện cửa sổ
                 self.show_window()
         except Exception as e:
-            print(f"Lỗi khi xử lý sự kiện tray icon: {e}")
+            log.error("Lỗi khi xử lý sự kiện tray icon: %s", e)
     
     def init_ui(self):
         """Khởi tạo giao diện"""
@@ -339,6 +340,50 @@ class PetCharacter(QMainWindow):
             control_group.setLayout(control_layout)
             layout.addWidget(control_group)
 
+            # Nhiều pet cùng lúc (cùng loại và kích thước đang chọn)
+            crowd_group = QGroupBox("Nhiều Pet")
+            crowd_layout = QHBoxLayout()
+
+            self.add_pet_btn = QPushButton("Thêm Pet")
+            self.add_pet_btn.clicked.connect(self.add_extra_pet)
+            self.add_pet_btn.setStyleSheet("""
+                QPushButton {
+                    background-color: #16a085;
+                    color: white;
+                    border: none;
+                    padding: 8px 16px;
+                    border-radius: 4px;
+                    font-weight: bold;
+                }
+                QPushButton:hover {
+                    background-color: #138d75;
+                }
+            """)
+            crowd_layout.addWidget(self.add_pet_btn)
+
+            self.remove_pets_btn = QPushButton("Xóa Pet Phụ")
+            self.remove_pets_btn.clicked.connect(self.remove_extra_pets)
+            self.remove_pets_btn.setStyleSheet("""
+                QPushButton {
+                    background-color: #7f8c8d;
+                    color: white;
+                    border: none;
+                    padding: 8px 16px;
+                    border-radius: 4px;
+                    font-weight: bold;
+                }
+                QPushButton:hover {
+                    background-color: #707b7c;
+                }
+            """)
+            crowd_layout.addWidget(self.remove_pets_btn)
+
+            self.pet_count_label = QLabel("1 pet")
+            crowd_layout.addWidget(self.pet_count_label)
+
+            crowd_group.setLayout(crowd_layout)
+            layout.addWidget(crowd_group)
+
             # Nhóm điều khiển hành động thủ công
             action_group = QGroupBox("Điều Khiển Hành Động")
             action_layout = QGridLayout()
@@ -413,7 +458,7 @@ class PetCharacter(QMainWindow):
             central_widget.setLayout(layout)
             
         except Exception as e:
-            print(f"Lỗi khi khởi tạo giao diện: {e}")
+            log.error("Lỗi khi khởi tạo giao diện: %s", e)
     
     def change_pet_type(self, pet_name):
         """Thay đổi loại pet"""
@@ -423,7 +468,7 @@ class PetCharacter(QMainWindow):
                     self.current_pet_type = pet_type
                     break
         except Exception as e:
-            print(f"Lỗi khi thay đổi loại pet: {e}")
+            log.error("Lỗi khi thay đổi loại pet: %s", e)
     
     def change_width(self, value):
         """Thay đổi chiều rộng"""
@@ -433,7 +478,7 @@ class PetCharacter(QMainWindow):
             if self.pet:
                 self.pet.set_size(self.current_width, self.current_height)
         except Exception as e:
-            print(f"Lỗi khi thay đổi chiều rộng: {e}")
+            log.error("Lỗi khi thay đổi chiều rộng: %s", e)
     
     def change_height(self, value):
         """Thay đổi chiều cao"""
@@ -443,7 +488,7 @@ class PetCharacter(QMainWindow):
             if self.pet:
                 self.pet.set_size(self.current_width, self.current_height)
         except Exception as e:
-            print(f"Lỗi khi thay đổi chiều cao: {e}")
+            log.error("Lỗi khi thay đổi chiều cao: %s", e)
     
     def save_settings(self):
         """Lưu cấu hình hiện tại"""
@@ -453,31 +498,51 @@ class PetCharacter(QMainWindow):
                 self.current_width, 
                 self.current_height
             )
-            print("Đã lưu cấu hình thành công!")
+            log.info("Đã lưu cấu hình thành công!")
         except Exception as e:
-            print(f"Lỗi khi lưu cấu hình: {e}")
+            log.error("Lỗi khi lưu cấu hình: %s", e)
     
     def create_pet(self):
         """Tạo pet mới"""
         try:
             if self.pet:
                 # Cleanup đầy đủ: dừng timer + ẩn speech bubble cũ (tránh text sót loạn màn hình)
-                if hasattr(self.pet, 'cleanup'):
-                    self.pet.cleanup()
-                else:
-                    self.pet.close()
+                self.world.despawn(self.pet)
                 self.pet = None
             
-            self.pet = Pet(self.current_pet_type, self.current_width, self.current_height, controller=self)
-            self.pet.show()
+            self.pet = self.world.spawn(self.current_pet_type, self.current_width, self.current_height,
+                                        x=DISPLAY_SETTINGS['initial_position'][0])
+            self.update_pet_count()
             
             # Cập nhật system tray menu với action toggle pet
             self.update_tray_menu()
             
-            print(f"Đã tạo pet {self.current_pet_type} với kích thước {self.current_width}x{self.current_height}")
+            log.info("Đã tạo pet %s với kích thước %sx%s", self.current_pet_type, self.current_width, self.current_height)
         except Exception as e:
-            print(f"Lỗi khi tạo pet: {e}")
+            log.error("Lỗi khi tạo pet: %s", e)
     
+    def add_extra_pet(self):
+        """Thêm một pet phụ (loại + kích thước đang chọn) vào world"""
+        try:
+            self.world.spawn(self.current_pet_type, self.current_width, self.current_height)
+            self.update_pet_count()
+        except Exception as e:
+            log.error("Lỗi khi thêm pet: %s", e)
+
+    def remove_extra_pets(self):
+        """Xóa mọi pet phụ, giữ lại pet chính"""
+        try:
+            for pet in self.world:
+                if pet is not self.pet:
+                    self.world.despawn(pet)
+            self.update_pet_count()
+        except Exception as e:
+            log.error("Lỗi khi xóa pet phụ: %s", e)
+
+    def update_pet_count(self):
+        if hasattr(self, 'pet_count_label'):
+            self.pet_count_label.setText(f"{len(self.world)} pet")
+
     def update_tray_menu(self):
         """Cập nhật menu system tray"""
         try:
@@ -510,16 +575,16 @@ class PetCharacter(QMainWindow):
                     # Nếu không tìm thấy separator, thêm vào cuối
                     menu.addAction(toggle_pet_action)
         except Exception as e:
-            print(f"Lỗi khi cập nhật tray menu: {e}")
+            log.error("Lỗi khi cập nhật tray menu: %s", e)
     
     def set_pet_activity(self, activity):
         """Đặt hành động cho pet theo nút điều khiển"""
         try:
             if self.pet:
                 self.pet.set_activity(activity)
-                print(f"Đã đặt hành động: {activity}")
+                log.info("Đã đặt hành động: %s", activity)
         except Exception as e:
-            print(f"Lỗi khi đặt hành động: {e}")
+            log.error("Lỗi khi đặt hành động: %s", e)
 
     def switch_pet(self, pet_type):
         """Đổi sang loại pet khác (dùng cho menu chuột phải trên pet)"""
@@ -533,25 +598,25 @@ class PetCharacter(QMainWindow):
                         break
             self.create_pet()
         except Exception as e:
-            print(f"Lỗi khi đổi loại pet: {e}")
+            log.error("Lỗi khi đổi loại pet: %s", e)
 
     def hide_pet(self):
         """Ẩn pet"""
         try:
             if self.pet:
                 self.pet.hide()
-                print("Đã ẩn pet")
+                log.info("Đã ẩn pet")
         except Exception as e:
-            print(f"Lỗi khi ẩn pet: {e}")
+            log.error("Lỗi khi ẩn pet: %s", e)
     
     def show_pet(self):
         """Hiện pet"""
         try:
             if self.pet:
                 self.pet.show()
-                print("Đã hiện pet")
+                log.info("Đã hiện pet")
         except Exception as e:
-            print(f"Lỗi khi hiện pet: {e}")
+            log.error("Lỗi khi hiện pet: %s", e)
     
     def save_speeches(self):
         """Lưu câu nói tùy chỉnh"""
@@ -564,11 +629,11 @@ class PetCharacter(QMainWindow):
             # Reload config của pet nếu pet đã được tạo
             if self.pet and hasattr(self.pet, 'config_manager'):
                 self.pet.config_manager.reload_config()
-                print("Đã reload cấu hình cho pet!")
+                log.info("Đã reload cấu hình cho pet!")
             
-            print("Đã lưu câu nói tùy chỉnh thành công!")
+            log.info("Đã lưu câu nói tùy chỉnh thành công!")
         except Exception as e:
-            print(f"Lỗi khi lưu câu nói tùy chỉnh: {e}")
+            log.error("Lỗi khi lưu câu nói tùy chỉnh: %s", e)
     
     def toggle_auto_start(self, state):
         """Bật/tắt tự động khởi động cùng Windows"""
@@ -588,17 +653,17 @@ class PetCharacter(QMainWindow):
                 self.config_manager.set_auto_start(enabled)
                 
                 if enabled:
-                    print("Đã bật tự động khởi động cùng Windows!")
+                    log.info("Đã bật tự động khởi động cùng Windows!")
                 else:
-                    print("Đã tắt tự động khởi động cùng Windows!")
+                    log.info("Đã tắt tự động khởi động cùng Windows!")
             else:
                 # Khôi phục lại checkbox nếu thất bại
                 self.auto_start_checkbox.blockSignals(True)
                 self.auto_start_checkbox.setChecked(not enabled)
                 self.auto_start_checkbox.blockSignals(False)
-                print("Không thể thay đổi cài đặt auto-start!")
+                log.warning("Không thể thay đổi cài đặt auto-start!")
         except Exception as e:
-            print(f"Lỗi khi thay đổi cài đặt auto-start: {e}")
+            log.error("Lỗi khi thay đổi cài đặt auto-start: %s", e)
             # Khôi phục lại checkbox nếu có lỗi
             self.auto_start_checkbox.blockSignals(True)
             self.auto_start_checkbox.setChecked(not enabled)
@@ -611,7 +676,7 @@ class PetCharacter(QMainWindow):
             startup_folder = os.path.join(appdata, r'Microsoft\Windows\Start Menu\Programs\Startup')
             return startup_folder
         except Exception as e:
-            print(f"Lỗi khi lấy đường dẫn Startup folder: {e}")
+            log.error("Lỗi khi lấy đường dẫn Startup folder: %s", e)
             return None
     
     def get_app_path(self):
@@ -626,7 +691,7 @@ class PetCharacter(QMainWindow):
                 app_path = os.path.abspath(__file__)
             return app_path
         except Exception as e:
-            print(f"Lỗi khi lấy đường dẫn ứng dụng: {e}")
+            log.error("Lỗi khi lấy đường dẫn ứng dụng: %s", e)
             return None
     
     def add_to_startup(self):
@@ -636,7 +701,7 @@ class PetCharacter(QMainWindow):
             app_path = self.get_app_path()
             
             if not startup_folder or not app_path:
-                print("Không thể thêm vào Startup folder")
+                log.warning("Không thể thêm vào Startup folder")
                 return False
             
             # Tên file shortcut
@@ -645,7 +710,7 @@ class PetCharacter(QMainWindow):
             
             # Kiểm tra xem shortcut đã tồn tại chưa
             if os.path.exists(shortcut_path):
-                print("Shortcut đã tồn tại trong Startup folder")
+                log.info("Shortcut đã tồn tại trong Startup folder")
                 return True
             
             # Thử tạo shortcut bằng win32com (nếu có)
@@ -656,11 +721,11 @@ class PetCharacter(QMainWindow):
                 shortcut.Targetpath = app_path
                 shortcut.WorkingDirectory = os.path.dirname(app_path)
                 shortcut.save()
-                print(f"Đã tạo shortcut tại {shortcut_path}")
+                log.info("Đã tạo shortcut tại %s", shortcut_path)
                 return True
             except ImportError:
                 # Nếu không có win32com, thử dùng batch file
-                print("Không có win32com, thử tạo batch file...")
+                log.warning("Không có win32com, thử tạo batch file...")
                 batch_path = os.path.join(startup_folder, "Pet Screen.bat")
                 with open(batch_path, 'w', encoding='utf-8') as f:
                     if getattr(sys, 'frozen', False):
@@ -670,10 +735,10 @@ class PetCharacter(QMainWindow):
                         # Chạy từ Python script
                         python_exe = sys.executable
                         f.write(f'@echo off\n"{python_exe}" "{app_path}"\n')
-                print(f"Đã tạo batch file tại {batch_path}")
+                log.info("Đã tạo batch file tại %s", batch_path)
                 return True
             except Exception as e:
-                print(f"Lỗi khi tạo shortcut bằng win32com: {e}")
+                log.error("Lỗi khi tạo shortcut bằng win32com: %s", e)
                 # Fallback: tạo batch file
                 batch_path = os.path.join(startup_folder, "Pet Screen.bat")
                 with open(batch_path, 'w', encoding='utf-8') as f:
@@ -682,10 +747,10 @@ class PetCharacter(QMainWindow):
                     else:
                         python_exe = sys.executable
                         f.write(f'@echo off\n"{python_exe}" "{app_path}"\n')
-                print(f"Đã tạo batch file tại {batch_path}")
+                log.info("Đã tạo batch file tại %s", batch_path)
                 return True
         except Exception as e:
-            print(f"Lỗi khi thêm vào Startup folder: {e}")
+            log.error("Lỗi khi thêm vào Startup folder: %s", e)
             return False
     
     def remove_from_startup(self):
@@ -694,24 +759,24 @@ class PetCharacter(QMainWindow):
             startup_folder = self.get_startup_folder()
             
             if not startup_folder:
-                print("Không thể truy cập Startup folder")
+                log.warning("Không thể truy cập Startup folder")
                 return False
             
             # Xóa shortcut .lnk
             shortcut_path = os.path.join(startup_folder, "Pet Screen.lnk")
             if os.path.exists(shortcut_path):
                 os.remove(shortcut_path)
-                print(f"Đã xóa shortcut tại {shortcut_path}")
+                log.info("Đã xóa shortcut tại %s", shortcut_path)
             
             # Xóa batch file (nếu có)
             batch_path = os.path.join(startup_folder, "Pet Screen.bat")
             if os.path.exists(batch_path):
                 os.remove(batch_path)
-                print(f"Đã xóa batch file tại {batch_path}")
+                log.info("Đã xóa batch file tại %s", batch_path)
             
             return True
         except Exception as e:
-            print(f"Lỗi khi xóa khỏi Startup folder: {e}")
+            log.error("Lỗi khi xóa khỏi Startup folder: %s", e)
             return False
     
     def sync_auto_start_status(self):
@@ -746,7 +811,7 @@ class PetCharacter(QMainWindow):
                 if hasattr(self, 'auto_start_checkbox'):
                     self.auto_start_checkbox.setChecked(config_enabled)
         except Exception as e:
-            print(f"Lỗi khi đồng bộ trạng thái auto-start: {e}")
+            log.error("Lỗi khi đồng bộ trạng thái auto-start: %s", e)
     
     def closeEvent(self, event):
         """Sự kiện khi đóng ứng dụng"""
@@ -764,11 +829,11 @@ class PetCharacter(QMainWindow):
                     3000  # Hiển thị 3 giây
                 )
         except Exception as e:
-            print(f"Lỗi khi đóng ứng dụng: {e}")
+            log.error("Lỗi khi đóng ứng dụng: %s", e)
             event.accept()
 
 def _ensure_utf8_console():
-    """Tránh crash do print() tiếng Việt khi console dùng cp1252 hoặc chạy windowed."""
+    """Tránh crash do log/print tiếng Việt khi console dùng cp1252 hoặc chạy windowed."""
     for stream in (sys.stdout, sys.stderr):
         try:
             if stream is not None and hasattr(stream, 'reconfigure'):
@@ -828,4 +893,4 @@ if __name__ == '__main__':
         petCharacter.show()
         sys.exit(app.exec_())
     except Exception as e:
-        print(f"Lỗi khởi động ứng dụng: {e}")
+        log.error("Lỗi khởi động ứng dụng: %s", e)
@@ -0,0 +1,172 @@
+# frame_scheduler.py - Đồng hồ khung hình dùng chung cho cả process (pet, bong bóng nói, pháo hoa)
+import time
+from PyQt5.QtCore import Qt, QTimer
+from config import DEFAULT_SETTINGS
+from pet_core import MonotonicClock
+from frame_stats import FrameStats
+from pet_log import get_logger
+
+log = get_logger(__name__)
+
+# Thứ tự cập nhật trong một khung hình: vật lý -> vật đi kèm (bong bóng nói) -> hiệu ứng
+# -> commit (gửi vị trí cửa sổ đã tính xuống hệ thống, mỗi khung hình đúng một lần)
+PHASE_PHYSICS = 0
+PHASE_ATTACHMENTS = 1
+PHASE_EFFECTS = 2
+PHASE_COMMIT = 3
+PHASES = (PHASE_PHYSICS, PHASE_ATTACHMENTS, PHASE_EFFECTS, PHASE_COMMIT)
+PHASE_NAMES = {PHASE_PHYSICS: 'physics', PHASE_ATTACHMENTS: 'attachments', PHASE_EFFECTS: 'effects',
+               PHASE_COMMIT: 'commit'}
+
+
+class Subscription:
+    """Một callback đăng ký với FrameScheduler cùng số liệu chi phí của nó"""
+    def __init__(self, callback, phase, name):
+        self.callback = callback
+        self.phase = phase
+        self.name = name
+        self.active = True
+        self.calls = 0
+        self.total_s = 0.0
+        self.last_s = 0.0
+        self.max_s = 0.0
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'phase': PHASE_NAMES.get(self.phase, self.phase),
+            'calls': self.calls,
+            'avg_ms': round(self.total_s * 1000 / self.calls, 3) if self.calls else 0.0,
+            'last_ms': round(self.last_s * 1000, 3),
+            'max_ms': round(self.max_s * 1000, 3),
+        }
+
+
+class FrameScheduler:
+    """Một QTimer duy nhất gọi mọi subscriber mỗi khung hình, lần lượt theo phase
+
+    Callback nhận thời điểm khung hình (clock.now(), mặc định time.monotonic) chung cho mọi subscriber.
+    Timer chỉ chạy khi có subscriber, nên khi mọi thứ đứng yên process không bị đánh thức.
+    Truyền VirtualClock rồi tự gọi tick() để chạy pet Qt theo thời gian ảo (ví dụ trên nền offscreen).
+    """
+    def __init__(self, fps=None, clock=None):
+        self.clock = clock if clock is not None else MonotonicClock()
+        self._phases = {phase: [] for phase in PHASES}
+        self.frame_count = 0
+        self.frame_time = self.clock.now()
+        # Đo thời gian: timer bắn lệch bao nhiêu so với chu kỳ, tổng thời gian mỗi khung, khung bị bỏ lỡ
+        self.frame_stats = FrameStats()
+        self.dropped_frames = 0
+        self._last_tick = None
+        self._timer = QTimer()
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self.tick)
+        self.set_fps(fps or DEFAULT_SETTINGS['animation_fps'])
+
+    def set_fps(self, fps):
+        """Đổi tần số khung hình (áp dụng ngay nếu timer đang chạy)"""
+        self.interval_ms = max(1, round(1000 / fps))
+        if self._timer.isActive():
+            self._timer.start(self.interval_ms)
+
+    def subscribe(self, callback, phase=PHASE_PHYSICS, name=None):
+        """Đăng ký callback(now) chạy mỗi khung hình, trả về Subscription để hủy sau này"""
+        sub = Subscription(callback, phase, name or getattr(callback, '__qualname__', repr(callback)))
+        self._phases[phase].append(sub)
+        if not self._timer.isActive():
+            self.frame_time = self.clock.now()
+            self._last_tick = None  # Khung đầu sau khi ngủ không tính jitter
+            self._timer.start(self.interval_ms)
+        return sub
+
+    def unsubscribe(self, sub):
+        """Hủy đăng ký (an toàn khi gọi trong lúc đang chạy khung hình hoặc gọi nhiều lần)"""
+        if sub is None or not sub.active:
+            return
+        sub.active = False
+        subs = self._phases.get(sub.phase, [])
+        if sub in subs:
+            subs.remove(sub)
+        if not self.subscriber_count() and self._timer.isActive():
+            self._timer.stop()
+
+    def subscriber_count(self):
+        return sum(len(subs) for subs in self._phases.values())
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    def tick(self):
+        """Chạy một khung hình: mọi subscriber, theo thứ tự phase rồi thứ tự đăng ký"""
+        now = self.clock.now()
+        self.frame_time = now
+        self.frame_count += 1
+        if self._last_tick is not None:
+            interval_ms = (now - self._last_tick) * 1000
+            self.frame_stats.record('jitter', interval_ms - self.interval_ms, now)
+            # Khoảng cách dài gấp nhiều lần chu kỳ: các khung ở giữa đã bị bỏ lỡ
+            missed = int(interval_ms / self.interval_ms + 0.5) - 1
+            if missed > 0:
+                self.dropped_frames += missed
+        self._last_tick = now
+        frame_start = time.perf_counter()
+        for phase in PHASES:
+            # Duyệt bản sao: subscriber có thể tự hủy/đăng ký thêm trong lúc chạy
+            for sub in list(self._phases[phase]):
+                if not sub.active:
+                    continue
+                start = time.perf_counter()
+                try:
+                    sub.callback(now)
+                except Exception as e:
+                    log.error("Lỗi trong subscriber %s: %s", sub.name, e)
+                cost = time.perf_counter() - start
+                sub.calls += 1
+                sub.total_s += cost
+                sub.last_s = cost
+                if cost > sub.max_s:
+                    sub.max_s = cost
+        self.frame_stats.record('frame', (time.perf_counter() - frame_start) * 1000, now)
+
+    def stats(self):
+        """Số liệu khung hình và chi phí từng subscriber đang đăng ký"""
+        return {
+            'running': self.is_running(),
+            'interval_ms': self.interval_ms,
+            'frames': self.frame_count,
+            'dropped_frames': self.dropped_frames,
+            'subscribers': [sub.stats() for phase in PHASES for sub in self._phases[phase]],
+        }
+
+
+class QtTimerHandle:
+    """Một lần hẹn giờ bằng QTimer single-shot (hủy được)"""
+    def __init__(self, delay_ms, callback):
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(callback)
+        self._timer.start(delay_ms)
+
+    def cancel(self):
+        self._timer.stop()
+
+    def active(self):
+        return self._timer.isActive()
+
+
+class QtTimers:
+    """Hẹn giờ trên event loop Qt, cùng giao diện với pet_core.VirtualTimers"""
+    def call_later(self, delay_ms, callback):
+        return QtTimerHandle(delay_ms, callback)
+
+
+# Scheduler dùng chung cho cả process
+_shared_scheduler = None
+
+
+def shared_frame_scheduler():
+    """Scheduler khung hình dùng chung (tạo lần đầu khi cần, sau khi đã có QApplication)"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        _shared_scheduler = FrameScheduler()
+    return _shared_scheduler
@@ -0,0 +1,72 @@
+# frame_stats.py - Đo thời gian khung hình: bộ đệm vòng kích thước cố định + tóm tắt percentile
+import csv
+import math
+from collections import deque
+
+# Số mẫu tối đa giữ lại cho mỗi FrameStats (mẫu cũ nhất bị đẩy ra)
+DEFAULT_CAPACITY = 4096
+
+
+def percentile(sorted_values, pct):
+    """Percentile theo hạng gần nhất trên danh sách đã sắp xếp (None nếu rỗng)"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class FrameStats:
+    """Bộ đệm vòng các mẫu (t, series, value_ms) cho một nguồn đo (pet hoặc đồng hồ khung hình)
+
+    Mỗi series là một loại số đo: 'tick:<hoạt động>' (thời gian on_tick theo nhánh), 'paint',
+    'jitter' (timer bắn sớm/muộn so với chu kỳ), 'frame' (tổng thời gian một khung hình)...
+    Ghi mẫu là O(1) và không cấp phát thêm khi bộ đệm đã đầy.
+    """
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.samples = deque(maxlen=capacity)
+        self.counts = {}  # Tổng số mẫu đã ghi theo series (kể cả mẫu đã bị đẩy ra)
+
+    def record(self, series, value_ms, t):
+        self.samples.append((t, series, value_ms))
+        self.counts[series] = self.counts.get(series, 0) + 1
+
+    def clear(self):
+        self.samples.clear()
+        self.counts.clear()
+
+    def values(self, series):
+        return [value for _, name, value in self.samples if name == series]
+
+    def summary(self):
+        """Tóm tắt từng series trong bộ đệm: số mẫu, p50/p95/p99, max, trung bình (ms)"""
+        by_series = {}
+        for _, name, value in self.samples:
+            by_series.setdefault(name, []).append(value)
+        result = {}
+        for name, values in sorted(by_series.items()):
+            values.sort()
+            result[name] = {
+                'samples': len(values),
+                'total': self.counts.get(name, len(values)),
+                'p50_ms': round(percentile(values, 50), 3),
+                'p95_ms': round(percentile(values, 95), 3),
+                'p99_ms': round(percentile(values, 99), 3),
+                'max_ms': round(values[-1], 3),
+                'mean_ms': round(sum(values) / len(values), 3),
+            }
+        return result
+
+
+def write_samples_csv(path, sources):
+    """Ghi mẫu thô của nhiều nguồn ra một file CSV (t, source, series, value_ms), sắp theo thời gian"""
+    rows = []
+    for source, stats in sources.items():
+        rows.extend((t, source, series, value) for t, series, value in stats.samples)
+    rows.sort(key=lambda row: row[0])
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['t', 'source', 'series', 'value_ms'])
+        for t, source, series, value in rows:
+            writer.writerow([f'{t:.6f}', source, series, f'{value:.4f}'])
+    return len(rows)
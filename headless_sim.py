@@ -0,0 +1,284 @@
+# headless_sim.py - Mô phỏng pet không cần màn hình/Qt trên đồng hồ ảo, chạy nhanh nhất có thể
+import argparse
+import csv
+import json
+import random
+import sys
+import time
+from config import SUPPORTED_PETS, PET_SIZE_SETTINGS, DISPLAY_SETTINGS
+from pet_log import get_logger
+from pet_core import (PetMotion, ActivityStateMachine, ScreenLayout, VirtualClock, VirtualTimers, PHYSICS_STEP_S,
+                      THROW_MAX_SPEED)
+from physics_batch import MotionBatch, HAVE_NUMPY
+from spatial_grid import SpatialHashGrid, find_knocks
+from surfaces import FakeSurfaceProvider, SurfaceIndex
+
+log = get_logger(__name__)
+
+
+class SimulatedPet:
+    """Một pet mô phỏng: PetMotion + ActivityStateMachine chạy trên hẹn giờ ảo của simulation"""
+    def __init__(self, sim, index, pet_type, width, height, x):
+        self.sim = sim
+        self.index = index
+        self.pet_type = pet_type
+        motion_type = sim.batch.create_motion if sim.batch is not None else PetMotion
+        self.motion = motion_type(width, height, sim.screen_width, sim.screen_height,
+                                  x, DISPLAY_SETTINGS['initial_position'][1], rng=sim.rng, log=sim.log,
+                                  layout=sim.layout, surfaces=sim.surfaces)
+        self.machine = ActivityStateMachine(self.motion, sim.timers, rng=sim.rng, log=sim.log,
+                                            listener=self._on_event)
+        # Thời gian (số tick) ở mỗi hoạt động
+        self.activity_ticks = {}
+        self.machine.start_activity_timer()
+        self.machine.start_activity('idle')
+
+    def _on_event(self, event, value=None):
+        if event != 'timer':
+            self.sim.record_event(self, event, value)
+
+    def step(self):
+        """Một bước vật lý (pet đang chết thì đứng yên như vòng lặp khung hình của app)"""
+        motion = self.motion
+        activity = motion.current_activity
+        self.activity_ticks[activity] = self.activity_ticks.get(activity, 0) + 1
+        if activity != 'die':
+            motion.step()
+            motion.physics_steps += 1
+
+
+class HeadlessSimulation:
+    """Chạy N pet theo bước vật lý cố định trên đồng hồ ảo, không cần Qt hay màn hình
+
+    Mỗi tick: đồng hồ tiến PHYSICS_STEP_S, chạy các hẹn giờ tới hạn (đổi hoạt động, hồi sinh) rồi
+    bước vật lý từng pet. Cùng seed cho cùng kết quả. Trace vị trí/hoạt động lấy mẫu mỗi
+    trace_every tick (0 = không ghi), sự kiện (đổi hoạt động, nói, chạm đất...) luôn được ghi.
+    batch=True bước mọi pet bằng MotionBatch (NumPy) thay vì từng PetMotion một. screens là danh sách
+    kích thước (width, height) của nhiều màn hình ảo xếp ngang (mặc định một màn hình screen_size).
+    collisions=True ghi vị trí pet vào lưới băm không gian mỗi tick và cho pet đang bị ném hất pet
+    khác đi như PetWorld. windows là danh sách cửa sổ ảo (left, top, width, height), dưới lên trên:
+    cạnh trên của chúng là mặt đứng như cửa sổ desktop trong app; dời/đóng cửa sổ qua self.windows
+    (FakeSurfaceProvider) rồi gọi sync_surfaces(). throws là số cú ném ngẫu nhiên mỗi phút mô phỏng
+    (như người dùng kéo rồi ném một pet), theo seed nên chạy lại cho cùng kết quả.
+    """
+    def __init__(self, seed=None, screen_size=(1920, 1080), trace_every=1, log=None, batch=False, screens=None,
+                 collisions=False, windows=None, throws=0.0):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.clock = VirtualClock()
+        self.timers = VirtualTimers(self.clock)
+        self.layout = ScreenLayout.side_by_side(screens or [screen_size])
+        # Pet mới xuất hiện trên màn hình chính
+        self.screen_width, self.screen_height = self.layout.primary.width, self.layout.primary.height
+        self.trace_every = trace_every
+        self.log = log
+        self.batch = MotionBatch() if batch else None
+        self.grid = SpatialHashGrid() if collisions else None
+        self.knocks = 0
+        self.throws = 0
+        self.throw_rate = throws
+        if throws > 0:
+            # Nguồn ngẫu nhiên riêng: bật ném không làm đổi hoạt động của pet so với lúc không ném
+            self.throw_rng = random.Random(self.rng.getrandbits(32))
+            self.timers.call_later(self._next_throw_ms(), self._throw_random_pet)
+        self.windows = None
+        self.surfaces = None
+        if windows:
+            self.windows = FakeSurfaceProvider(enumerate(windows))
+            self.surfaces = SurfaceIndex()
+            self.surfaces.sync(self.windows.windows())
+        self.pets = []
+        self.ticks = 0
+        self.wall_s = 0.0
+        self.trace = []   # (t, pet, x, y, activity)
+        self.events = []  # (t, pet, event, value)
+
+    def add_pet(self, pet_type=None, width=None, height=None, x=None):
+        """Thêm một pet (loại/kích thước/vị trí ngẫu nhiên theo seed nếu không chỉ định)"""
+        pet_type = pet_type or self.rng.choice(list(SUPPORTED_PETS))
+        width = width or PET_SIZE_SETTINGS['default_width']
+        height = height or PET_SIZE_SETTINGS['default_height']
+        if x is None:
+            x = self.rng.randint(0, max(0, self.screen_width - width))
+        pet = SimulatedPet(self, len(self.pets), pet_type, width, height, x)
+        self.pets.append(pet)
+        return pet
+
+    def record_event(self, pet, event, value=None):
+        self.events.append((round(self.clock.now(), 3), pet.index, event, value))
+
+    def step(self):
+        """Một tick mô phỏng"""
+        self.clock.advance(PHYSICS_STEP_S)
+        self.timers.run_due()
+        if self.batch is not None:
+            self._step_batch()
+        else:
+            for pet in self.pets:
+                pet.step()
+        if self.grid is not None:
+            self._resolve_knocks()
+        self.ticks += 1
+        if self.trace_every and self.ticks % self.trace_every == 0:
+            now = round(self.clock.now(), 3)
+            for pet in self.pets:
+                motion = pet.motion
+                self.trace.append((now, pet.index, round(motion.x, 2), round(motion.y, 2),
+                                   motion.current_activity))
+
+    def _step_batch(self):
+        slots = []
+        for pet in self.pets:
+            activity = pet.motion.current_activity
+            pet.activity_ticks[activity] = pet.activity_ticks.get(activity, 0) + 1
+            if activity != 'die':
+                slots.append(pet.motion.slot)
+        self.batch.step(slots)
+        self.batch.physics_steps[slots] += 1
+
+    def _next_throw_ms(self):
+        return self.throw_rng.expovariate(self.throw_rate / 60000.0)
+
+    def _throw_random_pet(self):
+        """Hẹn giờ: ném một pet bất kỳ đang đứng/đi (không ném pet đang nảy hay đang chết)"""
+        self.timers.call_later(self._next_throw_ms(), self._throw_random_pet)
+        rng = self.throw_rng
+        candidates = [pet for pet in self.pets
+                      if not pet.motion.is_bouncing and pet.motion.current_activity != 'die']
+        if not candidates:
+            return
+        pet = rng.choice(candidates)
+        vx = rng.uniform(0.3, 0.8) * THROW_MAX_SPEED * rng.choice((-1, 1))
+        vy = -rng.uniform(0.1, 0.5) * THROW_MAX_SPEED
+        self.throws += 1
+        self.record_event(pet, 'thrown', None)
+        self.throw(pet, vx, vy)
+
+    def throw(self, pet, vx, vy):
+        """Ném pet với vận tốc (px/bước) như khi thả chuột trong app"""
+        if pet.motion.throw(vx, vy):
+            pet.machine.postpone()
+        else:
+            pet.machine.manual_set_activity('fall')
+
+    def _resolve_knocks(self):
+        # Như PetWorld: chỉ ghi vị trí vào grid khi có pet đang bị ném
+        throwers = [pet for pet in self.pets if pet.motion.is_bouncing]
+        if not throwers:
+            return
+        update = self.grid.update
+        for pet in self.pets:
+            motion = pet.motion
+            update(pet, motion.x, motion.y, motion.width, motion.height)
+        for pet, other in find_knocks(self.grid, throwers):
+            vx, vy = pet.motion.knock(other.motion)
+            self.knocks += 1
+            self.record_event(other, 'knocked', pet.index)
+            self.throw(other, vx, vy)
+
+    def sync_surfaces(self):
+        """Đọc lại cửa sổ ảo sau khi dời/đóng: pet đứng trên mặt thay đổi đứng theo hoặc rơi"""
+        changed = self.surfaces.sync(self.windows.windows())
+        for pet in self.pets:
+            if pet.motion.surface in changed:
+                pet.motion.check_support()
+        return changed
+
+    def run(self, duration_s):
+        """Chạy thêm duration_s giây mô phỏng, trả về report()"""
+        ticks = int(round(duration_s / PHYSICS_STEP_S))
+        start = time.perf_counter()
+        for _ in range(ticks):
+            self.step()
+        self.wall_s += time.perf_counter() - start
+        return self.report()
+
+    def report(self):
+        """Thông lượng (tick mô phỏng/giây thật), số sự kiện và tỉ lệ thời gian theo hoạt động"""
+        simulated_s = self.ticks * PHYSICS_STEP_S
+        event_counts = {}
+        for _, _, event, _ in self.events:
+            event_counts[event] = event_counts.get(event, 0) + 1
+        activity_ticks = {}
+        for pet in self.pets:
+            for activity, count in pet.activity_ticks.items():
+                activity_ticks[activity] = activity_ticks.get(activity, 0) + count
+        total = sum(activity_ticks.values()) or 1
+        return {
+            'seed': self.seed,
+            'pets': len(self.pets),
+            'ticks': self.ticks,
+            'simulated_s': round(simulated_s, 3),
+            'wall_s': round(self.wall_s, 3),
+            'ticks_per_s': round(self.ticks / self.wall_s) if self.wall_s else 0,
+            'pet_ticks_per_s': round(self.ticks * len(self.pets) / self.wall_s) if self.wall_s else 0,
+            'speedup': round(simulated_s / self.wall_s, 1) if self.wall_s else 0,
+            'events': event_counts,
+            'activity_share': {k: round(v / total, 4) for k, v in sorted(activity_ticks.items())},
+            'trace_samples': len(self.trace),
+            'physics': 'batch' if self.batch is not None else 'scalar',
+            'screens': len(self.layout),
+            'throws': self.throws,
+            'knocks': self.knocks,
+            'surfaces': len(self.surfaces) if self.surfaces is not None else 0,
+        }
+
+    def write_trace_csv(self, path):
+        """Ghi trace vị trí/hoạt động ra CSV (t, pet, x, y, activity); lỗi ghi file được ném ra cho người gọi"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['t', 'pet', 'x', 'y', 'activity'])
+            writer.writerows(self.trace)
+        log.info("Đã lưu trace vào %s", path)
+
+    def write_events_csv(self, path):
+        """Ghi các sự kiện ra CSV (t, pet, event, value); lỗi ghi file được ném ra cho người gọi"""
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['t', 'pet', 'event', 'value'])
+            writer.writerows(self.events)
+        log.info("Đã lưu sự kiện vào %s", path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mô phỏng pet không cần màn hình trên đồng hồ ảo")
+    parser.add_argument('--seconds', type=float, default=3600, help="Thời gian mô phỏng (giây, mặc định 1 giờ)")
+    parser.add_argument('--pets', type=int, default=1, help="Số pet")
+    parser.add_argument('--seed', type=int, default=None, help="Seed ngẫu nhiên (cùng seed cho cùng kết quả)")
+    parser.add_argument('--screen', default='1920x1080', help="Kích thước màn hình ảo, ví dụ 1920x1080 (nhiều màn hình xếp ngang: 1920x1080,1280x1024)")
+    parser.add_argument('--trace-every', type=int, default=6, help="Lấy mẫu trace mỗi N tick (0 = tắt)")
+    parser.add_argument('--trace', help="File CSV ghi trace vị trí/hoạt động")
+    parser.add_argument('--events', help="File CSV ghi sự kiện")
+    parser.add_argument('--batch', action='store_true', help="Bước vật lý gộp bằng NumPy (physics_batch)")
+    parser.add_argument('--collisions', action='store_true', help="Pet đang bị ném va vào pet khác (spatial_grid)")
+    parser.add_argument('--throws', type=float, default=0.0,
+                        help="Số cú ném ngẫu nhiên mỗi phút mô phỏng (cho cả nhóm pet), dùng với --collisions")
+    parser.add_argument('--windows', help="Cửa sổ ảo làm mặt đứng, dưới lên trên: left,top,width,height;...")
+    parser.add_argument('--verbose', action='store_true', help="In log hoạt động như app thật")
+    args = parser.parse_args(argv)
+
+    if args.batch and not HAVE_NUMPY:
+        parser.error("--batch cần NumPy (pip install numpy)")
+    screens = [tuple(int(v) for v in size.split('x')) for size in args.screen.lower().split(',')]
+    windows = [tuple(int(v) for v in rect.split(',')) for rect in args.windows.split(';')] if args.windows else None
+    sim = HeadlessSimulation(seed=args.seed, screens=screens,
+                             trace_every=args.trace_every, log=log.info if args.verbose else None,
+                             batch=args.batch, collisions=args.collisions, windows=windows,
+                             throws=args.throws)
+    for _ in range(args.pets):
+        sim.add_pet()
+    report = sim.run(args.seconds)
+    try:
+        if args.trace:
+            sim.write_trace_csv(args.trace)
+        if args.events:
+            sim.write_events_csv(args.events)
+    except OSError as e:
+        log.error("Lỗi khi lưu CSV: %s", e)
+        return 1
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
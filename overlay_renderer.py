@@ -0,0 +1,226 @@
+# overlay_renderer.py - Chế độ vẽ overlay: một cửa sổ trong suốt mỗi màn hình vẽ mọi pet, bong bóng nói, pháo hoa
+import time
+from PyQt5.QtWidgets import QApplication, QWidget
+from PyQt5.QtGui import QPainter, QRegion
+from PyQt5.QtCore import Qt, QRect, QTimer
+from frame_scheduler import shared_frame_scheduler
+
+# Số ảnh alpha (QImage) của khung hình giữ để kiểm tra click; khung hình dùng chung giữa các pet cùng loại
+HIT_IMAGE_CACHE_SIZE = 256
+
+
+class OverlayWindow(QWidget):
+    """Cửa sổ phủ kín một màn hình, vẽ các đối tượng của OverlayRenderer nằm trên màn hình đó
+
+    Mỗi màn hình có hai lớp: lớp pet chỉ nhận chuột ở vùng đang có pet (mask), phần còn lại click
+    xuyên qua; lớp hiệu ứng (effects=True, nằm trên) vẽ bong bóng nói/pháo hoa và không bao giờ nhận
+    chuột, giống cửa sổ riêng của chúng ở chế độ 'window'. Mask của Qt cắt cả phần vẽ lẫn vùng nhận
+    chuột nên hai loại đối tượng không dùng chung được một cửa sổ.
+    """
+    def __init__(self, renderer, screen, effects=False):
+        super().__init__()
+        self.renderer = renderer
+        self.screen_ref = screen
+        self.effects = effects
+        flags = Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool
+        if effects:
+            flags |= Qt.WindowTransparentForInput
+        self.setWindowFlags(flags)
+        self.setAttribute(Qt.WA_TranslucentBackground, True)
+        self.setAttribute(Qt.WA_ShowWithoutActivating, True)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, effects)
+        self.setMouseTracking(not effects)
+        self.origin = screen.geometry().topLeft()
+        self.setGeometry(screen.geometry())
+        self._mask_rects = None
+        self._grab = None  # Pet đang nhận chuột (từ lúc nhấn tới lúc thả)
+        # Bắt đầu với mask rỗng: chưa có gì thì không chặn chuột của màn hình bên dưới
+        self.setMask(QRegion(0, 0, 1, 1))
+
+    def set_input_rects(self, rects):
+        """Đặt vùng nhận chuột/hiển thị (toạ độ toàn cục), chỉ gọi xuống hệ thống khi thay đổi"""
+        if rects == self._mask_rects:
+            return
+        self._mask_rects = rects
+        region = QRegion()
+        for rect in rects:
+            region = region.united(QRegion(rect.translated(-self.origin)))
+        if region.isEmpty():
+            region = QRegion(0, 0, 1, 1)
+        self.setMask(region)
+
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        painter = QPainter(self)
+        painter.translate(-self.origin)
+        if self.effects:
+            self.renderer.paint_effects(painter, event.rect().translated(self.origin))
+        else:
+            self.renderer.paint(painter, event.rect().translated(self.origin))
+        painter.end()
+        scheduler = shared_frame_scheduler()
+        scheduler.frame_stats.record('paint:overlay', (time.perf_counter() - start) * 1000, scheduler.clock.now())
+
+    # Chuột: tìm pet dưới con trỏ (theo khung + alpha) rồi chuyển tiếp sự kiện cho pet đó
+    def mousePressEvent(self, event):
+        pet = self.renderer.hit_test(event.globalPos())
+        self._grab = pet
+        if pet is not None:
+            pet.mousePressEvent(event)
+            self.setCursor(pet.cursor())
+
+    def mouseMoveEvent(self, event):
+        pet = self._grab
+        if pet is not None:
+            pet.mouseMoveEvent(event)
+            self.setCursor(pet.cursor())
+        else:
+            hovered = self.renderer.hit_test(event.globalPos())
+            self.setCursor(hovered.cursor() if hovered is not None else Qt.ArrowCursor)
+
+    def mouseReleaseEvent(self, event):
+        pet = self._grab
+        self._grab = None
+        if pet is not None:
+            pet.mouseReleaseEvent(event)
+            self.setCursor(pet.cursor())
+
+    def mouseDoubleClickEvent(self, event):
+        pet = self.renderer.hit_test(event.globalPos())
+        if pet is not None:
+            pet.mouseDoubleClickEvent(event)
+
+
+class OverlayRenderer:
+    """Vẽ mọi pet đăng ký lên các OverlayWindow (mỗi màn hình một cửa sổ)
+
+    Pet ở chế độ overlay không bao giờ hiện cửa sổ riêng: vị trí/khung hình vẫn giữ trên QLabel
+    ẩn của pet, pet chỉ báo vùng cần vẽ lại qua damage(). Qt gộp các vùng này thành một lần vẽ.
+    """
+    def __init__(self):
+        self.pets = []
+        self.windows = []
+        self._mask_pending = False
+        self._hit_images = {}  # QPixmap.cacheKey() -> QImage để đọc alpha khi kiểm tra click
+        for screen in QApplication.screens():
+            self._add_screen(screen)
+        QApplication.instance().screenAdded.connect(self._add_screen)
+        QApplication.instance().screenRemoved.connect(self._remove_screen)
+
+    def _add_screen(self, screen):
+        # Lớp hiệu ứng hiện sau để nằm trên lớp pet
+        for effects in (False, True):
+            window = OverlayWindow(self, screen, effects)
+            screen.geometryChanged.connect(lambda geometry, w=window: self._move_window(w, geometry))
+            self.windows.append(window)
+            window.show()
+
+    def _remove_screen(self, screen):
+        for window in list(self.windows):
+            if window.screen_ref is screen:
+                self.windows.remove(window)
+                window.close()
+                window.deleteLater()
+
+    def _move_window(self, window, geometry):
+        window.origin = geometry.topLeft()
+        window.setGeometry(geometry)
+        window._mask_rects = None
+        self.damage(geometry)
+
+    def add_pet(self, pet):
+        if pet not in self.pets:
+            self.pets.append(pet)
+            self.damage(pet.geometry())
+
+    def remove_pet(self, pet):
+        if pet in self.pets:
+            self.pets.remove(pet)
+            self.damage(pet.geometry())
+
+    def damage(self, rect):
+        """Đánh dấu vùng (toạ độ toàn cục) cần vẽ lại và cập nhật input mask trong lượt event loop này"""
+        for window in self.windows:
+            local = rect.translated(-window.origin)
+            if local.intersects(window.rect()):
+                window.update(local)
+        if not self._mask_pending:
+            self._mask_pending = True
+            QTimer.singleShot(0, self._commit_mask)
+
+    def _commit_mask(self):
+        self._mask_pending = False
+        pet_rects = [pet.geometry() for pet in self.pets if pet.isVisible()]
+        effect_rects = []
+        for pet in self.pets:
+            effect_rects.extend(self._effect_rects(pet))
+        for window in self.windows:
+            screen_rect = QRect(window.origin, window.size())
+            rects = effect_rects if window.effects else pet_rects
+            window.set_input_rects([r for r in rects if r.intersects(screen_rect)])
+
+    def _effect_rects(self, pet):
+        """Các vùng đang vẽ hiệu ứng của một pet: bong bóng nói, pháo hoa"""
+        rects = []
+        bubble = getattr(getattr(pet, 'speech_manager', None), 'speech_bubble', None)
+        if bubble is not None:
+            rects.append(bubble.geometry())
+        for fx in getattr(pet, '_active_fireworks', []):
+            rects.append(fx.geometry())
+        return rects
+
+    def paint(self, painter, clip):
+        """Vẽ các pet (toạ độ toàn cục, chỉ những pet giao với clip)"""
+        for pet in self.pets:
+            if pet.isVisible() and pet.geometry().intersects(clip):
+                pixmap = pet.pixmap()
+                if pixmap is not None and not pixmap.isNull():
+                    painter.drawPixmap(pet.geometry().topLeft(), pixmap)
+
+    def paint_effects(self, painter, clip):
+        """Vẽ bong bóng nói -> pháo hoa của mọi pet (toạ độ toàn cục, chỉ những gì giao với clip)"""
+        for pet in self.pets:
+            bubble = getattr(getattr(pet, 'speech_manager', None), 'speech_bubble', None)
+            if bubble is not None and bubble.geometry().intersects(clip):
+                bubble.render(painter, bubble.pos(), QRegion(), QWidget.DrawChildren)
+        for pet in self.pets:
+            for fx in getattr(pet, '_active_fireworks', []):
+                if fx.geometry().intersects(clip):
+                    fx.render(painter, fx.pos(), QRegion(), QWidget.DrawChildren)
+
+    def hit_test(self, global_pos):
+        """Pet trên cùng dưới điểm cho trước: trong khung và pixel không trong suốt (None nếu không có)"""
+        for pet in reversed(self.pets):
+            if not pet.isVisible() or not pet.geometry().contains(global_pos):
+                continue
+            pixmap = pet.pixmap()
+            if pixmap is None or pixmap.isNull():
+                continue
+            local = global_pos - pet.geometry().topLeft()
+            if local.x() < pixmap.width() and local.y() < pixmap.height():
+                if self._hit_image(pixmap).pixelColor(local).alpha() > 0:
+                    return pet
+        return None
+
+    def _hit_image(self, pixmap):
+        """QImage của khung hình để đọc alpha, chỉ chuyển đổi lần đầu gặp khung hình đó"""
+        key = pixmap.cacheKey()
+        image = self._hit_images.get(key)
+        if image is None:
+            if len(self._hit_images) >= HIT_IMAGE_CACHE_SIZE:
+                self._hit_images.clear()
+            image = pixmap.toImage()
+            self._hit_images[key] = image
+        return image
+
+
+# Renderer dùng chung cho cả process
+_shared_overlay = None
+
+
+def shared_overlay_renderer():
+    """Overlay renderer dùng chung (tạo lần đầu khi có pet chạy ở chế độ overlay)"""
+    global _shared_overlay
+    if _shared_overlay is None:
+        _shared_overlay = OverlayRenderer()
+    return _shared_overlay
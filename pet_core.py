@@ -0,0 +1,934 @@
+# pet_core.py - Lõi chuyển động và máy trạng thái hoạt động của pet, không phụ thuộc Qt
+#
+# Mọi thứ ở đây chạy trên đồng hồ và bộ hẹn giờ được truyền vào: app Qt dùng đồng hồ thật +
+# QTimer (frame_scheduler.QtTimers), mô phỏng headless (headless_sim.py) dùng VirtualClock +
+# VirtualTimers để chạy nhanh nhất có thể mà không cần màn hình.
+import heapq
+import math
+import random
+import time
+from config import ACTIVITIES, DEFAULT_SETTINGS, DISPLAY_SETTINGS
+from pet_log import get_logger
+
+_log = get_logger(__name__)
+
+# Bước vật lý cố định (ms). Mọi hằng số chuyển động (px/bước, gia tốc/bước) tính theo bước này,
+# độc lập với tần số vẽ (animation_fps) và với việc timer bắn trễ.
+TICK_MS = 16
+PHYSICS_STEP_S = TICK_MS / 1000.0
+# Nếu luồng chính bị treo lâu, chỉ bù tối đa chừng này thời gian (tránh chạy dồn hàng trăm bước)
+MAX_FRAME_S = 0.25
+
+# Ném / nảy
+THROW_MAX_SPEED = 55                # Giới hạn tốc độ ném (px/frame)
+THROW_MIN_SPEED = 8                 # Dưới ngưỡng này coi như thả rơi
+BOUNCE_DAMPING = 0.82               # Giữ năng lượng khi nảy góc
+BOUNCE_FRICTION = 0.995             # Ma sát nhẹ khi đang bay/nảy
+BOUNCE_STOP_SPEED = 1.2             # Dưới ngưỡng này thì dừng nảy
+BOUNCE_GRAVITY = 0.55
+# Pet đang bị ném va vào pet khác (spatial_grid.find_knocks)
+KNOCK_TRANSFER = 0.7                # Phần vận tốc truyền cho pet bị va
+KNOCK_KEEP = 0.3                    # Phần vận tốc ngang pet ném còn giữ sau cú va
+KNOCK_LIFT = 4                      # Hất pet bị va lên (px/frame)
+
+# Khoảng cách mặt đất tới đáy màn hình khi chỉ biết kích thước màn hình (chừa chỗ cho taskbar).
+# Vùng làm việc lấy từ hệ thống (screen_geometry.py) đã trừ taskbar/dock nên không cần chừa thêm.
+GROUND_MARGIN = 50
+# Thời gian pet "chết" trước khi hồi sinh (ms)
+RESURRECT_DELAY_MS = 3000
+# Hoãn đổi hoạt động trong lúc pet đang bị ném/nảy (ms)
+THROW_ACTIVITY_DELAY_MS = 12000
+
+ACTIVITY_NAMES = ('idle', 'walk', 'run', 'jump', 'fly', 'climb', 'fall', 'die')
+
+# Đường đi tính sẵn của các hoạt động có kịch bản (nhảy, bay, leo), đánh giá theo số bước đã đi
+PATH_NONE, PATH_JUMP, PATH_FLY, PATH_CLIMB = 0, 1, 2, 3
+JUMP_SPEED = 2          # px/bước theo chiều ngang khi nhảy lên (rơi xuống: một nửa)
+JUMP_RISE = 1.5         # px/bước khi nhảy lên
+JUMP_FALL = 1.0         # px/bước khi rơi xuống
+FLY_RATE = 0.008        # Tiến độ bay mỗi bước (~125 bước ~ 2 giây)
+FLY_BOB = 18            # Biên độ nhịp bay (px)
+CLIMB_UP_SPEED = 4      # px/bước khi leo lên
+CLIMB_FALL_SPEED = 6    # px/bước khi rơi xuống sau khi leo
+CLIMB_KEEP = 1 - ACTIVITIES['climb']['speed']  # Phần quãng còn lại tới cạnh sau mỗi bước
+
+
+class MonotonicClock:
+    """Đồng hồ thật (time.monotonic, giây)"""
+    def now(self):
+        return time.monotonic()
+
+
+class VirtualClock:
+    """Đồng hồ ảo: thời gian chỉ trôi khi gọi advance()"""
+    def __init__(self, start=0.0):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def advance(self, seconds):
+        self._now += seconds
+        return self._now
+
+
+class TimerHandle:
+    """Một lần hẹn giờ của VirtualTimers (hủy được)"""
+    def __init__(self, due, callback):
+        self.due = due
+        self.callback = callback
+        self.cancelled = False
+        self.fired = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def active(self):
+        return not (self.cancelled or self.fired)
+
+
+class VirtualTimers:
+    """Bộ hẹn giờ trên đồng hồ ảo: call_later(delay_ms, callback), callback chạy ở run_due()
+
+    Cùng giao diện với frame_scheduler.QtTimers nên máy trạng thái hoạt động không cần biết
+    mình đang chạy trên QTimer hay trên mô phỏng.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self._heap = []
+        self._seq = 0
+
+    def call_later(self, delay_ms, callback):
+        handle = TimerHandle(self.clock.now() + delay_ms / 1000.0, callback)
+        self._seq += 1
+        heapq.heappush(self._heap, (handle.due, self._seq, handle))
+        return handle
+
+    def next_due(self):
+        """Thời điểm hẹn giờ gần nhất còn hiệu lực (None nếu không có)"""
+        while self._heap and not self._heap[0][2].active():
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def run_due(self):
+        """Chạy mọi callback đã tới hạn theo thứ tự thời điểm, trả về số callback đã chạy"""
+        count = 0
+        now = self.clock.now()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, handle = heapq.heappop(self._heap)
+            if not handle.active():
+                continue
+            handle.fired = True
+            handle.callback()
+            count += 1
+        return count
+
+    def pending(self):
+        return sum(1 for _, _, handle in self._heap if handle.active())
+
+
+class WorkArea:
+    """Vùng làm việc của một màn hình (toạ độ toàn cục, đã trừ taskbar/dock)
+
+    floor là đáy vùng pet được đứng: bottom - floor_margin.
+    """
+    __slots__ = ('left', 'top', 'width', 'height', 'floor_margin')
+
+    def __init__(self, left, top, width, height, floor_margin=0):
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.floor_margin = floor_margin
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def bottom(self):
+        return self.top + self.height
+
+    @property
+    def floor(self):
+        return self.bottom - self.floor_margin
+
+    def contains(self, x, y):
+        return self.left <= x < self.right and self.top <= y < self.bottom
+
+    def distance_sq(self, x, y):
+        """Bình phương khoảng cách từ điểm tới vùng (0 nếu nằm trong)"""
+        dx = max(self.left - x, 0, x - self.right)
+        dy = max(self.top - y, 0, y - self.bottom)
+        return dx * dx + dy * dy
+
+    def __eq__(self, other):
+        return (isinstance(other, WorkArea) and self.left == other.left and self.top == other.top
+                and self.width == other.width and self.height == other.height
+                and self.floor_margin == other.floor_margin)
+
+    def __hash__(self):
+        return hash((self.left, self.top, self.width, self.height, self.floor_margin))
+
+    def __repr__(self):
+        return f"WorkArea({self.left}, {self.top}, {self.width}, {self.height})"
+
+
+class ScreenLayout:
+    """Các vùng làm việc của mọi màn hình, areas[0] là màn hình chính
+
+    Chỉ tra cứu trên danh sách đã lưu (không hỏi hệ thống): app Qt dựng lại layout khi màn hình
+    thay đổi (screen_geometry.py), mô phỏng headless dùng một hoặc vài màn hình ảo.
+    """
+    def __init__(self, areas):
+        if not areas:
+            raise ValueError("ScreenLayout cần ít nhất một vùng làm việc")
+        self.areas = tuple(areas)
+
+    @classmethod
+    def single(cls, screen_width, screen_height):
+        """Một màn hình chỉ biết kích thước: mặt đất chừa GROUND_MARGIN cho taskbar"""
+        return cls([WorkArea(0, 0, screen_width, screen_height, GROUND_MARGIN)])
+
+    @classmethod
+    def side_by_side(cls, sizes):
+        """Các màn hình (width, height) xếp ngang từ trái sang phải, mỗi màn hình chừa GROUND_MARGIN"""
+        areas = []
+        left = 0
+        for width, height in sizes:
+            areas.append(WorkArea(left, 0, width, height, GROUND_MARGIN))
+            left += width
+        return cls(areas)
+
+    @property
+    def primary(self):
+        return self.areas[0]
+
+    def area_at(self, x, y):
+        """Vùng chứa điểm (x, y), hoặc vùng gần nhất nếu điểm nằm ngoài mọi màn hình"""
+        for area in self.areas:
+            if area.contains(x, y):
+                return area
+        return min(self.areas, key=lambda area: area.distance_sq(x, y))
+
+    def bounds(self):
+        """Hình chữ nhật bao mọi màn hình (left, top, right, bottom)"""
+        return (min(a.left for a in self.areas), min(a.top for a in self.areas),
+                max(a.right for a in self.areas), max(a.bottom for a in self.areas))
+
+    def __eq__(self, other):
+        return isinstance(other, ScreenLayout) and self.areas == other.areas
+
+    def __hash__(self):
+        return hash(self.areas)
+
+    def __len__(self):
+        return len(self.areas)
+
+
+class PetMotion:
+    """Trạng thái chuyển động của một pet: vị trí, vận tốc, mặt đất và phần chuyển động của hoạt động
+
+    step() chạy một bước vật lý cố định PHYSICS_STEP_S; advance(elapsed) tích lũy thời gian thực và
+    chạy đủ số bước, giữ trạng thái trước đó để nội suy khi vẽ. Các mốc đáng chú ý được báo qua
+    on_event(event) ('climb_up' khi bắt đầu leo, 'bounce_end' khi ném xong, 'landed').
+
+    Pet luôn thuộc một vùng làm việc (WorkArea) của layout màn hình: đi/nảy trong vùng đó, đứng trên
+    mặt đất của vùng đó. Biên của vùng hiện tại được chép vào các thuộc tính số (screen_left,
+    screen_top, screen_width, screen_height, ground_y) nên mỗi bước chỉ so sánh số, không tra cứu.
+    Không truyền layout thì dùng một màn hình screen_width x screen_height (ScreenLayout.single).
+
+    Có surfaces (surfaces.SurfaceIndex) thì pet còn đứng và đi được trên cạnh trên các cửa sổ: khi rơi,
+    mặt đầu tiên chân pet đi qua được tra trong chỉ mục; khi đứng, mặt đất (ground_y) là cạnh đó và
+    khoảng ngang của nó được chép vào surface_left/surface_right nên đi quá mép chỉ là một phép so sánh.
+    """
+    def __init__(self, width, height, screen_width, screen_height, x=0, y=0, rng=None, log=_log.info,
+                 layout=None, surfaces=None):
+        self.rng = rng if rng is not None else random
+        self.log = log
+        self.on_event = None
+
+        # Vị trí & vận tốc
+        self.x, self.y = x, y
+        self.dx = 0
+        self.dy = 0
+        self.width = width
+        self.height = height
+
+        # Mặt đứng đang đứng (handle trong surfaces, -1 = mặt đất của màn hình) và khoảng ngang của nó
+        self.surfaces = surfaces
+        self.surface = -1
+        self.surface_left = -math.inf
+        self.surface_right = math.inf
+        self.surface_top = 0.0
+
+        # Trọng lực và mặt đất (theo vùng làm việc chứa tâm pet)
+        self.gravity = 0.5
+        self.layout = layout if layout is not None else ScreenLayout.single(screen_width, screen_height)
+        self._apply_area(self.layout.area_at(x + width / 2, y + height / 2))
+        self.is_on_ground = False
+        self.is_dragging = False
+        self.is_bouncing = False
+
+        # Hoạt động đang chạy và trạng thái chuyển động của nó
+        self.current_activity = 'idle'
+        self.is_jumping = False
+        self.is_flying = False
+        self.is_climbing = False
+        # Đường đi tính sẵn khi bắt đầu nhảy/bay/leo: loại, số bước đã đi, các mốc (bước) và tham số
+        #   nhảy: path_x0 + path_v * quãng ngang, mốc n1 = lên tới đỉnh, end = chạm đất
+        #   bay:  (path_x0, path_y0) -> (path_tx, path_ty) theo easing + nhịp bay, end = chạm đất
+        #   leo:  x tiến dần tới path_tx (mốc n1 = tới cạnh), lên tới path_ty (mốc n2), rơi xuống (end)
+        self.path = PATH_NONE
+        self._path_xy = None
+        self.path_step = 0
+        self.path_n1 = 0
+        self.path_n2 = 0
+        self.path_end = 0
+        self.path_x0 = self.path_y0 = 0.0
+        self.path_tx = self.path_ty = 0.0
+        self.path_v = 0.0
+
+        # Bước cố định: thời gian còn dư + trạng thái trước bước cuối (để nội suy)
+        self.accumulator = 0.0
+        self.prev_x, self.prev_y = x, y
+        self.physics_steps = 0
+
+    def _emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def _info(self, message, *args):
+        if self.log is not None:
+            self.log(message, *args)
+
+    def set_size(self, width, height):
+        """Đổi kích thước pet (mặt đất tính lại theo chiều cao)"""
+        self.width = width
+        self.height = height
+        self.ground_y = self._floor_top() - height
+
+    # ------------------------------------------------------------------
+    # Màn hình / vùng làm việc
+    # ------------------------------------------------------------------
+    def _apply_area(self, area):
+        """Chép biên của vùng làm việc vào các thuộc tính số dùng trong bước vật lý"""
+        self.area = area
+        self.screen_left = area.left
+        self.screen_top = area.top
+        self.screen_width = area.width
+        self.screen_height = area.height
+        self.ground_y = self._floor_top() - self.height
+
+    def update_area(self):
+        """Chuyển sang vùng làm việc chứa tâm pet (sau khi kéo thả, bay sang màn hình khác);
+        trả về True nếu vùng thay đổi"""
+        area = self.layout.area_at(self.x + self.width / 2, self.y + self.height / 2)
+        if area is self.area:
+            return False
+        self._apply_area(area)
+        return True
+
+    # ------------------------------------------------------------------
+    # Mặt đứng trên cửa sổ
+    # ------------------------------------------------------------------
+    def _floor_top(self):
+        """Độ cao chân pet khi đứng: cạnh trên cửa sổ đang đứng, hoặc đáy vùng làm việc"""
+        return self.surface_top if self.surface >= 0 else self.area.floor
+
+    def _stand_on(self, surface):
+        self.surface = surface.handle
+        self.surface_left = surface.left
+        self.surface_right = surface.right
+        self.surface_top = surface.top
+        self.ground_y = surface.top - self.height
+
+    def _leave_surface(self):
+        """Rời cạnh cửa sổ: mặt đất trở lại đáy vùng làm việc, pet đang đứng thì bắt đầu rơi"""
+        if self.surface < 0:
+            return
+        self.surface = -1
+        self.surface_left = -math.inf
+        self.surface_right = math.inf
+        self.ground_y = self.area.floor - self.height
+        if self.is_on_ground:
+            self.is_on_ground = False
+            self.dy = 0
+
+    def _land_on_surface(self, previous_bottom):
+        """Đang rơi: đứng lên cạnh cửa sổ đầu tiên mà chân pet đi qua trong bước này (nếu cao hơn mặt đất)"""
+        surface = self.surfaces.landing(self.x + self.width / 2, previous_bottom, self.y + self.height)
+        if surface is not None and surface.top - self.height < self.ground_y:
+            self._stand_on(surface)
+
+    def _bounce_surface(self, previous_bottom):
+        """Đang nảy: bay ra ngoài mép cửa sổ đang làm sàn thì bỏ sàn đó, rơi qua cạnh cửa sổ thì nảy trên nó"""
+        if self.surface >= 0 and not (self.surface_left <= self.x + self.width / 2 <= self.surface_right):
+            self._leave_surface()
+        if self.dy > 0:
+            self._land_on_surface(previous_bottom)
+
+    def check_support(self):
+        """Cạnh cửa sổ đang đứng còn ở dưới tâm pet không (cửa sổ có thể vừa bị dời/đóng/che)
+
+        Cửa sổ dời lên/xuống thì pet đứng theo; mất mặt đứng hoặc tâm pet ra ngoài mép thì pet rơi.
+        Trả về False nếu pet vừa rời mặt đứng.
+        """
+        if self.surface < 0:
+            return True
+        surface = self.surfaces.get(self.surface) if self.surfaces is not None else None
+        if surface is None or not (surface.left <= self.x + self.width / 2 <= surface.right):
+            self._leave_surface()
+            return False
+        if surface.top != self.surface_top or surface.left != self.surface_left or surface.right != self.surface_right:
+            self._stand_on(surface)
+            if self.is_on_ground:
+                self.y = self.ground_y
+        return True
+
+    def set_layout(self, layout):
+        """Layout màn hình thay đổi (thêm/bớt màn hình, đổi độ phân giải, taskbar di chuyển)
+
+        Pet về vùng chứa tâm của nó (hoặc vùng gần nhất), được kéo vào trong biên vùng và đứng trên
+        mặt đất mới; đường đi nhảy/bay/leo đang chạy bị hủy vì tính theo biên cũ, pet rơi xuống.
+        Trả về True nếu đã hủy đường đi.
+        """
+        self.layout = layout
+        self._apply_area(layout.area_at(self.x + self.width / 2, self.y + self.height / 2))
+        interrupted = self.path != PATH_NONE
+        if interrupted:
+            self.stop_activity()
+            self.is_on_ground = False
+            self.dy = 0
+        max_x = self.screen_left + self.screen_width - self.width
+        self.x = max(self.screen_left, min(self.x, max_x))
+        if self.is_on_ground or self.y > self.ground_y:
+            self.y = self.ground_y
+        elif self.y < self.screen_top:
+            self.y = self.screen_top
+        self.snap()
+        return interrupted
+
+    # ------------------------------------------------------------------
+    # Bước cố định + nội suy
+    # ------------------------------------------------------------------
+    def advance(self, elapsed):
+        """Tích lũy thời gian đã trôi qua và chạy đủ số bước cố định, trả về alpha nội suy trong [0, 1)
+
+        Đang đi theo đường tính sẵn thì nhảy thẳng tới đúng bước (O(1), không giới hạn MAX_FRAME_S):
+        khung hình trễ hay pet bị bỏ qua nhiều khung vẫn ở đúng vị trí theo thời gian.
+        """
+        if self.path != PATH_NONE:
+            self.accumulator += elapsed
+            steps = min(int(self.accumulator / PHYSICS_STEP_S), self.path_end - self.path_step)
+            if steps > 0:
+                self.prev_x, self.prev_y = self.path_position(self.path_step + steps - 1)
+                self.seek_path(self.path_step + steps)
+                self.physics_steps += steps
+                self.accumulator -= steps * PHYSICS_STEP_S
+            if self.path != PATH_NONE:
+                return self.accumulator / PHYSICS_STEP_S
+            # Đường đi vừa xong: phần thời gian còn lại chạy bước thường
+            self.accumulator = min(self.accumulator, MAX_FRAME_S)
+        else:
+            self.accumulator += min(elapsed, MAX_FRAME_S)
+        while self.accumulator >= PHYSICS_STEP_S:
+            self.prev_x, self.prev_y = self.x, self.y
+            self.step()
+            self.physics_steps += 1
+            self.accumulator -= PHYSICS_STEP_S
+        return self.accumulator / PHYSICS_STEP_S
+
+    def interpolate(self, alpha):
+        """Vị trí nội suy giữa trạng thái trước và hiện tại"""
+        return (self.prev_x + (self.x - self.prev_x) * alpha,
+                self.prev_y + (self.y - self.prev_y) * alpha)
+
+    def snap(self):
+        """Bỏ nội suy sau khi vị trí bị đặt trực tiếp (dịch chuyển tức thời, kéo chuột, đổi kích thước)"""
+        self.prev_x, self.prev_y = self.x, self.y
+
+    def reset_accumulator(self):
+        self.accumulator = 0.0
+
+    def is_at_rest(self):
+        """Pet đứng yên trên mặt đất, bước vật lý không còn gì để làm"""
+        return (not self.is_dragging and not self.is_bouncing and self.is_on_ground
+                and not (self.is_jumping or self.is_flying or self.is_climbing)
+                and self.current_activity not in ('walk', 'run'))
+
+    def step(self):
+        """Một bước vật lý cố định: chỉ chạy đúng phần chuyển động đang cần"""
+        # Ưu tiên vật lý ném/nảy
+        if self.is_bouncing:
+            self.bounce_step()
+        elif self.path != PATH_NONE:
+            self._step_path()
+        elif self.current_activity in ('walk', 'run'):
+            self.move_step()
+        elif self.current_activity == 'fall':
+            self.fall_step()
+        elif not self.is_on_ground:
+            # idle hoặc trạng thái khác: vẫn rơi nếu đang lơ lửng
+            self.fall_step()
+
+    # ------------------------------------------------------------------
+    # Bắt đầu / dừng phần chuyển động của hoạt động
+    # ------------------------------------------------------------------
+    def begin_activity(self, activity_name):
+        """Đặt trạng thái chuyển động ban đầu cho hoạt động mới"""
+        try:
+            self.current_activity = activity_name
+            rng = self.rng
+            if activity_name in ('walk', 'run'):
+                # Đi bộ chậm / chạy nhanh, ở mặt đất
+                self.dx = ACTIVITIES[activity_name]['speed'] * rng.choice([-1, 1])
+                self.is_on_ground = True
+                self.y = self.ground_y
+            elif activity_name == 'jump':
+                # Hướng nhảy ngẫu nhiên (-1: trái, 1: phải): lên nhanh tới đỉnh, rơi chậm hơn
+                direction = rng.choice([-1, 1])
+                self.is_jumping = True
+                self.is_on_ground = False
+                rise_steps = math.ceil(ACTIVITIES['jump']['height'] / JUMP_RISE)
+                peak = JUMP_RISE * rise_steps
+                self._start_path(PATH_JUMP, n1=rise_steps, end=rise_steps + math.ceil(peak / JUMP_FALL),
+                                 x0=self.x, v=direction * JUMP_SPEED)
+            elif activity_name == 'fly':
+                # Xuất hiện ở một trong hai cạnh màn hình (nửa trên) rồi bay đường cong xuống đất của
+                # một màn hình bất kỳ (nhiều màn hình: có thể bay sang màn hình khác)
+                self.is_flying = True
+                self.is_on_ground = False
+                self._leave_surface()
+                areas = self.layout.areas
+                target = rng.choice(areas) if len(areas) > 1 else self.area
+                if rng.choice(['left', 'right']) == 'left':
+                    self.x = self.screen_left
+                else:
+                    self.x = self.screen_left + self.screen_width - self.width
+                # Độ cao từ 10% đến 50% màn hình
+                self.y = self.screen_top + rng.randint(int(self.screen_height * 0.1), int(self.screen_height * 0.5))
+                target_x = target.left + rng.randint(0, max(0, target.width - self.width))
+                self._start_path(PATH_FLY, x0=self.x, y0=self.y, tx=target_x, ty=target.floor - self.height)
+                self.path_end = self._fly_end()
+            elif activity_name == 'climb':
+                # Đi đến cạnh màn hình rồi leo lên độ cao 10% - 40% màn hình
+                self.is_climbing = True
+                self.is_on_ground = False
+                left = rng.random() < 0.5
+                target_x = self.screen_left if left else self.screen_left + self.screen_width - self.width
+                target_y = self.screen_top + rng.randint(int(self.screen_height * 0.1), int(self.screen_height * 0.4))
+                # Đứng trên cửa sổ cao hơn độ cao đó: vẫn leo lên (ít nhất một bước) thay vì dịch thẳng tới đích
+                target_y = min(target_y, self.ground_y - CLIMB_UP_SPEED)
+                height = self.ground_y - target_y
+                n1 = self._climb_arrival(self.x, target_x)
+                n2 = n1 + max(1, math.ceil(height / CLIMB_UP_SPEED))
+                self._start_path(PATH_CLIMB, n1=n1, n2=n2, end=n2 + max(1, math.ceil(height / CLIMB_FALL_SPEED)),
+                                 x0=self.x, tx=target_x, ty=target_y)
+            elif activity_name == 'fall':
+                self.stop_activity()
+                self.is_on_ground = False
+        except Exception as e:
+            _log.error("Lỗi khi bắt đầu %s: %s", activity_name, e)
+
+    def stop_activity(self):
+        """Dừng phần chuyển động của hoạt động hiện tại"""
+        self.is_jumping = False
+        self.is_flying = False
+        self.is_climbing = False
+        self.path = PATH_NONE
+
+    def throw(self, vx, vy):
+        """Bắt đầu bị ném với vận tốc (px/frame); trả về False nếu lực quá nhẹ và pet chỉ rơi thường"""
+        # Có thể vừa được kéo khỏi cạnh cửa sổ / sang màn hình khác
+        self._leave_surface()
+        self.update_area()
+        speed = math.hypot(vx, vy)
+        if speed > THROW_MAX_SPEED:
+            scale = THROW_MAX_SPEED / speed
+            vx *= scale
+            vy *= scale
+        self.stop_activity()
+        self.is_on_ground = False
+        if speed < THROW_MIN_SPEED:
+            # Gần như thả đứng -> rơi thường
+            self.is_bouncing = False
+            self.dx = 0
+            self.dy = 0
+            return False
+        self.is_bouncing = True
+        self.dx = vx
+        self.dy = vy
+        self.current_activity = 'fall'
+        return True
+
+    def knock(self, other):
+        """Pet này (đang bị ném) va vào other: trả về vận tốc (vx, vy) để ném other, pet này mất đà
+
+        other bị hất ra xa theo phía của nó so với pet này, bay ít nhất THROW_MIN_SPEED để thành một
+        cú ném thật (nảy rồi dừng như bị người dùng ném).
+        """
+        direction = 1 if other.x + other.width / 2 >= self.x + self.width / 2 else -1
+        vx = direction * max(abs(self.dx) * KNOCK_TRANSFER, THROW_MIN_SPEED)
+        vy = min(self.dy, 0) * KNOCK_TRANSFER - KNOCK_LIFT
+        self.dx *= KNOCK_KEEP
+        return vx, vy
+
+    # ------------------------------------------------------------------
+    # Các bước chuyển động
+    # ------------------------------------------------------------------
+    def apply_gravity(self):
+        """Áp dụng trọng lực"""
+        # Không áp dụng trọng lực khi đang leo
+        if self.is_climbing:
+            return
+        if not self.is_on_ground:
+            self.dy += self.gravity
+            previous_bottom = self.y + self.height
+            self.y += self.dy
+            # Rơi qua cạnh trên một cửa sổ thì đứng lên đó
+            if self.surfaces is not None and self.dy > 0:
+                self._land_on_surface(previous_bottom)
+            # Kiểm tra va chạm với mặt đất
+            if self.y >= self.ground_y:
+                self.y = self.ground_y
+                self.dy = 0
+                self.is_on_ground = True
+
+    def move_step(self):
+        """Đi bộ/chạy ngang trên mặt đất, quay đầu ở cạnh màn hình"""
+        self.apply_gravity()
+        self.x += self.dx
+        if self.x <= self.screen_left:
+            self.x = self.screen_left
+            self.dx *= -1
+        elif self.x + self.width >= self.screen_left + self.screen_width:
+            self.x = self.screen_left + self.screen_width - self.width
+            self.dx *= -1
+        # Đảm bảo pet ở trên mặt đất khi đi bộ/chạy; đi quá mép cửa sổ đang đứng thì rơi xuống
+        if self.is_on_ground:
+            if self.surface_left <= self.x + self.width / 2 <= self.surface_right:
+                self.y = self.ground_y
+            else:
+                self._leave_surface()
+
+    # ------------------------------------------------------------------
+    # Đường đi tính sẵn (nhảy, bay, leo)
+    # ------------------------------------------------------------------
+    def _start_path(self, kind, n1=0, n2=0, end=0, x0=0.0, y0=0.0, tx=0.0, ty=0.0, v=0.0):
+        self.path = kind
+        self._path_xy = {PATH_JUMP: self._jump_position, PATH_FLY: self._fly_position,
+                         PATH_CLIMB: self._climb_position}[kind]
+        self.path_step = 0
+        self.path_n1, self.path_n2, self.path_end = n1, n2, end
+        self.path_x0, self.path_y0 = x0, y0
+        self.path_tx, self.path_ty = tx, ty
+        self.path_v = v
+
+    @staticmethod
+    def _climb_arrival(x0, target_x):
+        """Số bước tiến dần tới cạnh cho tới khi còn cách dưới min_distance"""
+        keep = CLIMB_KEEP
+        distance = abs(x0 - target_x)
+        min_distance = DISPLAY_SETTINGS['min_distance']
+        if distance < min_distance:
+            return 1
+        n = max(1, math.ceil(math.log(min_distance / distance) / math.log(keep)))
+        while distance * keep ** n >= min_distance:
+            n += 1
+        return n
+
+    def _fly_end(self):
+        """Bước chạm đất của đường bay: hết tiến độ hoặc nhịp bay chạm mặt đất sớm hơn"""
+        steps = math.ceil(1 / FLY_RATE)
+        for n in range(1, steps):
+            if self.path_position(n)[1] >= self.path_ty:
+                return n
+        return steps
+
+    def path_position(self, n):
+        """Vị trí ở bước thứ n của đường đi hiện tại (n = 0: điểm xuất phát)"""
+        if self.path == PATH_NONE:
+            return self.x, self.y
+        return self._path_xy(n)
+
+    def _jump_position(self, n):
+        # Lên JUMP_RISE px/bước tới đỉnh (mốc n1), rồi rơi JUMP_FALL px/bước với nửa tốc độ ngang
+        n1 = self.path_n1
+        if n <= n1:
+            distance = n
+            height = JUMP_RISE * n
+        else:
+            down = n - n1
+            distance = n1 + 0.5 * down
+            height = max(0.0, JUMP_RISE * n1 - JUMP_FALL * down)
+        x = min(self.path_x0 + self.path_v * distance, self.screen_left + self.screen_width - self.width)
+        left = self.screen_left
+        return (x if x > left else left), self.ground_y - height
+
+    def _fly_position(self, n):
+        # Ngang tuyến tính, dọc theo easing (ease-in-out) + nhịp bay sin tắt dần. eased nằm trong
+        # [0, 1] nên x luôn giữa điểm xuất phát và đích (có thể ở hai màn hình khác nhau)
+        t = n * FLY_RATE
+        if t > 1.0:
+            t = 1.0
+        eased = t * t * (3 - 2 * t)
+        bob = math.sin(t * math.pi * 2) * FLY_BOB * (1 - t)
+        x0, y0 = self.path_x0, self.path_y0
+        return x0 + (self.path_tx - x0) * eased, y0 + (self.path_ty - y0) * eased - bob
+
+    def _climb_position(self, n):
+        # x tiến dần tới cạnh (mỗi bước đi một phần quãng còn lại), sau mốc n1 thì đứng yên
+        n1, n2 = self.path_n1, self.path_n2
+        tx = self.path_tx
+        x = tx + (self.path_x0 - tx) * CLIMB_KEEP ** (n if n < n1 else n1)
+        if n <= n1:
+            return x, self.ground_y
+        if n <= n2:
+            return x, max(self.path_ty, self.ground_y - CLIMB_UP_SPEED * (n - n1))
+        return x, min(self.ground_y, self.path_ty + CLIMB_FALL_SPEED * (n - n2))
+
+    def _step_path(self):
+        """Một bước của đường đi: chỉ đánh giá công thức tại bước kế tiếp"""
+        n = self.path_step + 1
+        self.path_step = n
+        self.x, self.y = self._path_xy(n)
+        if n >= self.path_end:
+            self._finish_path()
+        elif self.path == PATH_CLIMB and (n == self.path_n1 or n == self.path_n2):
+            self._pass_climb_marks(n - 1, n)
+
+    def _pass_climb_marks(self, previous, n):
+        if previous < self.path_n1 <= n:
+            self._info("Bắt đầu leo lên!")
+            self._emit('climb_up')
+        if previous < self.path_n2 <= n:
+            self._info("Đã leo lên độ cao %d!", self.path_ty)
+
+    def seek_path(self, n):
+        """Đi tới bước n của đường đi (O(1)), báo các mốc đã vượt qua theo thứ tự"""
+        previous = self.path_step
+        n = min(n, self.path_end)
+        self.path_step = n
+        self.x, self.y = self._path_xy(n)
+        if self.path == PATH_CLIMB:
+            self._pass_climb_marks(previous, n)
+        if n >= self.path_end:
+            self._finish_path()
+
+    def _finish_path(self):
+        """Hết đường đi: chạm đất"""
+        kind = self.path
+        self.stop_activity()
+        if kind == PATH_FLY:
+            # Đích bay có thể ở màn hình khác: đứng trên mặt đất của màn hình đó
+            self.y = self.path_ty
+            self.update_area()
+        self.y = self.ground_y
+        self.is_on_ground = True
+        if self.surface >= 0:
+            # Nhảy/leo có thể đưa pet ra ngoài mép cửa sổ đang đứng
+            self.check_support()
+        if kind == PATH_FLY:
+            self._info("Đã bay xuống đất!")
+        elif kind == PATH_CLIMB:
+            self._info("Đã rơi xuống đất!")
+        self._emit('landed')
+
+    def fall_step(self):
+        """Rơi theo trọng lực"""
+        self.apply_gravity()
+        if self.is_on_ground:
+            self.y = self.ground_y
+
+    def bounce_step(self):
+        """Nảy trong vùng làm việc hiện tại sau khi bị ném (va chạm 4 cạnh)"""
+        self.dy += BOUNCE_GRAVITY
+        self.dx *= BOUNCE_FRICTION
+        self.dy *= BOUNCE_FRICTION
+        previous_bottom = self.y + self.height
+        self.x += self.dx
+        self.y += self.dy
+        if self.surfaces is not None:
+            self._bounce_surface(previous_bottom)
+
+        min_x = self.screen_left
+        max_x = min_x + self.screen_width - self.width
+        max_y = self.ground_y
+        bounced = False
+        if self.x <= min_x:
+            self.x = min_x
+            self.dx = abs(self.dx) * BOUNCE_DAMPING
+            bounced = True
+        elif self.x >= max_x:
+            self.x = max_x
+            self.dx = -abs(self.dx) * BOUNCE_DAMPING
+            bounced = True
+        if self.y <= self.screen_top:
+            self.y = self.screen_top
+            self.dy = abs(self.dy) * BOUNCE_DAMPING
+            bounced = True
+        elif self.y >= max_y:
+            self.y = max_y
+            self.dy = -abs(self.dy) * BOUNCE_DAMPING
+            bounced = True
+            # Ma sát sàn khi chạm đất
+            self.dx *= 0.9
+
+        # Dừng khi đã chậm và đang gần mặt đất
+        speed = math.hypot(self.dx, self.dy)
+        near_ground = self.y >= max_y - 2
+        if near_ground and (speed < BOUNCE_STOP_SPEED or (bounced and speed < BOUNCE_STOP_SPEED * 1.5)):
+            self.is_bouncing = False
+            self.dx = 0
+            self.dy = 0
+            self.y = self.ground_y
+            self.is_on_ground = True
+            self._emit('bounce_end')
+
+
+class ActivityStateMachine:
+    """Chọn và chuyển hoạt động của pet theo thời gian (đổi ngẫu nhiên, chết rồi hồi sinh)
+
+    Hẹn giờ qua timers.call_later(delay_ms, callback) (QTimer trong app, VirtualTimers khi mô
+    phỏng). Phần việc ngoài chuyển động được báo qua listener(event, value):
+    'activity' (hoạt động mới bắt đầu), 'speak' (nên nói một câu), 'resurrect', 'timer' và các
+    sự kiện chuyển động của PetMotion ('climb_up', 'landed', 'bounce_end').
+    """
+    def __init__(self, motion, timers, rng=None, log=_log.info, listener=None):
+        self.motion = motion
+        self.timers = timers
+        self.rng = rng if rng is not None else random
+        self.log = log
+        self.listener = listener
+        self.closed = False
+        self._change_handle = None
+        self._resurrect_handle = None
+        motion.on_event = self._on_motion_event
+
+    @property
+    def current_activity(self):
+        return self.motion.current_activity
+
+    @current_activity.setter
+    def current_activity(self, value):
+        self.motion.current_activity = value
+
+    def _notify(self, event, value=None):
+        if self.listener is not None:
+            self.listener(event, value)
+
+    def _info(self, message, *args):
+        if self.log is not None:
+            self.log(message, *args)
+
+    def _on_motion_event(self, event):
+        self._notify(event)
+        if event == 'bounce_end':
+            # Ném xong -> đứng yên tại chỗ rơi
+            self.manual_set_activity('idle')
+
+    def start_activity_timer(self, delay_ms=None):
+        """Hẹn lần đổi hoạt động ngẫu nhiên kế tiếp (mặc định sau activity_change_interval)"""
+        try:
+            if self._change_handle is not None:
+                self._change_handle.cancel()
+            if delay_ms is None:
+                min_interval, max_interval = DEFAULT_SETTINGS['activity_change_interval']
+                delay_ms = self.rng.randint(min_interval, max_interval)
+            self._change_handle = self.timers.call_later(delay_ms, self.change_activity)
+            self._info("Timer hoạt động đã bắt đầu với interval: %sms cho hoạt động: %s", delay_ms, self.current_activity)
+            self._notify('timer', delay_ms)
+        except Exception as e:
+            _log.error("Lỗi khi bắt đầu activity timer: %s", e)
+
+    def change_activity(self):
+        """Thay đổi hoạt động ngẫu nhiên"""
+        try:
+            if self.closed or self.current_activity == 'die':
+                return  # Không thay đổi nếu đang chết
+            # Đang bị ném/nảy thì hoãn đổi hành động
+            if self.motion.is_bouncing:
+                self.start_activity_timer()
+                return
+
+            self.stop_current_activity()
+
+            available_activities = [a for a in ACTIVITY_NAMES if a != self.current_activity]
+            # Giảm khả năng chọn "die" (chỉ 5% cơ hội)
+            if 'die' in available_activities and self.rng.random() > 0.05:
+                available_activities.remove('die')
+
+            new_activity = self.rng.choice(available_activities)
+            self._info("Thay đổi hoạt động từ %s sang %s", self.current_activity, new_activity)
+            self._notify('speak', new_activity)
+            self.start_activity(new_activity)
+            self.start_activity_timer()
+        except Exception as e:
+            _log.error("Lỗi khi thay đổi activity: %s", e)
+
+    def manual_set_activity(self, activity_name):
+        """Đặt hoạt động theo yêu cầu và lùi lại lần đổi ngẫu nhiên"""
+        try:
+            if activity_name not in ACTIVITY_NAMES:
+                return
+            self.stop_current_activity()
+            self.start_activity(activity_name)
+            # Lùi thời điểm tự đổi hành động để pet giữ hành động vừa chọn
+            if activity_name != 'die':
+                self.start_activity_timer()
+        except Exception as e:
+            _log.error("Lỗi khi đặt hoạt động thủ công: %s", e)
+
+    def start_activity(self, activity_name):
+        """Bắt đầu hoạt động mới"""
+        try:
+            if self.closed:
+                return
+            self.motion.begin_activity(activity_name)
+            if activity_name == 'die':
+                # Đóng băng pet, sau RESURRECT_DELAY_MS sẽ hồi sinh
+                if self._resurrect_handle is not None:
+                    self._resurrect_handle.cancel()
+                self._resurrect_handle = self.timers.call_later(RESURRECT_DELAY_MS, self.resurrect_pet)
+            self._notify('activity', activity_name)
+            # Hoạt động mới có thể đặt thẳng vị trí (bay xuất hiện ở cạnh màn hình): không nội suy qua đó
+            self.motion.snap()
+        except Exception as e:
+            _log.error("Lỗi khi bắt đầu activity: %s", e)
+
+    def stop_current_activity(self):
+        try:
+            self.motion.stop_activity()
+        except Exception as e:
+            _log.error("Lỗi khi dừng activity: %s", e)
+
+    def resurrect_pet(self):
+        """Hồi sinh pet và chuyển sang hoạt động khác"""
+        try:
+            if self.closed:
+                return
+            self._info("Pet đã hồi sinh! 🎉")
+            self.current_activity = 'idle'
+            self.motion.is_on_ground = True
+            self.motion.y = self.motion.ground_y
+            self._notify('resurrect')
+            self.change_activity()
+        except Exception as e:
+            _log.error("Lỗi khi hồi sinh pet: %s", e)
+
+    def postpone(self, delay_ms=THROW_ACTIVITY_DELAY_MS):
+        """Lùi lần đổi hoạt động kế tiếp (ví dụ trong lúc pet đang bị ném)"""
+        self.start_activity_timer(delay_ms)
+
+    def cleanup(self):
+        """Hủy mọi hẹn giờ và dừng hoạt động"""
+        try:
+            self.closed = True
+            for handle in (self._change_handle, self._resurrect_handle):
+                if handle is not None:
+                    handle.cancel()
+            self.stop_current_activity()
+            self.current_activity = 'idle'
+        except Exception as e:
+            _log.error("Lỗi khi cleanup activity: %s", e)
@@ -0,0 +1,183 @@
+# pet_log.py - Log theo cấp độ, ghi ở luồng nền, gộp/giới hạn log lặp lại theo vị trí gọi
+#
+# Mọi module lấy logger bằng get_logger(__name__) và gọi kiểu lazy: log.info("... %s", x).
+# Khi cấp độ bị tắt, lời gọi chỉ tốn một lần kiểm tra isEnabledFor (không format chuỗi,
+# không khóa, không I/O). Bản ghi vượt qua bộ lọc được đưa vào hàng đợi và một luồng nền
+# ghi ra console + bộ đệm vòng trong bộ nhớ (dump_log() để xuất ra file).
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT_LOGGER = 'pet'
+# Cấp độ mặc định (ghi đè bằng biến môi trường PET_LOG_LEVEL hoặc 'log_level' trong pet_config.json)
+DEFAULT_LEVEL = 'INFO'
+LEVELS = {
+    'DEBUG': logging.DEBUG,
+    'INFO': logging.INFO,
+    'WARNING': logging.WARNING,
+    'ERROR': logging.ERROR,
+    'OFF': logging.CRITICAL + 1,
+}
+# Mỗi vị trí gọi: tối đa RATE_BURST bản ghi trong RATE_WINDOW_S giây
+RATE_BURST = 5
+RATE_WINDOW_S = 10.0
+RING_CAPACITY = 2000
+LOG_FORMAT = '%(asctime)s.%(msecs)03d %(levelname)-7s %(name)s: %(message)s'
+DATE_FORMAT = '%H:%M:%S'
+
+
+class _CallSite:
+    __slots__ = ('window_start', 'count', 'last_message', 'suppressed')
+
+    def __init__(self, now):
+        self.window_start = now
+        self.count = 0
+        self.last_message = None
+        self.suppressed = 0
+
+
+class CallSiteRateLimiter(logging.Filter):
+    """Bỏ bớt log lặp lại theo vị trí gọi (file + dòng)
+
+    Cùng một dòng code: thông điệp giống hệt lần trước chỉ được ghi một lần mỗi cửa sổ
+    RATE_WINDOW_S, và tổng cộng tối đa RATE_BURST bản ghi mỗi cửa sổ. Số bản ghi bị bỏ được
+    nối vào bản ghi kế tiếp của cùng vị trí đó. Chạy ở luồng gọi, trước khi vào hàng đợi.
+    """
+    def __init__(self, burst=RATE_BURST, window_s=RATE_WINDOW_S):
+        super().__init__()
+        self.burst = burst
+        self.window_s = window_s
+        self._sites = {}
+        self._lock = threading.Lock()
+        self.suppressed_total = 0
+
+    def filter(self, record):
+        message = record.getMessage()
+        key = (record.pathname, record.lineno)
+        now = record.created
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = _CallSite(now)
+            if now - site.window_start >= self.window_s:
+                site.window_start = now
+                site.count = 0
+                site.last_message = None
+            if message == site.last_message or site.count >= self.burst:
+                site.suppressed += 1
+                self.suppressed_total += 1
+                return False
+            site.count += 1
+            site.last_message = message
+            suppressed, site.suppressed = site.suppressed, 0
+        if suppressed:
+            record.msg = f"{message} (bỏ qua {suppressed} bản ghi lặp lại)"
+            record.args = None
+        return True
+
+
+class RingBufferHandler(logging.Handler):
+    """Giữ RING_CAPACITY dòng log gần nhất trong bộ nhớ"""
+    def __init__(self, capacity=RING_CAPACITY):
+        super().__init__()
+        self.lines = deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self.lines.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+_listener = None
+_ring = None
+_limiter = None
+
+
+def _level_value(level):
+    if isinstance(level, int):
+        return level
+    return LEVELS.get(str(level).upper(), LEVELS[DEFAULT_LEVEL])
+
+
+def setup_logging(level=None, console=True, ring_capacity=RING_CAPACITY):
+    """Cấu hình logger gốc 'pet' (chỉ lần đầu; các lần sau chỉ đổi cấp độ)"""
+    global _listener, _ring, _limiter
+    if level is None:
+        level = os.environ.get('PET_LOG_LEVEL', DEFAULT_LEVEL)
+    root = logging.getLogger(ROOT_LOGGER)
+    if _listener is not None:
+        root.setLevel(_level_value(level))
+        return root
+
+    formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+    _ring = RingBufferHandler(ring_capacity)
+    _ring.setFormatter(formatter)
+    handlers = [_ring]
+    # Bản exe chạy windowed không có console: chỉ giữ bộ đệm vòng
+    stream = sys.stdout or sys.stderr
+    if console and stream is not None:
+        console_handler = logging.StreamHandler(stream)
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    _limiter = CallSiteRateLimiter()
+    queue_handler.addFilter(_limiter)
+    root.addHandler(queue_handler)
+    root.propagate = False
+    root.setLevel(_level_value(level))
+
+    _listener = QueueListener(log_queue, *handlers)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def set_log_level(level):
+    """Đổi cấp độ log ('DEBUG', 'INFO', 'WARNING', 'ERROR' hoặc 'OFF')"""
+    setup_logging(level)
+
+
+def get_logger(name):
+    """Logger con của 'pet' cho một module (cấu hình mặc định ở lần gọi đầu)"""
+    if _listener is None:
+        setup_logging()
+    if name == '__main__':
+        name = os.path.splitext(os.path.basename(sys.argv[0] or 'main'))[0]
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+
+def recent_log_lines():
+    """Các dòng log gần nhất trong bộ đệm vòng"""
+    return list(_ring.lines) if _ring is not None else []
+
+
+def dump_log(path='pet_log.txt'):
+    """Ghi bộ đệm vòng ra file, trả về số dòng đã ghi"""
+    lines = recent_log_lines()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+        if lines:
+            f.write('\n')
+    return len(lines)
+
+
+def log_stats():
+    return {
+        'level': logging.getLevelName(logging.getLogger(ROOT_LOGGER).level),
+        'buffered_lines': len(_ring.lines) if _ring is not None else 0,
+        'suppressed': _limiter.suppressed_total if _limiter is not None else 0,
+    }
+
+
+def shutdown_logging():
+    """Ghi nốt hàng đợi rồi dừng luồng nền (tự gọi khi thoát, gọi nhiều lần vẫn an toàn)"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
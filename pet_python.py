@@ -1,26 +1,35 @@
 # pet_python_gif.py
 import sys
 import os
+import json
 import random
 import math
 import shutil
 import time
+from collections import deque
 from PyQt5.QtWidgets import (QApplication, QLabel, QWidget, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QSlider, QLabel as QLabelWidget, QMenu)
-from PyQt5.QtGui import QMovie, QFont, QPainter, QColor, QPen, QBrush, QCursor, QRadialGradient
-from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, QRect, QPoint, QPointF, QSize
+                             QPushButton, QSlider, QLabel as QLabelWidget, QMenu, QMessageBox)
+from PyQt5.QtGui import QFont, QPainter, QColor, QPen, QBrush, QCursor, QRadialGradient
+from PyQt5.QtCore import Qt, QTimer, QPropertyAnimation, QEasingCurve, QRect, QPoint, QPointF
 from config import SUPPORTED_PETS, ACTIVITIES, DEFAULT_SETTINGS, DISPLAY_SETTINGS, PET_SIZE_SETTINGS, PET_SPEECH, DEFAULT_SPEECH
-
-# Chu kỳ cập nhật khung hình (~60fps). Chỉ một timer duy nhất dùng cho toàn bộ chuyển động.
-TICK_MS = 16
-
-# Ném / nảy
+from animation_cache import (shared_frame_cache, content_hash, load_atlas, directory_index,
+                             bundle_name, decode_gif_bytes)
+from asset_bundle import open_asset_bundle
+from frame_scheduler import (shared_frame_scheduler, QtTimers, PHASE_PHYSICS, PHASE_ATTACHMENTS,
+                             PHASE_EFFECTS, PHASE_COMMIT)
+from overlay_renderer import shared_overlay_renderer
+from screen_geometry import shared_screen_geometry, shared_desktop_surfaces
+from frame_stats import FrameStats, write_samples_csv
+from pet_core import PetMotion, ActivityStateMachine, ACTIVITY_NAMES, TICK_MS, THROW_ACTIVITY_DELAY_MS
+from pet_log import get_logger, dump_log
+
+log = get_logger(__name__)
+
+# Cửa sổ thời gian (giây) để tính số lần đánh thức vòng lặp mỗi phút
+WAKEUP_WINDOW_S = 60.0
+
+# Ném (vật lý nảy nằm trong pet_core)
 THROW_VELOCITY_SCALE = 2.8          # Nhân vận tốc kéo thả để văng mạnh hơn
-THROW_MAX_SPEED = 55                # Giới hạn tốc độ ném (px/frame)
-BOUNCE_DAMPING = 0.82               # Giữ năng lượng khi nảy góc
-BOUNCE_FRICTION = 0.995             # Ma sát nhẹ khi đang bay/nảy
-BOUNCE_STOP_SPEED = 1.2             # Dưới ngưỡng này thì dừng nảy
-BOUNCE_GRAVITY = 0.55
 
 # Pháo hoa
 FIREWORKS_DURATION_MS = 3000
@@ -54,8 +63,9 @@ class SpeechBubble(QWidget):
 
 class FireworksEffect(QWidget):
     """Cửa sổ trong suốt vẽ pháo hoa tại một điểm trên màn hình (~3 giây)."""
-    def __init__(self, center_x, center_y, duration_ms=FIREWORKS_DURATION_MS, parent=None):
+    def __init__(self, center_x, center_y, duration_ms=FIREWORKS_DURATION_MS, parent=None, overlay=None):
         super().__init__(parent)
+        self.overlay = overlay  # Chế độ overlay: không hiện cửa sổ riêng, overlay vẽ hộ
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
         self.setAttribute(Qt.WA_TranslucentBackground, True)
         self.setAttribute(Qt.WA_ShowWithoutActivating, True)
@@ -63,19 +73,14 @@ class FireworksEffect(QWidget):
         self.setFixedSize(FIREWORKS_SIZE, FIREWORKS_SIZE)
         self.move(int(center_x - FIREWORKS_SIZE / 2), int(center_y - FIREWORKS_SIZE / 2))
 
-        self._start = time.time()
+        self._start = time.monotonic()
+        self._elapsed = 0.0
         self._duration = max(0.5, duration_ms / 1000.0)
         self._bursts = [self._make_burst() for _ in range(3)]
         self._spawn_times = [0.0, 0.35, 0.75]
 
-        self._timer = QTimer(self)
-        self._timer.timeout.connect(self._on_tick)
-        self._timer.start(TICK_MS)
-
-        self._kill_timer = QTimer(self)
-        self._kill_timer.setSingleShot(True)
-        self._kill_timer.timeout.connect(self.close)
-        self._kill_timer.start(duration_ms)
+        # Cập nhật theo đồng hồ khung hình chung (phase hiệu ứng), tự đóng khi hết thời gian
+        self._subscription = shared_frame_scheduler().subscribe(self._on_tick, PHASE_EFFECTS, 'fireworks')
 
     def _make_burst(self):
         colors = [
@@ -99,8 +104,8 @@ class FireworksEffect(QWidget):
             })
         return particles
 
-    def _on_tick(self):
-        elapsed = time.time() - self._start
+    def _on_tick(self, now):
+        elapsed = self._elapsed = now - self._start
         if elapsed >= self._duration:
             self.close()
             return
@@ -114,12 +119,18 @@ class FireworksEffect(QWidget):
                 p['vx'] *= 0.985
                 p['vy'] *= 0.985
                 p['life'] = max(0.0, p['life'] - 0.018)
-        self.update()
+        self._request_paint()
+
+    def _request_paint(self):
+        if self.overlay is not None:
+            self.overlay.damage(self.geometry())
+        else:
+            self.update()
 
     def paintEvent(self, event):
         painter = QPainter(self)
         painter.setRenderHint(QPainter.Antialiasing, True)
-        elapsed = time.time() - self._start
+        elapsed = self._elapsed
         for i, burst in enumerate(self._bursts):
             if elapsed < self._spawn_times[i]:
                 continue
@@ -144,28 +155,110 @@ class FireworksEffect(QWidget):
 
     def closeEvent(self, event):
         try:
-            if self._timer.isActive():
-                self._timer.stop()
-            if self._kill_timer.isActive():
-                self._kill_timer.stop()
+            shared_frame_scheduler().unsubscribe(self._subscription)
+            if self.overlay is not None:
+                self.overlay.damage(self.geometry())
         except Exception:
             pass
         super().closeEvent(event)
         self.deleteLater()
 
+class FrameStatsHud(QLabel):
+    """Bảng nhỏ cạnh pet hiện thời gian khung hình (p50/p95/max), bật/tắt từ menu chuột phải"""
+    REFRESH_MS = 250
+
+    def __init__(self, pet):
+        super().__init__()
+        self.pet = pet
+        self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+        self.setAttribute(Qt.WA_ShowWithoutActivating, True)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+        self.setStyleSheet("background-color: rgba(20, 20, 20, 200); color: #B9F6CA;"
+                           "font-family: monospace; font-size: 11px; padding: 4px; border-radius: 6px;")
+        # Làm mới vài lần mỗi giây là đủ đọc, không cần theo từng khung hình
+        self._timer = QTimer()
+        self._timer.timeout.connect(self.refresh)
+
+    def start(self):
+        self.refresh()
+        self.show()
+        self._timer.start(self.REFRESH_MS)
+
+    def stop(self):
+        self._timer.stop()
+        self.hide()
+
+    def refresh(self):
+        try:
+            pet = self.pet
+            if pet._closed:
+                self.stop()
+                return
+            self.setText(format_frame_timing(pet.frame_timing_report()))
+            self.adjustSize()
+            x, y = pet.target_position()
+            self.move(int(x + pet.width() + 8), int(y))
+        except Exception as e:
+            log.error("Lỗi khi cập nhật HUD khung hình: %s", e)
+
+
+def format_frame_timing(report):
+    """Vài dòng tóm tắt frame_timing_report() cho HUD"""
+    def line(label, s):
+        return f"{label:<12}{s['p50_ms']:>7.2f}{s['p95_ms']:>7.2f}{s['max_ms']:>7.2f}"
+
+    pet = report['pet']
+    scheduler = report['scheduler']
+    lines = [f"{report['pet_type']} · {report['activity']}", f"{'ms':<12}{'p50':>7}{'p95':>7}{'max':>7}"]
+    for name, s in pet.items():
+        if name.startswith('tick:'):
+            lines.append(line(name, s))
+    if 'paint' in pet:
+        lines.append(line('paint', pet['paint']))
+    if 'paint:overlay' in scheduler:
+        lines.append(line('paint:overlay', scheduler['paint:overlay']))
+    if 'frame' in scheduler:
+        lines.append(line('frame', scheduler['frame']))
+    if 'jitter' in scheduler:
+        lines.append(line('jitter', scheduler['jitter']))
+    lines.append(f"khung: {report['frames']}, bỏ lỡ: {report['dropped_frames']}")
+    return "\n".join(lines)
+
+
 class AnimationManager:
-    def __init__(self, pet_type="cat"):
+    def __init__(self, pet_type="cat", frame_cache=None):
         self.pet_type = pet_type
+        # Cache khung hình đã giải mã (mặc định dùng chung cho mọi pet)
+        self.frame_cache = frame_cache if frame_cache is not None else shared_frame_cache()
         if pet_type in SUPPORTED_PETS:
             self.animations_path = SUPPORTED_PETS[pet_type]["animations_path"]
         else:
             self.animations_path = f"assets/animations/{pet_type}"
 
-        # Tự động tạo thư mục và copy ảnh nếu cần
-        self.ensure_animations_exist()
-
         self.animations = {}
-        self.load_animations()
+        # Hash nội dung của từng file: file giống hệt nhau dùng chung khung hình đã giải mã
+        self.asset_hashes = {}
+
+        # Gói asset một file (mmap) nếu có; file GIF đọc từ gói: đường dẫn -> tên trong gói
+        self.bundle = open_asset_bundle()
+        self.packed_files = {}
+
+        # Ưu tiên sprite atlas đã build sẵn: một lần đọc ảnh thay cho quét + giải mã từng GIF
+        self.atlas = None
+        try:
+            self.atlas = load_atlas(pet_type, bundle=self.bundle, animations_path=self.animations_path)
+        except Exception as e:
+            log.error("Lỗi khi load sprite atlas: %s", e)
+
+        if self.atlas is not None:
+            self.load_from_atlas()
+        elif self.bundle is not None and self.bundle.listdir(bundle_name(self.animations_path)):
+            self.load_from_bundle()
+        else:
+            # Không có gói asset: đọc thư mục assets/animations/<pet> (chế độ phát triển)
+            # Tự động tạo thư mục và copy ảnh nếu cần
+            self.ensure_animations_exist()
+            self.load_animations()
 
     def ensure_animations_exist(self):
         """Đảm bảo thư mục animation tồn tại và có ảnh"""
@@ -173,63 +266,190 @@ class AnimationManager:
             # Tạo thư mục nếu chưa tồn tại
             if not os.path.exists(self.animations_path):
                 os.makedirs(self.animations_path, exist_ok=True)
-                print(f"Đã tạo thư mục: {self.animations_path}")
+                log.info("Đã tạo thư mục: %s", self.animations_path)
 
             # Kiểm tra xem thư mục có ảnh không
-            if os.path.exists(self.animations_path):
-                files = os.listdir(self.animations_path)
-                gif_files = [f for f in files if f.endswith('.gif')]
-
+            index = directory_index(self.animations_path)
+            if index is not None:
                 # Nếu không có ảnh, copy từ thư mục cat
-                if not gif_files and self.pet_type != "cat":
-                    cat_path = "assets/animations/cat"
-                    if os.path.exists(cat_path):
-                        for file in os.listdir(cat_path):
-                            if file.endswith('.gif'):
-                                src = os.path.join(cat_path, file)
-                                dst = os.path.join(self.animations_path, file)
-                                shutil.copy2(src, dst)
-                                print(f"Đã copy: {file} -> {self.animations_path}")
+                if not index.gif_files and self.pet_type != "cat":
+                    cat_index = directory_index("assets/animations/cat")
+                    if cat_index is not None:
+                        for src in cat_index.gif_files:
+                            file = os.path.basename(src)
+                            dst = os.path.join(self.animations_path, file)
+                            shutil.copy2(src, dst)
+                            log.info("Đã copy: %s -> %s", file, self.animations_path)
         except Exception as e:
-            print(f"Lỗi khi tạo thư mục animation: {e}")
+            log.error("Lỗi khi tạo thư mục animation: %s", e)
 
     def load_animations(self):
-        """Load tất cả animation từ thư mục"""
+        """Load tất cả animation từ chỉ mục thư mục (một lần quét, dùng chung giữa các pet)"""
         try:
-            if not os.path.exists(self.animations_path):
-                print(f"Thư mục {self.animations_path} không tồn tại!")
+            index = directory_index(self.animations_path)
+            if index is None:
+                log.warning("Thư mục %s không tồn tại!", self.animations_path)
                 return
 
-            animation_types = list(ACTIVITIES.keys())
-
-            for anim_type in animation_types:
-                self.animations[anim_type] = []
-                # Tìm tất cả file bắt đầu với tên animation
-                for file in os.listdir(self.animations_path):
-                    if file.startswith(f"{anim_type}_") and file.endswith('.gif'):
-                        self.animations[anim_type].append(os.path.join(self.animations_path, file))
+            for anim_type in ACTIVITIES:
+                self.animations[anim_type] = list(index.variants(anim_type))
+            self.asset_hashes.update(index.hashes)
+            log.info("Pet %s: %s file animation, %s asset duy nhất", self.pet_type, len(index.gif_files), self.unique_asset_count())
         except Exception as e:
-            print(f"Lỗi khi load animations: {e}")
+            log.error("Lỗi khi load animations: %s", e)
+
+    def load_from_atlas(self):
+        """Lấy danh sách animation + hash nội dung từ manifest của atlas (không quét thư mục)"""
+        for anim_type in ACTIVITIES:
+            self.animations[anim_type] = []
+        for anim_type, files in self.atlas.activities.items():
+            for file_name, digest in files.items():
+                file_path = os.path.join(self.animations_path, file_name)
+                self.animations.setdefault(anim_type, []).append(file_path)
+                self.asset_hashes[file_path] = digest
+        log.info("Pet %s: dùng sprite atlas, %s asset duy nhất", self.pet_type, self.unique_asset_count())
+
+    def load_from_bundle(self):
+        """Lấy danh sách animation + hash nội dung từ bảng offset của gói asset (không đụng thư mục)"""
+        packed_dir = bundle_name(self.animations_path)
+        for anim_type in ACTIVITIES:
+            self.animations[anim_type] = []
+        for file_name in self.bundle.listdir(packed_dir):
+            if not file_name.endswith('.gif'):
+                continue
+            file_path = os.path.join(self.animations_path, file_name)
+            packed = f"{packed_dir}/{file_name}"
+            self.packed_files[file_path] = packed
+            self.asset_hashes[file_path] = self.bundle.content_hash(packed)
+            for anim_type in ACTIVITIES:
+                if file_name.startswith(f"{anim_type}_"):
+                    self.animations[anim_type].append(file_path)
+        log.info("Pet %s: dùng gói asset, %s asset duy nhất", self.pet_type, self.unique_asset_count())
+
+    def unique_asset_count(self):
+        """Số asset thực sự khác nhau (theo nội dung) đứng sau pet này"""
+        return len(set(self.asset_hashes.values()))
+
+    def asset_report(self):
+        """Báo cáo các asset: hoạt động -> hash nội dung (rút gọn) của từng biến thể"""
+        return {
+            'pet_type': self.pet_type,
+            'files': len(self.asset_hashes),
+            'unique_assets': self.unique_asset_count(),
+            'activities': {
+                anim_type: [self.asset_hashes.get(f, '')[:12] for f in files]
+                for anim_type, files in self.animations.items() if files
+            },
+        }
+
+    def memory_report(self):
+        """Bộ nhớ khung hình của pet này đang nằm trong cache: tổng, theo hoạt động và theo kích thước
+
+        Một nội dung dùng chung cho nhiều hoạt động được tính vào từng hoạt động đó,
+        nhưng chỉ tính một lần trong tổng.
+        """
+        activities_by_key = {}
+        for anim_type, files in self.animations.items():
+            for animation_file in files:
+                content_key = self.asset_hashes.get(animation_file, animation_file)
+                activities_by_key.setdefault(content_key, set()).add(anim_type)
+        total = 0
+        entries = 0
+        by_activity = {}
+        by_size = {}
+        for (content_key, width, height), frame_set in self.frame_cache.items():
+            anim_types = activities_by_key.get(content_key)
+            if not anim_types:
+                continue
+            entries += 1
+            total += frame_set.nbytes
+            size = f"{width}x{height}"
+            by_size[size] = by_size.get(size, 0) + frame_set.nbytes
+            for anim_type in anim_types:
+                by_activity[anim_type] = by_activity.get(anim_type, 0) + frame_set.nbytes
+        return {
+            'pet_type': self.pet_type,
+            'cached_entries': entries,
+            'cached_bytes': total,
+            'by_activity': by_activity,
+            'by_size': by_size,
+        }
 
     def get_random_animation(self, anim_type):
-        """Lấy ngẫu nhiên một animation của loại được chỉ định"""
+        """Lấy ngẫu nhiên một animation của loại được chỉ định (chỉ tra bộ nhớ, không đụng đĩa)"""
         try:
             if anim_type in self.animations and self.animations[anim_type]:
                 return random.choice(self.animations[anim_type])
+            return None
+        except Exception as e:
+            log.error("Lỗi khi lấy animation: %s", e)
+            return None
 
-            # Nếu không tìm thấy animation cho loại này, thử tìm file có tên tương ứng
-            if os.path.exists(self.animations_path):
-                for file in os.listdir(self.animations_path):
-                    if file.startswith(f"{anim_type}_") and file.endswith('.gif'):
-                        file_path = os.path.join(self.animations_path, file)
-                        if anim_type not in self.animations:
-                            self.animations[anim_type] = []
-                        self.animations[anim_type].append(file_path)
-                        return file_path
-
+    def _frame_source(self, animation_file, width, height):
+        """Xác định (content_key, decoder) cho một animation; None nếu file không tồn tại"""
+        content_key = self.asset_hashes.get(animation_file)
+        if content_key is None:
+            # File ngoài chỉ mục (gọi trực tiếp từ bên ngoài): hash một lần rồi nhớ lại
+            if not os.path.exists(animation_file):
+                return None
+            content_key = self.asset_hashes[animation_file] = content_hash(animation_file)
+        decoder = None
+        if self.atlas is not None and self.atlas.has_sequence(content_key):
+            # Kích thước mới chỉ là tra cứu/scale từ atlas, không giải mã lại GIF
+            atlas = self.atlas
+            decoder = lambda: atlas.frame_images(content_key, width, height)
+        elif animation_file in self.packed_files:
+            # GIF trong gói asset: giải mã thẳng từ vùng nhớ mmap
+            bundle, packed = self.bundle, self.packed_files[animation_file]
+            decoder = lambda: decode_gif_bytes(bundle.read(packed), width, height)
+        return content_key, decoder
+
+    def get_frames(self, animation_file, width, height):
+        """Lấy khung hình đã scale của animation, chỉ giải mã lần đầu"""
+        try:
+            source = self._frame_source(animation_file, width, height)
+            if source is None:
+                return None
+            content_key, decoder = source
+            return self.frame_cache.get_or_decode(animation_file, width, height, content_key, decoder)
+        except Exception as e:
+            log.error("Lỗi khi giải mã animation: %s", e)
             return None
+
+    def cached_fallback(self, width, height, anim_type='idle'):
+        """Khung hình idle đã có sẵn trong cache để phát tạm, None nếu chưa có"""
+        for animation_file in self.animations.get(anim_type, []):
+            frame_set = self.cached_frames(animation_file, width, height)
+            if frame_set is not None:
+                return frame_set
+        return None
+
+    def preload(self, width, height):
+        """Giải mã nền mọi asset (mỗi nội dung một lần) ở kích thước cho trước"""
+        seen = set()
+        for files in self.animations.values():
+            for animation_file in files:
+                content_key = self.asset_hashes.get(animation_file, animation_file)
+                if content_key in seen:
+                    continue
+                seen.add(content_key)
+                self.request_frames(animation_file, width, height, lambda frame_set: None)
+
+    def cached_frames(self, animation_file, width, height):
+        """Khung hình đã có sẵn trong cache (không giải mã), None nếu chưa có"""
+        content_key = self.asset_hashes.get(animation_file, animation_file)
+        return self.frame_cache.get((content_key, width, height))
+
+    def request_frames(self, animation_file, width, height, callback):
+        """Lấy khung hình nếu đã có trong cache, nếu chưa thì giải mã nền và gọi callback khi xong"""
+        try:
+            source = self._frame_source(animation_file, width, height)
+            if source is None:
+                return None
+            content_key, decoder = source
+            return self.frame_cache.request(animation_file, width, height, callback, content_key, decoder)
         except Exception as e:
-            print(f"Lỗi khi lấy animation: {e}")
+            log.error("Lỗi khi yêu cầu giải mã animation: %s", e)
             return None
 
 class SpeechManager:
@@ -238,6 +458,7 @@ class SpeechManager:
         self.pet = pet
         self.speech_bubble = None
         self._closed = False
+        self._pending_pos = None  # Vị trí bong bóng chờ commit cùng pet ở cuối khung hình
         self.speech_duration_timer = QTimer()
         self.speech_duration_timer.setSingleShot(True)
         self.speech_duration_timer.timeout.connect(self.hide_speech)
@@ -249,6 +470,7 @@ class SpeechManager:
                 return
             # Tạo bong bóng nói
             if self.speech_bubble:
+                self._damage_bubble()
                 self.speech_bubble.close()
                 self.speech_bubble = None
 
@@ -256,23 +478,48 @@ class SpeechManager:
             self.speech_bubble.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
             self.speech_bubble.setAttribute(Qt.WA_TranslucentBackground, True)
             self.update_position()
-            self.speech_bubble.show()
+            self.commit_position()
+            if self.pet.overlay is not None:
+                # Chế độ overlay: bong bóng không có cửa sổ riêng, overlay vẽ hộ
+                self.pet.overlay.damage(self.speech_bubble.geometry())
+            else:
+                self.speech_bubble.show()
+            self.pet.wake()
 
             # Đặt timer để ẩn bong bóng
             self.speech_duration_timer.start(DEFAULT_SETTINGS['speech_duration'])
         except Exception as e:
-            print(f"Lỗi khi hiển thị speech ngay lập tức: {e}")
+            log.error("Lỗi khi hiển thị speech ngay lập tức: %s", e)
 
     def update_position(self):
-        """Cho bong bóng nói bám theo pet khi pet di chuyển"""
+        """Cho bong bóng nói bám theo pet khi pet di chuyển (vị trí được gửi đi ở bước commit)"""
         try:
             if not self.speech_bubble or self._closed:
                 return
-            bubble_x = int(self.pet.x + self.pet.width() // 2 - self.speech_bubble.width() // 2)
-            bubble_y = int(self.pet.y - self.speech_bubble.height() - 10)
-            self.speech_bubble.move(bubble_x, bubble_y)
+            # Bám theo vị trí pet sẽ được vẽ ở khung hình này (đã nội suy), không phải trạng thái vật lý
+            pet_x, pet_y = self.pet.target_position()
+            bubble_x = int(pet_x + self.pet.width() // 2 - self.speech_bubble.width() // 2)
+            bubble_y = int(pet_y - self.speech_bubble.height() - 10)
+            self._pending_pos = (bubble_x, bubble_y)
+            if not self.pet.frame_loop_active():
+                # Không có vòng lặp khung hình chạy: commit luôn
+                self.commit_position()
         except Exception as e:
-            print(f"Lỗi khi cập nhật vị trí speech: {e}")
+            log.error("Lỗi khi cập nhật vị trí speech: %s", e)
+
+    def commit_position(self):
+        """Gửi vị trí bong bóng đang chờ xuống cửa sổ nếu nó thực sự đổi"""
+        pos = self._pending_pos
+        self._pending_pos = None
+        if pos is None or not self.speech_bubble:
+            return
+        if pos == (self.speech_bubble.x(), self.speech_bubble.y()):
+            self.pet.moves_skipped += 1
+            return
+        self._damage_bubble()
+        self.speech_bubble.move(*pos)
+        self._damage_bubble()
+        self.pet.moves_issued += 1
 
     def hide_speech(self):
         """Ẩn bong bóng nói"""
@@ -280,11 +527,16 @@ class SpeechManager:
             if self.speech_duration_timer.isActive():
                 self.speech_duration_timer.stop()
             if self.speech_bubble:
+                self._damage_bubble()
                 self.speech_bubble.close()
                 self.speech_bubble.deleteLater()
                 self.speech_bubble = None
         except Exception as e:
-            print(f"Lỗi khi ẩn speech: {e}")
+            log.error("Lỗi khi ẩn speech: %s", e)
+
+    def _damage_bubble(self):
+        if self.pet.overlay is not None and self.speech_bubble is not None:
+            self.pet.overlay.damage(self.speech_bubble.geometry())
 
     def cleanup(self):
         """Dọn bubble + timer khi đổi/hủy pet (tránh text nhắc nhở sót lại)."""
@@ -292,105 +544,88 @@ class SpeechManager:
             self._closed = True
             self.hide_speech()
         except Exception as e:
-            print(f"Lỗi khi cleanup speech: {e}")
+            log.error("Lỗi khi cleanup speech: %s", e)
 
 class ActivityManager:
+    """Nối máy trạng thái hoạt động (pet_core) với pet Qt: animation, lời nói, vòng lặp khung hình"""
     def __init__(self, pet):
         self.pet = pet
-        self.current_activity = 'idle'
-        self.activities = {
-            'idle': self.idle_activity,
-            'walk': self.walk_activity,
-            'run': self.run_activity,
-            'jump': self.jump_activity,
-            'fly': self.fly_activity,
-            'climb': self.climb_activity,
-            'fall': self.fall_activity,
-            'die': self.die_activity
-        }
-        self.activity_timer = QTimer()
-        self.activity_timer.timeout.connect(self.change_activity)
-
-        # Các thuộc tính cho hoạt động
-        self.is_jumping = False
-        self.is_flying = False
-        self.is_climbing = False
-        self.jump_height = 0
-        self.fly_target_x = 0
-        self.fly_target_y = 0
-        self.climb_target_x = 0
-        self.climb_target_y = 0
+        self.activities = ACTIVITY_NAMES
+        self.machine = ActivityStateMachine(pet.motion, QtTimers(), listener=self._on_event)
 
         # Bắt đầu timer ngay lập tức
         self.start_activity_timer()
 
+    @property
+    def current_activity(self):
+        return self.machine.current_activity
+
+    @current_activity.setter
+    def current_activity(self, value):
+        self.machine.current_activity = value
+
     def start_activity_timer(self):
         """Bắt đầu timer để thay đổi hoạt động ngẫu nhiên"""
-        try:
-            # Dừng timer cũ nếu đang chạy
-            if self.activity_timer.isActive():
-                self.activity_timer.stop()
-
-            min_interval, max_interval = DEFAULT_SETTINGS['activity_change_interval']
-            interval = random.randint(min_interval, max_interval)
-            self.activity_timer.start(interval)
-            print(f"Timer hoạt động đã bắt đầu với interval: {interval}ms cho hoạt động: {self.current_activity}")
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu activity timer: {e}")
+        self.machine.start_activity_timer()
 
     def change_activity(self):
         """Thay đổi hoạt động ngẫu nhiên"""
-        try:
-            if self.current_activity == 'die':
-                return  # Không thay đổi nếu đang chết
-            if getattr(self.pet, '_closed', False):
-                return
-            # Đang bị ném/nảy thì hoãn đổi hành động
-            if getattr(self.pet, 'is_bouncing', False):
-                self.start_activity_timer()
-                return
-
-            # Dừng hoạt động hiện tại
-            self.stop_current_activity()
-
-            # Chọn hoạt động mới
-            available_activities = list(self.activities.keys())
-            if self.current_activity in available_activities:
-                available_activities.remove(self.current_activity)
-
-            # Giảm khả năng chọn "die" (chỉ 5% cơ hội)
-            if 'die' in available_activities and random.random() > 0.05:
-                available_activities.remove('die')
+        if getattr(self.pet, '_closed', False):
+            return
+        self.machine.change_activity()
 
-            # Nếu không còn hoạt động nào, thêm lại "die"
-            if not available_activities:
-                available_activities = ['idle', 'walk', 'run', 'jump', 'fly', 'climb', 'fall']
+    def manual_set_activity(self, activity_name):
+        """Đặt hoạt động theo yêu cầu của người dùng và lùi lại timer ngẫu nhiên"""
+        self.machine.manual_set_activity(activity_name)
 
-            new_activity = random.choice(available_activities)
-            print(f"Thay đổi hoạt động từ {self.current_activity} sang {new_activity}")
+    def start_activity(self, activity_name):
+        """Bắt đầu hoạt động mới"""
+        self.machine.start_activity(activity_name)
 
-            # Nói khi thay đổi hành động
-            self.speak_on_activity_change(new_activity)
+    def stop_current_activity(self):
+        """Dừng hoạt động hiện tại"""
+        self.machine.stop_current_activity()
 
-            self.start_activity(new_activity)
+    def postpone(self, delay_ms):
+        """Lùi lần tự đổi hoạt động kế tiếp"""
+        self.machine.postpone(delay_ms)
 
-            # Đặt timer cho lần thay đổi tiếp theo
-            self.start_activity_timer()
-        except Exception as e:
-            print(f"Lỗi khi thay đổi activity: {e}")
+    def cleanup(self):
+        """Dừng mọi timer/hoạt động khi hủy pet."""
+        self.machine.cleanup()
 
-    def manual_set_activity(self, activity_name):
-        """Đặt hoạt động theo yêu cầu của người dùng và lùi lại timer ngẫu nhiên"""
+    def _on_event(self, event, value=None):
+        """Sự kiện từ máy trạng thái: phần việc cần Qt (animation, bong bóng nói, vòng lặp khung hình)"""
         try:
-            if activity_name not in self.activities:
-                return
-            self.stop_current_activity()
-            self.start_activity(activity_name)
-            # Lùi thời điểm tự đổi hành động để pet giữ hành động vừa chọn
-            if activity_name != 'die':
-                self.start_activity_timer()
+            if event == 'activity':
+                self._show_activity(value)
+            elif event == 'speak':
+                self.speak_on_activity_change(value)
+            elif event == 'climb_up':
+                # Tới cạnh màn hình, bắt đầu leo: đổi sang animation leo
+                climb_animation = self.pet.animation_manager.get_random_animation('climb')
+                if climb_animation:
+                    self.pet.load_animation(climb_animation)
+            elif event == 'resurrect':
+                self.pet.wake()
         except Exception as e:
-            print(f"Lỗi khi đặt hoạt động thủ công: {e}")
+            log.error("Lỗi khi xử lý sự kiện hoạt động %s: %s", event, e)
+
+    def _show_activity(self, activity_name):
+        """Phát animation của hoạt động mới và chạy/dừng vòng lặp khung hình"""
+        animation_file = self.pet.animation_manager.get_random_animation(activity_name)
+        # Nếu không tìm thấy file animation cho hoạt động này, dùng idle
+        if not animation_file:
+            animation_file = self.pet.animation_manager.get_random_animation('idle')
+            if animation_file:
+                log.warning("Không tìm thấy animation cho %s, sử dụng idle animation", activity_name)
+        if animation_file:
+            self.pet.load_animation(animation_file)
+        if activity_name == 'die':
+            # Chết: tạm dừng vòng lặp khung hình cho tới khi hồi sinh
+            self.pet.stop_frame_loop()
+        else:
+            self.pet.wake()
 
     def speak_on_activity_change(self, new_activity):
         """Nói khi thay đổi hành động"""
@@ -407,203 +642,76 @@ class ActivityManager:
                 self.pet.speech_manager.show_speech_immediately(speech_text)
 
         except Exception as e:
-            print(f"Lỗi khi nói khi thay đổi hoạt động: {e}")
-
-    def stop_current_activity(self):
-        """Dừng hoạt động hiện tại"""
-        try:
-            if self.is_jumping:
-                self.is_jumping = False
-                self.jump_height = 0
-            if self.is_flying:
-                self.is_flying = False
-            if self.is_climbing:
-                self.is_climbing = False
-                # Xóa phase nếu có
-                if hasattr(self, 'climb_phase'):
-                    delattr(self, 'climb_phase')
-        except Exception as e:
-            print(f"Lỗi khi dừng activity: {e}")
-
-    def cleanup(self):
-        """Dừng mọi timer/hoạt động khi hủy pet."""
-        try:
-            if self.activity_timer.isActive():
-                self.activity_timer.stop()
-            self.stop_current_activity()
-            self.current_activity = 'idle'
-        except Exception as e:
-            print(f"Lỗi khi cleanup activity: {e}")
-
-    def start_activity(self, activity_name):
-        """Bắt đầu hoạt động mới"""
-        try:
-            self.current_activity = activity_name
-            animation_file = self.pet.animation_manager.get_random_animation(activity_name)
-
-            # Nếu không tìm thấy file animation cho hoạt động này, dùng idle_1.gif
-            if not animation_file:
-                idle_animation = self.pet.animation_manager.get_random_animation('idle')
-                if idle_animation:
-                    animation_file = idle_animation
-                    print(f"Không tìm thấy animation cho {activity_name}, sử dụng idle animation")
-
-            if animation_file:
-                self.pet.load_animation(animation_file)
-                if activity_name in self.activities:
-                    self.activities[activity_name]()
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu activity: {e}")
+            log.error("Lỗi khi nói khi thay đổi hoạt động: %s", e)
 
-    def idle_activity(self):
-        """Hoạt động đứng yên"""
-        pass
 
-    def walk_activity(self):
-        """Hoạt động đi bộ - chậm và ở mặt đất"""
-        try:
-            self.pet.dx = ACTIVITIES['walk']['speed'] * random.choice([-1, 1])
-            self.pet.is_on_ground = True
-            self.pet.y = self.pet.ground_y
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu walk: {e}")
+def _motion_attr(name):
+    """Thuộc tính của Pet đọc/ghi thẳng vào PetMotion (pet.x, pet.is_on_ground, ...)"""
+    return property(lambda self: getattr(self.motion, name),
+                    lambda self, value: setattr(self.motion, name, value))
 
-    def run_activity(self):
-        """Hoạt động chạy - nhanh hơn và ở mặt đất"""
-        try:
-            self.pet.dx = ACTIVITIES['run']['speed'] * random.choice([-1, 1])
-            self.pet.is_on_ground = True
-            self.pet.y = self.pet.ground_y
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu run: {e}")
-
-    def jump_activity(self):
-        """Hoạt động nhảy"""
-        try:
-            self.is_jumping = True
-            self.jump_height = 0
-            self.pet.is_on_ground = False
-
-            # Thêm hướng nhảy ngẫu nhiên
-            self.jump_direction = random.choice([-1, 1])  # -1: trái, 1: phải
-            self.jump_speed = 2  # Tốc độ di chuyển ngang khi nhảy
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu jump: {e}")
-
-    def fly_activity(self):
-        """Hoạt động bay - xuất hiện ở cạnh màn hình rồi bay đường cong xuống đất"""
-        try:
-            self.is_flying = True
-            self.pet.is_on_ground = False
-
-            # Xuất hiện ở một trong hai cạnh màn hình (nửa trên màn hình)
-            side = random.choice(['left', 'right'])
-            if side == 'left':
-                self.pet.x = 0
-            else:
-                self.pet.x = self.pet.screen_width - self.pet.width()
-
-            # Độ cao từ 10% đến 50% màn hình (nửa trên màn hình)
-            min_height = int(self.pet.screen_height * 0.1)
-            max_height = int(self.pet.screen_height * 0.5)
-            self.pet.y = random.randint(min_height, max_height)
-
-            # Lưu điểm xuất phát + target là mặt đất (bay xuống)
-            self.fly_start_x = self.pet.x
-            self.fly_start_y = self.pet.y
-            self.fly_target_x = random.randint(0, self.pet.screen_width - self.pet.width())
-            self.fly_target_y = self.pet.ground_y
-            self.fly_progress = 0.0
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu fly: {e}")
-
-    def climb_activity(self):
-        """Hoạt động leo trèo - đi đến cạnh màn hình rồi leo lên cao"""
-        try:
-            self.is_climbing = True
-            self.pet.is_on_ground = False
-            # Chọn cạnh màn hình (trái hoặc phải)
-            self.climb_target_x = 0 if random.random() < 0.5 else self.pet.screen_width - self.pet.width()
-            # Độ cao mục tiêu từ 10% đến 40% màn hình (nửa trên màn hình)
-            self.climb_target_y = random.randint(
-                int(self.pet.screen_height * 0.1),
-                int(self.pet.screen_height * 0.4)
-            )
-            # Bắt đầu ở giai đoạn di chuyển đến cạnh
-            self.climb_phase = 'moving_to_side'
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu climb: {e}")
-
-    def fall_activity(self):
-        """Hoạt động rơi - áp dụng trọng lực"""
-        try:
-            self.is_climbing = False
-            self.pet.is_on_ground = False
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu fall: {e}")
-
-    def die_activity(self):
-        """Hoạt động chết - đóng băng pet rồi hồi sinh"""
-        try:
-            # Tạm dừng vòng lặp khung hình
-            self.pet.tick_timer.stop()
-            # Sau 3 giây, pet sẽ "hồi sinh" và chuyển sang hoạt động khác
-            QTimer.singleShot(3000, self.resurrect_pet)
-        except Exception as e:
-            print(f"Lỗi khi bắt đầu die: {e}")
-
-    def resurrect_pet(self):
-        """Hồi sinh pet và chuyển sang hoạt động khác"""
-        try:
-            print("Pet đã hồi sinh! 🎉")
-            # Khởi động lại vòng lặp khung hình
-            self.pet.tick_timer.start(TICK_MS)
-
-            # Đặt lại trạng thái
-            self.current_activity = 'idle'
-            self.pet.is_on_ground = True
-            self.pet.y = self.pet.ground_y
-
-            # Chuyển sang hoạt động khác
-            self.change_activity()
-        except Exception as e:
-            print(f"Lỗi khi hồi sinh pet: {e}")
 
 class Pet(QLabel):
-    def __init__(self, pet_type="cat", width=None, height=None, controller=None):
+    # Trạng thái chuyển động nằm trong self.motion (pet_core.PetMotion, không phụ thuộc Qt)
+    x = _motion_attr('x')
+    y = _motion_attr('y')
+    dx = _motion_attr('dx')
+    dy = _motion_attr('dy')
+    gravity = _motion_attr('gravity')
+    ground_y = _motion_attr('ground_y')
+    screen_width = _motion_attr('screen_width')
+    screen_height = _motion_attr('screen_height')
+    is_on_ground = _motion_attr('is_on_ground')
+    is_dragging = _motion_attr('is_dragging')
+    is_bouncing = _motion_attr('is_bouncing')
+
+    def __init__(self, pet_type="cat", width=None, height=None, controller=None, world=None):
         super().__init__()
         self.pet_type = pet_type
         self.controller = controller  # Tham chiếu tới cửa sổ chính (cho menu chuột phải)
+        self.world = world  # PetWorld chứa pet này (None nếu pet chạy riêng)
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
         self.setAttribute(Qt.WA_TranslucentBackground, True)
         self.setCursor(Qt.OpenHandCursor)
 
-        # Khởi tạo config manager
-        from config import ConfigManager
-        self.config_manager = ConfigManager()
-
-        # Khởi tạo animation manager
-        self.animation_manager = AnimationManager(pet_type)
-
-        # Vị trí & hướng di chuyển
-        self.x, self.y = DISPLAY_SETTINGS['initial_position']
-        self.dx = 0
-        self.dy = 0  # Thêm dy cho trọng lực
-        self.screen_width = QApplication.primaryScreen().size().width()
-        self.screen_height = QApplication.primaryScreen().size().height()
+        # Khởi tạo config manager + animation manager (dùng chung trong PetWorld)
+        if world is not None:
+            self.config_manager = world.config_manager
+            self.animation_manager = world.animation_manager(pet_type)
+        else:
+            from config import ConfigManager
+            self.config_manager = ConfigManager()
+            self.animation_manager = AnimationManager(pet_type)
+
+        # Chế độ vẽ overlay: pet không có cửa sổ riêng, overlay của màn hình vẽ và chuyển chuột cho pet
+        self.overlay = None
+        self._overlay_visible = False
+        if self.config_manager.get_render_mode() == 'overlay':
+            self.overlay = shared_overlay_renderer()
+        # Ngân sách bộ nhớ khung hình lấy từ pet_config.json (vượt quá thì loại bớt mục cũ)
+        self.animation_manager.frame_cache.set_budget(self.config_manager.get_frame_cache_budget())
 
         # Kích thước pet
         self.pet_width = width or PET_SIZE_SETTINGS['default_width']
         self.pet_height = height or PET_SIZE_SETTINGS['default_height']
 
-        # Trọng lực và mặt đất
-        self.gravity = 0.5
-        self.ground_y = self.screen_height - self.pet_height - 50  # Mặt đất ở dưới màn hình
-        self.is_on_ground = False
-
-        # Trạng thái tương tác chuột / ném / nảy
-        self.is_dragging = False
-        self.is_bouncing = False
+        # Vị trí, vận tốc, trọng lực, mặt đất (của vùng làm việc màn hình chứa pet) và trạng thái ném/nảy.
+        # Vùng làm việc mọi màn hình lấy từ ScreenGeometry dùng chung, cập nhật khi màn hình thay đổi.
+        # Cạnh trên cửa sổ desktop (nếu có nguồn cửa sổ) là mặt đứng, dùng chung cho mọi pet.
+        self.screen_geometry = shared_screen_geometry()
+        self.desktop_surfaces = shared_desktop_surfaces(self.config_manager.get_surface_provider())
+        layout = self.screen_geometry.layout
+        surfaces = self.desktop_surfaces.index if self.desktop_surfaces is not None else None
+        initial_x, initial_y = DISPLAY_SETTINGS['initial_position']
+        # Trong PetWorld, trạng thái có thể nằm trong batch vật lý chung của world
+        motion_type = world.create_motion if world is not None else PetMotion
+        self.motion = motion_type(self.pet_width, self.pet_height, layout.primary.width, layout.primary.height,
+                                  initial_x, initial_y, layout=layout, surfaces=surfaces)
+        self.screen_geometry.subscribe(self._on_screen_layout_changed)
+        if self.desktop_surfaces is not None:
+            self.desktop_surfaces.subscribe(self._on_surfaces_changed)
+
+        # Trạng thái tương tác chuột
         self._press_pos = None
         self._drag_offset = QPoint(0, 0)
         self._drag_samples = []  # [(t, x, y), ...] để tính vận tốc ném
@@ -613,31 +721,59 @@ class Pet(QLabel):
         self._click_timer.setSingleShot(True)
         self._click_timer.timeout.connect(self._handle_single_click)
 
+        # Trình phát khung hình lấy từ cache của AnimationManager
+        self.current_animation = None
+        self._frame_set = None
+        self._frame_index = 0
+        self._frame_timer = QTimer()
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.timeout.connect(self._advance_frame)
+
+        # Đổi kích thước: gộp các lần đổi liên tiếp (kéo slider) thành một lần rescale mỗi khung hình
+        self._preview_size = None  # Kích thước đang hiển thị bằng ảnh scale tạm (chưa có khung chuẩn)
+        self._resize_timer = QTimer()
+        self._resize_timer.setSingleShot(True)
+        self._resize_timer.timeout.connect(self._apply_pending_size)
+
         # Load animation mặc định
         try:
             default_activity = SUPPORTED_PETS.get(pet_type, {}).get('default_activity', 'idle')
             default_animation = self.animation_manager.get_random_animation(default_activity)
             if default_animation:
-                self.load_animation(default_animation)
-            else:
-                # Fallback nếu không có file animation
-                self.movie = QMovie("pet.gif")
-                self.setMovie(self.movie)
-                self.movie.start()
+                # Chỉ hoạt động mặc định được giải mã ngay, các hoạt động khác giải mã nền
+                self.load_animation(default_animation, block=True)
+            self.animation_manager.preload(self.pet_width, self.pet_height)
         except Exception as e:
-            print(f"Lỗi khi load animation mặc định: {e}")
-            # Tạo movie rỗng để tránh lỗi
-            self.movie = QMovie()
-            self.setMovie(self.movie)
+            log.error("Lỗi khi load animation mặc định: %s", e)
 
         # Đặt kích thước và vị trí
         self.resize(self.pet_width, self.pet_height)
-        self.move(self.x, self.y)
-
-        # Một timer duy nhất điều phối toàn bộ chuyển động (~60fps)
-        self.tick_timer = QTimer()
-        self.tick_timer.timeout.connect(self.on_tick)
-        self.tick_timer.start(TICK_MS)
+        self.move(int(round(self.x)), int(round(self.y)))
+        if self.overlay is not None:
+            self.overlay.add_pet(self)
+
+        # Chuyển động chạy trên đồng hồ khung hình dùng chung (animation_fps): vật lý ở phase
+        # physics, bong bóng nói ở phase attachments. Vật lý tích lũy thời gian thực và chạy theo
+        # bước cố định PHYSICS_STEP_S; vị trí vẽ được nội suy giữa hai trạng thái vật lý gần nhất.
+        # Pet tự hủy đăng ký khi đứng yên và được wake() khi có việc cần làm.
+        self.scheduler = shared_frame_scheduler()
+        self.scheduler.set_fps(self.config_manager.get_animation_fps())
+        self._physics_sub = None
+        self._attachments_sub = None
+        self._commit_sub = None
+        self._in_frame_loop = False
+        self._rendered_pos = None
+        # Bước commit hình học: vị trí chờ gửi + số lần move đã gửi / bỏ qua (không đổi hoặc bị gộp)
+        self._pending_pos = None
+        self.moves_issued = 0
+        self.moves_skipped = 0
+        self._last_tick_time = self.scheduler.clock.now()
+        self._tick_times = deque()  # Thời điểm các lần on_tick gần đây (thống kê wakeups)
+        # Đo thời gian on_tick theo nhánh hoạt động và thời gian vẽ (bộ đệm vòng, xem frame_stats.py)
+        self.frame_stats = FrameStats()
+        self._hud = None
+        self._suspend_count = 0
+        self.start_frame_loop()
 
         # Khởi tạo activity manager
         self.activity_manager = ActivityManager(self)
@@ -648,327 +784,319 @@ class Pet(QLabel):
         # Bắt đầu hoạt động mặc định
         self.activity_manager.start_activity('idle')
 
-    def load_animation(self, animation_file):
-        """Load animation từ file"""
-        try:
-            if os.path.exists(animation_file):
-                self.movie = QMovie(animation_file)
-                # Scale ảnh theo kích thước hiện tại
-                self.movie.setScaledSize(QSize(self.pet_width, self.pet_height))
-                self.setMovie(self.movie)
-                self.movie.start()
-                # Giữ nguyên kích thước đã set
-                self.resize(self.pet_width, self.pet_height)
-        except Exception as e:
-            print(f"Lỗi khi load animation: {e}")
+    def load_animation(self, animation_file, block=False):
+        """Load animation từ file (khung hình lấy từ cache, không giải mã lại)
 
-    # ------------------------------------------------------------------
-    # Vòng lặp khung hình duy nhất
-    # ------------------------------------------------------------------
-    def on_tick(self):
-        """Điều phối: mỗi khung hình chỉ chạy đúng phần chuyển động đang cần."""
+        Nếu khung hình chưa sẵn sàng và block=False, tạm phát idle rồi tự đổi sang
+        animation này khi luồng nền giải mã xong, không làm khựng luồng GUI.
+        """
         try:
-            if self._closed:
-                return
-            # Khi đang kéo pet, tạm dừng mọi chuyển động tự động
-            if self.is_dragging:
-                return
-
-            # Ưu tiên vật lý ném/nảy
-            if self.is_bouncing:
-                self.bounce_animation()
+            width, height = self.pet_width, self.pet_height
+            if block:
+                frame_set = self.animation_manager.get_frames(animation_file, width, height)
+                if frame_set is None:
+                    return
             else:
-                am = self.activity_manager
-                if am.is_jumping:
-                    self.jump_animation()
-                elif am.is_flying:
-                    self.fly_animation()
-                elif am.is_climbing:
-                    self.climb_animation()
-                elif am.current_activity in ('walk', 'run'):
-                    self.move_pet()
-                elif am.current_activity == 'fall':
-                    self.fall_animation()
-                else:
-                    # idle hoặc trạng thái khác: vẫn rơi nếu đang lơ lửng
-                    if not self.is_on_ground:
-                        self.fall_animation()
-
-            # Bong bóng nói luôn bám theo pet
-            self.speech_manager.update_position()
+                frame_set = self.animation_manager.request_frames(
+                    animation_file, width, height,
+                    lambda fs: self._on_animation_ready(animation_file, (width, height), fs))
+                if frame_set is None:
+                    frame_set = self.animation_manager.cached_fallback(width, height)
+            self.current_animation = animation_file
+            if frame_set is not None:
+                self._preview_size = None
+                self._play_frames(frame_set, 0)
+            # Giữ nguyên kích thước đã set
+            self.resize(width, height)
         except Exception as e:
-            print(f"Lỗi trong vòng lặp khung hình: {e}")
+            log.error("Lỗi khi load animation: %s", e)
 
-    def apply_gravity(self):
-        """Áp dụng trọng lực"""
-        # Không áp dụng trọng lực khi đang leo
-        if hasattr(self.activity_manager, 'is_climbing') and self.activity_manager.is_climbing:
+    def _on_animation_ready(self, animation_file, size, frame_set):
+        """Animation vừa giải mã xong ở nền: phát nếu pet vẫn đang cần đúng animation/kích thước đó"""
+        if self._closed or frame_set is None:
             return
+        if animation_file != self.current_animation or size != (self.pet_width, self.pet_height):
+            return
+        self._preview_size = None
+        self._play_frames(frame_set, 0)
+
+    def _play_frames(self, frame_set, index):
+        """Bắt đầu phát một FrameSet từ khung hình chỉ định"""
+        self._frame_set = frame_set
+        self._frame_index = index % len(frame_set)
+        self._show_current_frame()
+        if self._frame_timer.isActive():
+            self._frame_timer.stop()
+        if len(frame_set) > 1:
+            self._frame_timer.start(frame_set.delays[self._frame_index])
+
+    def _advance_frame(self):
+        """Chuyển sang khung hình kế tiếp theo delay của GIF"""
+        try:
+            if self._closed or not self._frame_set:
+                return
+            self._frame_index = (self._frame_index + 1) % len(self._frame_set)
+            self._show_current_frame()
+            self._frame_timer.start(self._frame_set.delays[self._frame_index])
+        except Exception as e:
+            log.error("Lỗi khi chuyển khung hình: %s", e)
 
-        if not self.is_on_ground:
-            self.dy += self.gravity
-            self.y += self.dy
-
-            # Kiểm tra va chạm với mặt đất
-            if self.y >= self.ground_y:
-                self.y = self.ground_y
-                self.dy = 0
-                self.is_on_ground = True
+    def _show_current_frame(self):
+        pixmap = self._frame_set.frames[self._frame_index]
+        if self._preview_size is not None:
+            # Xem trước rẻ: scale nhanh khung cũ trong lúc khung chuẩn đang được tạo ở nền
+            pixmap = pixmap.scaled(*self._preview_size, Qt.IgnoreAspectRatio, Qt.FastTransformation)
+        self.setPixmap(pixmap)
+        if self.overlay is not None:
+            self.overlay.damage(self.geometry())
 
-    def move_pet(self):
-        """Di chuyển pet cơ bản với trọng lực"""
+    # ------------------------------------------------------------------
+    # Vòng lặp khung hình duy nhất
+    # ------------------------------------------------------------------
+    def on_tick(self, now=None):
+        """Mỗi lần vẽ: chạy đủ số bước vật lý cố định cho thời gian thực đã trôi qua rồi vẽ vị trí nội suy."""
+        if self._closed:
+            return
+        if now is None:
+            now = self.scheduler.clock.now()
+        branch = self._tick_branch()
+        start = time.perf_counter()
+        self._run_tick(now)
+        self.frame_stats.record(branch, (time.perf_counter() - start) * 1000, now)
+
+    def _tick_branch(self):
+        """Series đo thời gian on_tick theo nhánh chuyển động của khung này"""
+        if self.is_dragging:
+            return 'tick:drag'
+        if self.is_bouncing:
+            return 'tick:bounce'
+        return f'tick:{self.motion.current_activity}'
+
+    def _run_tick(self, now):
         try:
-            # Áp dụng trọng lực
-            self.apply_gravity()
-
-            if self.activity_manager.current_activity in ['walk', 'run']:
-                # Di chuyển theo hướng ngang
-                self.x += self.dx
-
-                # Đảm bảo pet không đi ra ngoài màn hình
-                if self.x <= 0:
-                    self.x = 0
-                    self.dx *= -1
-                elif self.x + self.width() >= self.screen_width:
-                    self.x = self.screen_width - self.width()
-                    self.dx *= -1
-
-                # Đảm bảo pet ở trên mặt đất khi đi bộ/chạy
-                if self.is_on_ground:
-                    self.y = self.ground_y
-
-            # Chuyển đổi sang int để tránh lỗi
-            self.move(int(self.x), int(self.y))
+            elapsed = self._begin_tick(now)
+            if elapsed is not None:
+                self._finish_tick(self.motion.advance(elapsed))
         except Exception as e:
-            print(f"Lỗi khi di chuyển pet: {e}")
+            log.error("Lỗi trong vòng lặp khung hình: %s", e)
+
+    def _begin_tick(self, now):
+        """Thời gian đã trôi qua từ tick trước, None nếu khung này không bước vật lý (đang kéo pet)"""
+        self._record_wakeup(now)
+        elapsed = now - self._last_tick_time
+        self._last_tick_time = now
+        # Khi đang kéo pet, tạm dừng mọi chuyển động tự động
+        if self.is_dragging:
+            self.motion.reset_accumulator()
+            self.motion.snap()
+            return None
+        return elapsed
 
-    def jump_animation(self):
-        """Animation nhảy với đường cong và rơi từ từ"""
+    def _finish_tick(self, alpha):
+        """Sau các bước vật lý: vẽ vị trí nội suy hoặc tạm dừng vòng lặp nếu pet đã đứng yên"""
         try:
-            if self.activity_manager.is_jumping:
-                jump_height = ACTIVITIES['jump']['height']
-
-                if self.activity_manager.jump_height < jump_height:  # Nhảy lên
-                    # Tăng độ cao nhảy chậm hơn
-                    self.activity_manager.jump_height += 1.5
-                    self.y = self.ground_y - self.activity_manager.jump_height
-                    self.is_on_ground = False
-
-                    # Di chuyển ngang khi nhảy lên (tạo đường cong)
-                    self.x += self.activity_manager.jump_direction * self.activity_manager.jump_speed
+            # Không còn gì chuyển động -> vẽ đúng vị trí cuối, hủy đăng ký cho tới lần wake() kế tiếp
+            if self.is_at_rest():
+                self.snap_physics_state()
+                self.render_position(0.0)
+                self.speech_manager.update_position()
+                self.commit_geometry()
+                self.stop_frame_loop()
+                self._suspend_count += 1
+            elif self.isVisible():
+                # Pet đang ẩn: bỏ qua vẽ, vật lý vẫn theo thời gian (đường đi nhảy/bay/leo tính sẵn)
+                self.render_position(alpha)
+        except Exception as e:
+            log.error("Lỗi trong vòng lặp khung hình: %s", e)
 
-                else:  # Rơi xuống
-                    # Rơi chậm hơn và từ từ
-                    self.activity_manager.jump_height -= 1.0
-                    self.y = self.ground_y - self.activity_manager.jump_height
+    def _update_attachments(self, now):
+        """Phase attachments: bong bóng nói bám theo vị trí pet vừa vẽ"""
+        if not self._closed:
+            self.speech_manager.update_position()
 
-                    # Di chuyển ngang khi rơi (tiếp tục đường cong)
-                    self.x += self.activity_manager.jump_direction * (self.activity_manager.jump_speed * 0.5)
+    def commit_geometry(self, now=None):
+        """Phase commit: gửi vị trí pet rồi bong bóng nói trong cùng một lượt, chỉ khi pixel thực sự đổi"""
+        if self._closed:
+            return
+        pos = self._pending_pos
+        if pos is not None:
+            self._pending_pos = None
+            if pos == self._rendered_pos:
+                self.moves_skipped += 1
+            else:
+                self._place(*pos)
+                self.moves_issued += 1
+        self.speech_manager.commit_position()
+
+    def request_position(self, x, y):
+        """Đặt vị trí pixel cần vẽ; move thật chỉ xảy ra ở bước commit (yêu cầu cũ trong cùng khung bị gộp)"""
+        if self._pending_pos is not None:
+            self.moves_skipped += 1
+        self._pending_pos = (x, y)
+
+    def target_position(self):
+        """Vị trí pixel pet sẽ có sau bước commit của khung hình này"""
+        if self._pending_pos is not None:
+            return self._pending_pos
+        if self._rendered_pos is not None:
+            return self._rendered_pos
+        return self.pos().x(), self.pos().y()
+
+    def render_position(self, alpha):
+        """Đặt cửa sổ ở vị trí nội suy giữa trạng thái vật lý trước và hiện tại (alpha trong [0, 1))"""
+        x, y = self.motion.interpolate(alpha)
+        self.request_position(int(round(x)), int(round(y)))
+
+    def _place(self, x, y):
+        """Đặt pet tại vị trí pixel: move cửa sổ riêng, hoặc báo overlay vẽ lại vùng cũ + mới"""
+        self._rendered_pos = (x, y)
+        if self.overlay is None:
+            self.move(x, y)
+            return
+        old = self.geometry()
+        self.move(x, y)
+        self.overlay.damage(old.united(self.geometry()))
 
-                    if self.activity_manager.jump_height <= 0:
-                        self.activity_manager.is_jumping = False
-                        self.y = self.ground_y
-                        self.is_on_ground = True
-                        # KHÔNG gọi change_activity() ngay lập tức - để timer tự động thay đổi
+    def paintEvent(self, event):
+        start = time.perf_counter()
+        super().paintEvent(event)
+        self.frame_stats.record('paint', (time.perf_counter() - start) * 1000, self.scheduler.clock.now())
+
+    def setVisible(self, visible):
+        """Chế độ overlay: chỉ ghi nhận hiện/ẩn, không tạo cửa sổ riêng"""
+        if self.overlay is None:
+            super().setVisible(visible)
+            return
+        self._overlay_visible = visible
+        self.overlay.damage(self.geometry())
 
-                # Đảm bảo không đi ra ngoài màn hình
-                self.x = max(0, min(self.x, self.screen_width - self.width()))
+    def isVisible(self):
+        if self.overlay is None:
+            return super().isVisible()
+        return self._overlay_visible
 
-                # Chuyển đổi sang int để tránh lỗi
-                self.move(int(self.x), int(self.y))
-        except Exception as e:
-            print(f"Lỗi khi nhảy: {e}")
+    def snap_physics_state(self):
+        """Bỏ nội suy sau khi vị trí bị đặt trực tiếp (dịch chuyển tức thời, kéo chuột, đổi kích thước)"""
+        self.motion.snap()
 
-    def fly_animation(self):
-        """Animation bay - nội suy theo đường cong mượt từ cạnh màn hình xuống đất"""
+    def _on_screen_layout_changed(self, layout):
+        """Màn hình được thêm/bớt/đổi độ phân giải: đưa pet về vùng làm việc mới và mặt đất mới"""
         try:
-            if self.activity_manager.is_flying:
-                am = self.activity_manager
-                # Tiến độ 0 -> 1 trong khoảng ~2 giây (0.008 * 16ms ~ 125 khung)
-                am.fly_progress = min(1.0, am.fly_progress + 0.008)
-                t = am.fly_progress
-
-                # Làm mượt theo easing (ease-in-out) cho cảm giác tự nhiên
-                eased = t * t * (3 - 2 * t)
-
-                # Nội suy ngang tuyến tính, dọc theo easing
-                self.x = am.fly_start_x + (am.fly_target_x - am.fly_start_x) * eased
-                base_y = am.fly_start_y + (am.fly_target_y - am.fly_start_y) * eased
-
-                # Thêm nhịp bay nhẹ (đường cong sin) nhưng không vượt mặt đất
-                bob = math.sin(t * math.pi * 2) * 18 * (1 - t)
-                self.y = base_y - bob
-
-                # Giữ trong màn hình
-                self.x = max(0, min(self.x, self.screen_width - self.width()))
-
-                # Khi đến nơi -> chạm đất
-                if t >= 1.0 or self.y >= self.ground_y:
-                    self.y = self.ground_y
-                    self.is_on_ground = True
-                    am.is_flying = False
-                    print("Đã bay xuống đất!")
-
-                self.move(int(self.x), int(self.y))
+            if self._closed:
+                return
+            if self.motion.set_layout(layout):
+                # Đường đi nhảy/bay/leo tính theo màn hình cũ đã bị hủy -> rơi xuống
+                self.set_activity('fall')
+            self.render_position(0.0)
+            if not self.frame_loop_active():
+                self.commit_geometry()
+            self.wake()
         except Exception as e:
-            print(f"Lỗi khi bay: {e}")
+            log.error("Lỗi khi cập nhật màn hình cho pet: %s", e)
 
-    def climb_animation(self):
-        """Animation leo trèo - đi đến cạnh rồi leo lên cao và rơi xuống"""
+    def _on_surfaces_changed(self, changed):
+        """Cửa sổ desktop bị dời/đóng/che: pet đang đứng trên cửa sổ đó đứng theo hoặc rơi xuống"""
         try:
-            if self.activity_manager.is_climbing:
-                if self.activity_manager.climb_phase == 'moving_to_side':
-                    # Giai đoạn 1: Di chuyển đến cạnh màn hình
-                    climb_speed = ACTIVITIES['climb']['speed']
-                    dx = (self.activity_manager.climb_target_x - self.x) * climb_speed
-
-                    self.x += dx
-                    # Đảm bảo ở trên mặt đất khi di chuyển
-                    self.y = self.ground_y
-                    self.is_on_ground = True  # Đảm bảo không bị trọng lực kéo
-
-                    # Nếu đã đến cạnh, bắt đầu leo
-                    min_distance = DISPLAY_SETTINGS['min_distance']
-                    if abs(self.x - self.activity_manager.climb_target_x) < min_distance:
-                        self.activity_manager.climb_phase = 'climbing_up'
-                        self.is_on_ground = False  # Bắt đầu leo, tắt trọng lực
-                        # Load animation leo
-                        climb_animation = self.animation_manager.get_random_animation('climb')
-                        if climb_animation:
-                            self.load_animation(climb_animation)
-                        print("Bắt đầu leo lên!")
-
-                elif self.activity_manager.climb_phase == 'climbing_up':
-                    # Giai đoạn 2: Leo lên đến độ cao mục tiêu
-                    self.y -= 4
-                    if self.y <= self.activity_manager.climb_target_y:
-                        self.y = self.activity_manager.climb_target_y
-                        self.activity_manager.climb_phase = 'falling_down'
-                        print(f"Đã leo lên độ cao {self.activity_manager.climb_target_y}!")
-
-                elif self.activity_manager.climb_phase == 'falling_down':
-                    # Giai đoạn 3: Rơi xuống đất
-                    self.y += 6
-                    if self.y >= self.ground_y:
-                        self.y = self.ground_y
-                        self.is_on_ground = True  # Đặt lại trạng thái mặt đất
-                        # Hoàn thành leo, chuyển sang hoạt động khác
-                        self.activity_manager.is_climbing = False
-                        if hasattr(self.activity_manager, 'climb_phase'):
-                            delattr(self.activity_manager, 'climb_phase')
-                        print("Đã rơi xuống đất!")
-
-                # Chuyển đổi sang int để tránh lỗi
-                self.move(int(self.x), int(self.y))
+            if self._closed or self.motion.surface not in changed:
+                return
+            self.motion.check_support()
+            self.motion.snap()
+            self.render_position(0.0)
+            if not self.frame_loop_active():
+                self.commit_geometry()
+            self.wake()
         except Exception as e:
-            print(f"Lỗi khi leo: {e}")
-
-    def fall_animation(self):
-        """Animation rơi - áp dụng trọng lực"""
-        try:
-            # Áp dụng trọng lực
-            self.apply_gravity()
-
-            # Chỉ đảm bảo pet ở trên mặt đất
-            if self.is_on_ground:
-                self.y = self.ground_y
+            log.error("Lỗi khi cập nhật mặt đứng cho pet: %s", e)
 
-            # Chuyển đổi sang int để tránh lỗi
-            self.move(int(self.x), int(self.y))
-        except Exception as e:
-            print(f"Lỗi khi rơi: {e}")
+    def is_at_rest(self):
+        """Pet đứng yên trên mặt đất, on_tick không còn gì để làm"""
+        return self.motion.is_at_rest()
 
-    def bounce_animation(self):
-        """Nảy quanh màn hình sau khi bị ném (va chạm 4 cạnh)."""
+    def wake(self):
+        """Chạy lại vòng lặp khung hình nếu đang tạm dừng (đổi hoạt động, chuột, lời nói, kích thước)"""
         try:
-            self.dy += BOUNCE_GRAVITY
-            self.dx *= BOUNCE_FRICTION
-            self.dy *= BOUNCE_FRICTION
-
-            self.x += self.dx
-            self.y += self.dy
-
-            min_x = 0
-            max_x = self.screen_width - self.width()
-            min_y = 0
-            max_y = self.ground_y
-
-            bounced = False
-            if self.x <= min_x:
-                self.x = min_x
-                self.dx = abs(self.dx) * BOUNCE_DAMPING
-                bounced = True
-            elif self.x >= max_x:
-                self.x = max_x
-                self.dx = -abs(self.dx) * BOUNCE_DAMPING
-                bounced = True
-
-            if self.y <= min_y:
-                self.y = min_y
-                self.dy = abs(self.dy) * BOUNCE_DAMPING
-                bounced = True
-            elif self.y >= max_y:
-                self.y = max_y
-                self.dy = -abs(self.dy) * BOUNCE_DAMPING
-                bounced = True
-                # Ma sát sàn khi chạm đất
-                self.dx *= 0.9
-
-            speed = math.hypot(self.dx, self.dy)
-            # Dừng khi đã chậm và đang gần mặt đất
-            if speed < BOUNCE_STOP_SPEED and self.y >= max_y - 2:
-                self.is_bouncing = False
-                self.dx = 0
-                self.dy = 0
-                self.y = self.ground_y
-                self.is_on_ground = True
-                self.activity_manager.manual_set_activity('idle')
-            elif bounced and speed < BOUNCE_STOP_SPEED * 1.5 and self.y >= max_y - 2:
-                self.is_bouncing = False
-                self.dx = 0
-                self.dy = 0
-                self.y = self.ground_y
-                self.is_on_ground = True
-                self.activity_manager.manual_set_activity('idle')
-
-            self.move(int(self.x), int(self.y))
+            if self._closed or not hasattr(self, 'activity_manager'):
+                return
+            if self.activity_manager.current_activity == 'die':
+                return  # Đang chết: resurrect_pet sẽ tự chạy lại
+            self.start_frame_loop()
         except Exception as e:
-            print(f"Lỗi khi nảy: {e}")
+            log.error("Lỗi khi đánh thức vòng lặp: %s", e)
+
+    def start_frame_loop(self):
+        """Đăng ký pet với đồng hồ khung hình chung, hoặc với PetWorld nếu có (không làm gì nếu đã đăng ký)"""
+        if self._closed or self._in_frame_loop:
+            return
+        self._in_frame_loop = True
+        # Không tính khoảng thời gian đã ngủ vào vật lý
+        self._last_tick_time = self.scheduler.clock.now()
+        self.motion.reset_accumulator()
+        if self.world is not None:
+            self.world.activate(self)
+            return
+        self._physics_sub = self.scheduler.subscribe(self.on_tick, PHASE_PHYSICS, f'pet:{self.pet_type}')
+        self._attachments_sub = self.scheduler.subscribe(
+            self._update_attachments, PHASE_ATTACHMENTS, f'speech:{self.pet_type}')
+        self._commit_sub = self.scheduler.subscribe(self.commit_geometry, PHASE_COMMIT, f'commit:{self.pet_type}')
+
+    def stop_frame_loop(self):
+        """Hủy đăng ký khỏi đồng hồ khung hình chung / PetWorld"""
+        self._in_frame_loop = False
+        if self.world is not None:
+            self.world.deactivate(self)
+        self.scheduler.unsubscribe(self._physics_sub)
+        self.scheduler.unsubscribe(self._attachments_sub)
+        self.scheduler.unsubscribe(self._commit_sub)
+        self._physics_sub = None
+        self._attachments_sub = None
+        self._commit_sub = None
+
+    def frame_loop_active(self):
+        return self._in_frame_loop
+
+    def _record_wakeup(self, now):
+        self._tick_times.append(now)
+        cutoff = now - WAKEUP_WINDOW_S
+        while self._tick_times and self._tick_times[0] < cutoff:
+            self._tick_times.popleft()
+
+    def wakeups_per_minute(self):
+        """Số lần vòng lặp khung hình chạy trong 60 giây gần nhất"""
+        cutoff = self.scheduler.clock.now() - WAKEUP_WINDOW_S
+        while self._tick_times and self._tick_times[0] < cutoff:
+            self._tick_times.popleft()
+        return len(self._tick_times)
+
+    def frame_loop_stats(self):
+        """Trạng thái vòng lặp khung hình: đang chạy hay tạm dừng, wakeups/phút, số lần tạm dừng"""
+        subs = [sub.stats() for sub in (self._physics_sub, self._attachments_sub, self._commit_sub)
+                if sub is not None]
+        return {
+            'active': self.frame_loop_active(),
+            'render_interval_ms': self.scheduler.interval_ms,
+            'wakeups_per_minute': self.wakeups_per_minute(),
+            'suspends': self._suspend_count,
+            'physics_steps': self.motion.physics_steps,
+            'moves_issued': self.moves_issued,
+            'moves_skipped': self.moves_skipped,
+            'subscribers': subs,
+        }
 
     def start_throw(self, vx, vy):
         """Bắt đầu trạng thái bị ném với vận tốc (px/frame)."""
         try:
-            speed = math.hypot(vx, vy)
-            if speed > THROW_MAX_SPEED and speed > 0:
-                scale = THROW_MAX_SPEED / speed
-                vx *= scale
-                vy *= scale
-            # Đảm bảo vẫn có lực mạnh tối thiểu khi kéo nhẹ
-            if speed < 8:
-                # Nếu gần như thả đứng -> rơi thường
-                self.is_bouncing = False
-                self.dx = 0
-                self.dy = 0
-                self.is_on_ground = False
-                self.activity_manager.stop_current_activity()
+            if not self.motion.throw(vx, vy):
+                # Gần như thả đứng -> rơi thường
                 self.set_activity('fall')
                 return
-
-            self.is_bouncing = True
-            self.is_on_ground = False
-            self.dx = vx
-            self.dy = vy
-            self.activity_manager.stop_current_activity()
-            self.activity_manager.current_activity = 'fall'
             fall_anim = self.animation_manager.get_random_animation('fall')
             if fall_anim:
                 self.load_animation(fall_anim)
             # Lùi timer đổi hành động trong lúc đang nảy
-            if self.activity_manager.activity_timer.isActive():
-                self.activity_manager.activity_timer.stop()
-            self.activity_manager.activity_timer.start(12000)
+            self.activity_manager.postpone(THROW_ACTIVITY_DELAY_MS)
+            self.wake()
         except Exception as e:
-            print(f"Lỗi khi bắt đầu ném: {e}")
+            log.error("Lỗi khi bắt đầu ném: %s", e)
 
     def spawn_fireworks(self, duration_ms=FIREWORKS_DURATION_MS):
         """Bắn pháo hoa tại vị trí pet hiện tại."""
@@ -977,13 +1105,14 @@ class Pet(QLabel):
                 return
             cx = self.x + self.width() / 2
             cy = self.y + self.height() / 2
-            fx = FireworksEffect(cx, cy, duration_ms=duration_ms)
-            fx.show()
+            fx = FireworksEffect(cx, cy, duration_ms=duration_ms, overlay=self.overlay)
+            if self.overlay is None:
+                fx.show()
             self._active_fireworks.append(fx)
             # Dọn tham chiếu khi đóng
             fx.destroyed.connect(lambda: self._forget_firework(fx))
         except Exception as e:
-            print(f"Lỗi khi tạo pháo hoa: {e}")
+            log.error("Lỗi khi tạo pháo hoa: %s", e)
 
     def _forget_firework(self, fx):
         try:
@@ -1000,8 +1129,15 @@ class Pet(QLabel):
             self._closed = True
             if self._click_timer.isActive():
                 self._click_timer.stop()
-            if hasattr(self, 'tick_timer') and self.tick_timer.isActive():
-                self.tick_timer.stop()
+            if hasattr(self, 'scheduler'):
+                self.stop_frame_loop()
+            if self.world is not None:
+                self.world.discard(self)
+            if self.overlay is not None:
+                self.overlay.remove_pet(self)
+            self.screen_geometry.unsubscribe(self._on_screen_layout_changed)
+            if self.desktop_surfaces is not None:
+                self.desktop_surfaces.unsubscribe(self._on_surfaces_changed)
             if hasattr(self, 'activity_manager'):
                 self.activity_manager.cleanup()
             if hasattr(self, 'speech_manager'):
@@ -1013,16 +1149,20 @@ class Pet(QLabel):
                 except Exception:
                     pass
             self._active_fireworks.clear()
-            if hasattr(self, 'movie') and self.movie:
-                try:
-                    self.movie.stop()
-                except Exception:
-                    pass
+            if self._hud is not None:
+                self._hud.stop()
+                self._hud.deleteLater()
+                self._hud = None
+            if self._frame_timer.isActive():
+                self._frame_timer.stop()
+            if self._resize_timer.isActive():
+                self._resize_timer.stop()
+            self._frame_set = None
             self.hide()
             self.close()
             self.deleteLater()
         except Exception as e:
-            print(f"Lỗi khi cleanup pet: {e}")
+            log.error("Lỗi khi cleanup pet: %s", e)
 
     def closeEvent(self, event):
         """Đảm bảo cleanup khi cửa sổ pet bị đóng."""
@@ -1031,8 +1171,14 @@ class Pet(QLabel):
                 # closeEvent có thể được gọi từ cleanup() hoặc close() bên ngoài
                 if self._click_timer.isActive():
                     self._click_timer.stop()
-                if hasattr(self, 'tick_timer') and self.tick_timer.isActive():
-                    self.tick_timer.stop()
+                if hasattr(self, 'scheduler'):
+                    self.stop_frame_loop()
+                if self.world is not None:
+                    self.world.discard(self)
+                if self.overlay is not None:
+                    self.overlay.remove_pet(self)
+                if self._frame_timer.isActive():
+                    self._frame_timer.stop()
                 if hasattr(self, 'activity_manager'):
                     self.activity_manager.cleanup()
                 if hasattr(self, 'speech_manager'):
@@ -1044,9 +1190,11 @@ class Pet(QLabel):
                     except Exception:
                         pass
                 self._active_fireworks = []
+                if getattr(self, '_hud', None) is not None:
+                    self._hud.stop()
                 self._closed = True
         except Exception as e:
-            print(f"Lỗi closeEvent pet: {e}")
+            log.error("Lỗi closeEvent pet: %s", e)
         super().closeEvent(event)
 
     def set_size(self, width, height):
@@ -1061,22 +1209,144 @@ class Pet(QLabel):
             self.pet_width = width
             self.pet_height = height
 
-            # Cập nhật vị trí mặt đất
-            self.ground_y = self.screen_height - self.pet_height - 50
-
-            # Scale ảnh theo kích thước mới
-            if hasattr(self, 'movie') and self.movie:
-                # Tạo QMovie mới với kích thước đã scale
-                current_file = self.movie.fileName()
-                if current_file and os.path.exists(current_file):
-                    self.movie = QMovie(current_file)
-                    self.movie.setScaledSize(QSize(width, height))
-                    self.setMovie(self.movie)
-                    self.movie.start()
+            # Cập nhật kích thước + vị trí mặt đất cho vật lý
+            self.motion.set_size(width, height)
 
+            old_geometry = self.geometry()
             self.resize(width, height)
+            if self.overlay is not None:
+                self.overlay.damage(old_geometry.united(self.geometry()))
+            self.wake()
+
+            if self.current_animation and self._frame_set:
+                # Kích thước đã từng dùng: lấy ngay khung chuẩn từ cache, giữ nhịp khung hiện tại
+                frame_set = self.animation_manager.cached_frames(self.current_animation, width, height)
+                if frame_set is not None:
+                    self._preview_size = None
+                    self._play_frames(frame_set, self._frame_index)
+                else:
+                    # Hiện bản scale tạm, rescale chuẩn được gộp lại và chạy ở nền
+                    self._preview_size = (width, height)
+                    self._show_current_frame()
+                    if not self._resize_timer.isActive():
+                        self._resize_timer.start(TICK_MS)
         except Exception as e:
-            print(f"Lỗi khi thay đổi kích thước: {e}")
+            log.error("Lỗi khi thay đổi kích thước: %s", e)
+
+    def _apply_pending_size(self):
+        """Tạo khung chuẩn cho kích thước mới nhất (sau khi đã gộp các lần đổi liên tiếp)"""
+        try:
+            if self._closed or self._preview_size is None or not self.current_animation:
+                return
+            animation_file = self.current_animation
+            size = (self.pet_width, self.pet_height)
+            frame_set = self.animation_manager.request_frames(
+                animation_file, size[0], size[1],
+                lambda fs: self._on_resized_frames(animation_file, size, fs))
+            if frame_set is not None:
+                self._on_resized_frames(animation_file, size, frame_set)
+        except Exception as e:
+            log.error("Lỗi khi áp dụng kích thước mới: %s", e)
+
+    def _on_resized_frames(self, animation_file, size, frame_set):
+        """Nhận khung chuẩn từ luồng nền; bỏ qua nếu pet đã đổi animation/kích thước khác"""
+        if self._closed or frame_set is None:
+            return
+        if animation_file != self.current_animation or size != (self.pet_width, self.pet_height):
+            return
+        self._preview_size = None
+        self._play_frames(frame_set, self._frame_index)
+
+    # ------------------------------------------------------------------
+    # Đo thời gian khung hình
+    # ------------------------------------------------------------------
+    def frame_timing_report(self):
+        """Tóm tắt percentile thời gian on_tick/vẽ của pet và jitter/thời gian khung của đồng hồ chung"""
+        return {
+            'pet_type': self.pet_type,
+            'activity': self.motion.current_activity,
+            'frames': self.scheduler.frame_count,
+            'dropped_frames': self.scheduler.dropped_frames,
+            'pet': self.frame_stats.summary(),
+            'scheduler': self.scheduler.frame_stats.summary(),
+        }
+
+    def dump_frame_stats(self, path="pet_frames.csv"):
+        """Ghi mẫu thô (pet + đồng hồ khung hình) ra CSV"""
+        try:
+            count = write_samples_csv(path, {self.pet_type: self.frame_stats,
+                                             'scheduler': self.scheduler.frame_stats})
+            log.info("Đã lưu %s mẫu thời gian khung hình vào %s", count, path)
+        except Exception as e:
+            log.error("Lỗi khi lưu thời gian khung hình: %s", e)
+
+    def dump_log(self, path="pet_log.txt"):
+        """Ghi các dòng log gần nhất (bộ đệm vòng trong bộ nhớ) ra file"""
+        try:
+            count = dump_log(path)
+            log.info("Đã lưu %s dòng log vào %s", count, path)
+        except Exception as e:
+            log.error("Lỗi khi lưu log: %s", e)
+
+    def toggle_frame_hud(self):
+        """Bật/tắt HUD thời gian khung hình cạnh pet"""
+        try:
+            if self._hud is not None and self._hud.isVisible():
+                self._hud.stop()
+                return
+            if self._hud is None:
+                self._hud = FrameStatsHud(self)
+            self._hud.start()
+        except Exception as e:
+            log.error("Lỗi khi bật/tắt HUD khung hình: %s", e)
+
+    def frame_hud_visible(self):
+        return self._hud is not None and self._hud.isVisible()
+
+    # ------------------------------------------------------------------
+    # Thống kê bộ nhớ animation
+    # ------------------------------------------------------------------
+    def memory_report(self):
+        """Số liệu bộ nhớ khung hình: của pet này, của cache dùng chung và các FrameSet còn sống"""
+        report = self.animation_manager.memory_report()
+        report['size'] = f"{self.pet_width}x{self.pet_height}"
+        report['playing_bytes'] = self._frame_set.nbytes if self._frame_set is not None else 0
+        report['cache'] = self.animation_manager.frame_cache.stats()
+        return report
+
+    def dump_memory_report(self, path="pet_memory.json"):
+        """Ghi memory_report() ra file JSON"""
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.memory_report(), f, indent=2, ensure_ascii=False)
+            log.info("Đã lưu thống kê bộ nhớ vào %s", path)
+        except Exception as e:
+            log.error("Lỗi khi lưu thống kê bộ nhớ: %s", e)
+
+    def show_memory_report(self):
+        """Hộp thoại tóm tắt bộ nhớ khung hình"""
+        try:
+            report = self.memory_report()
+            cache = report['cache']
+            mb = lambda n: f"{n / (1024 * 1024):.1f} MB"
+            lines = [
+                f"Pet {report['pet_type']} ({report['size']}): {mb(report['cached_bytes'])} "
+                f"trong {report['cached_entries']} bộ khung, đang phát {mb(report['playing_bytes'])}",
+                f"Cache dùng chung: {mb(cache['total_bytes'])} / {mb(cache['budget_bytes'])}, "
+                f"{cache['entries']} bộ khung",
+                f"Trúng cache: {cache['hits']}, trượt: {cache['misses']} ({cache['hit_rate']:.0%}), "
+                f"loại bỏ: {cache['evictions']}",
+                f"FrameSet còn sống: {cache['live_frame_sets']} ({mb(cache['live_frame_bytes'])}), "
+                f"đang giải mã nền: {cache['pending_decodes']}",
+                "",
+                "Theo hoạt động:",
+            ]
+            lines += [f"  {k}: {mb(v)}" for k, v in sorted(report['by_activity'].items())]
+            lines.append("Theo kích thước:")
+            lines += [f"  {k}: {mb(v)}" for k, v in sorted(report['by_size'].items())]
+            QMessageBox.information(None, "📊 Bộ nhớ animation", "\n".join(lines))
+        except Exception as e:
+            log.error("Lỗi khi hiện thống kê bộ nhớ: %s", e)
 
     # ------------------------------------------------------------------
     # Điều khiển công khai (dùng cho menu chuột phải & cửa sổ chính)
@@ -1086,17 +1356,18 @@ class Pet(QLabel):
         try:
             if self.activity_manager.current_activity == 'die' and activity_name != 'die':
                 # Đảm bảo timer chạy lại nếu đang ở trạng thái chết
-                if not self.tick_timer.isActive():
-                    self.tick_timer.start(TICK_MS)
+                self.activity_manager.current_activity = 'idle'
+                self.wake()
             self.activity_manager.manual_set_activity(activity_name)
         except Exception as e:
-            print(f"Lỗi khi đặt hoạt động: {e}")
+            log.error("Lỗi khi đặt hoạt động: %s", e)
 
     # ------------------------------------------------------------------
     # Tương tác chuột: kéo thả, click, double-click, menu chuột phải
     # ------------------------------------------------------------------
     def mousePressEvent(self, event):
         try:
+            self.wake()
             if event.button() == Qt.RightButton:
                 self.show_context_menu(event.globalPos())
                 return
@@ -1106,7 +1377,7 @@ class Pet(QLabel):
                 self.is_dragging = False
                 self._drag_samples = [(time.time(), self.x, self.y)]
         except Exception as e:
-            print(f"Lỗi mousePress: {e}")
+            log.error("Lỗi mousePress: %s", e)
 
     def mouseMoveEvent(self, event):
         try:
@@ -1120,15 +1391,18 @@ class Pet(QLabel):
                     self.setCursor(Qt.ClosedHandCursor)
                 new_top_left = event.globalPos() - self._drag_offset
                 self.x, self.y = new_top_left.x(), new_top_left.y()
-                self.move(int(self.x), int(self.y))
+                # Sự kiện chuột có thể tới cả nghìn lần/giây: chỉ ghi vị trí, move thật một lần mỗi khung hình
+                self.request_position(int(self.x), int(self.y))
                 now = time.time()
                 self._drag_samples.append((now, self.x, self.y))
                 # Chỉ giữ mẫu ~150ms gần nhất để tính vận tốc ném
                 cutoff = now - 0.15
                 self._drag_samples = [s for s in self._drag_samples if s[0] >= cutoff]
-                self.speech_manager.update_position()
+                if not self.frame_loop_active():
+                    self.speech_manager.update_position()
+                    self.commit_geometry()
         except Exception as e:
-            print(f"Lỗi mouseMove: {e}")
+            log.error("Lỗi mouseMove: %s", e)
 
     def mouseReleaseEvent(self, event):
         try:
@@ -1146,7 +1420,7 @@ class Pet(QLabel):
             self._press_pos = None
             self._drag_samples = []
         except Exception as e:
-            print(f"Lỗi mouseRelease: {e}")
+            log.error("Lỗi mouseRelease: %s", e)
 
     def _compute_throw_velocity(self):
         """Tính vận tốc ném từ các mẫu kéo gần nhất (px/frame)."""
@@ -1172,14 +1446,14 @@ class Pet(QLabel):
             self._react("🎆🎉")
             self.set_activity('jump')
         except Exception as e:
-            print(f"Lỗi doubleClick: {e}")
+            log.error("Lỗi doubleClick: %s", e)
 
     def _handle_single_click(self):
         """Phản ứng khi click đơn vào pet"""
         try:
             self._react()
         except Exception as e:
-            print(f"Lỗi xử lý click đơn: {e}")
+            log.error("Lỗi xử lý click đơn: %s", e)
 
     def _react(self, text=None):
         """Pet nói một câu phản ứng vui vẻ"""
@@ -1192,7 +1466,7 @@ class Pet(QLabel):
                 text = random.choice(speeches) if speeches else "❤️"
             self.speech_manager.show_speech_immediately(text)
         except Exception as e:
-            print(f"Lỗi khi phản ứng: {e}")
+            log.error("Lỗi khi phản ứng: %s", e)
 
     def show_context_menu(self, global_pos):
         """Menu chuột phải ngay trên pet"""
@@ -1222,6 +1496,22 @@ class Pet(QLabel):
                 settings_action = menu.addAction("⚙️ Mở cửa sổ cài đặt")
                 settings_action.triggered.connect(self.controller.show_window)
 
+            stats_menu = menu.addMenu("📊 Bộ nhớ animation")
+            stats_menu.addAction("Xem thống kê").triggered.connect(self.show_memory_report)
+            stats_menu.addAction("Xuất JSON (pet_memory.json)").triggered.connect(
+                lambda checked=False: self.dump_memory_report())
+
+            timing_menu = menu.addMenu("⏱️ Thời gian khung hình")
+            hud_action = timing_menu.addAction("Hiện HUD cạnh pet")
+            hud_action.setCheckable(True)
+            hud_action.setChecked(self.frame_hud_visible())
+            hud_action.triggered.connect(lambda checked=False: self.toggle_frame_hud())
+            timing_menu.addAction("Xuất CSV (pet_frames.csv)").triggered.connect(
+                lambda checked=False: self.dump_frame_stats())
+
+            menu.addAction("📝 Xuất log (pet_log.txt)").triggered.connect(
+                lambda checked=False: self.dump_log())
+
             menu.addSeparator()
 
             quit_action = menu.addAction("❌ Thoát")
@@ -1232,7 +1522,7 @@ class Pet(QLabel):
 
             menu.exec_(global_pos)
         except Exception as e:
-            print(f"Lỗi khi hiện menu chuột phải: {e}")
+            log.error("Lỗi khi hiện menu chuột phải: %s", e)
 
 if __name__ == '__main__':
     try:
@@ -1241,4 +1531,4 @@ if __name__ == '__main__':
         pet.show()
         sys.exit(app.exec_())
     except Exception as e:
-        print(f"Lỗi khởi động ứng dụng: {e}")
+        log.error("Lỗi khởi động ứng dụng: %s", e)
@@ -0,0 +1,279 @@
+# pet_world.py - Nhiều pet cùng lúc trên một vòng lặp khung hình
+import random
+import time
+from PyQt5.QtWidgets import QApplication
+from config import ConfigManager, SUPPORTED_PETS
+from frame_scheduler import shared_frame_scheduler, PHASE_PHYSICS, PHASE_ATTACHMENTS, PHASE_COMMIT
+from pet_python import Pet, AnimationManager
+from pet_core import PetMotion
+from physics_batch import MotionBatch, BatchedMotion, HAVE_NUMPY
+from spatial_grid import SpatialHashGrid, find_knocks
+from pet_log import get_logger
+
+log = get_logger(__name__)
+
+# Dưới số pet đang chuyển động này, bước từng pet một rẻ hơn chi phí cố định (~70 us) của
+# phép toán mảng (xem nhóm 'physics' trong scripts/benchmark.py)
+BATCH_MIN_ACTIVE = 128
+
+
+class PetWorld:
+    """Chứa N pet (mỗi pet có loại và kích thước riêng) và bước toàn bộ trong một lượt mỗi khung hình
+
+    Pet cùng loại dùng chung một AnimationManager (và cache khung hình), mọi pet dùng chung
+    một ConfigManager. World chỉ đăng ký một subscriber vật lý + một subscriber bong bóng nói
+    + một subscriber commit vị trí với đồng hồ khung hình, và chỉ bước các pet đang chuyển động.
+    Với 'batch_physics' (cần NumPy), trạng thái chuyển động của mọi pet nằm trong một MotionBatch
+    và khi có nhiều pet đang chuyển động, vật lý được bước cho cả nhóm trong một lượt.
+    Vị trí pet được ghi vào một lưới băm không gian (spatial_grid.py) sau mỗi bước: pet đang bị ném
+    va vào pet khác sẽ hất pet đó đi ('pet_collisions'), nearest_pet()/pets_near() tìm pet lân cận
+    mà không phải so với mọi pet.
+    """
+    def __init__(self, controller=None, config_manager=None, scheduler=None):
+        self.controller = controller
+        self.config_manager = config_manager if config_manager is not None else ConfigManager()
+        self.scheduler = scheduler if scheduler is not None else shared_frame_scheduler()
+        self.pets = []
+        # Pet đang cần bước mỗi khung hình (dict giữ thứ tự, thêm/xóa O(1))
+        self._active = {}
+        self._animation_managers = {}
+        self.batch = MotionBatch() if HAVE_NUMPY and self.config_manager.get_batch_physics() else None
+        # Chỉ mục không gian của mọi pet: chỉ pet đang chuyển động được cập nhật mỗi khung hình
+        self.grid = SpatialHashGrid()
+        self.collisions = self.config_manager.get_pet_collisions()
+        self.knocks = 0
+        self._stale = {}  # Pet đã di chuyển nhưng chưa ghi lại vào grid (dict giữ thứ tự)
+        self._physics_sub = None
+        self._attachments_sub = None
+        self._commit_sub = None
+
+    def animation_manager(self, pet_type):
+        """AnimationManager dùng chung cho mọi pet cùng loại (tạo lần đầu khi cần)"""
+        manager = self._animation_managers.get(pet_type)
+        if manager is None:
+            manager = AnimationManager(pet_type)
+            self._animation_managers[pet_type] = manager
+        return manager
+
+    def create_motion(self, width, height, screen_width, screen_height, x=0, y=0, layout=None, surfaces=None):
+        """PetMotion cho pet mới: nằm trong batch vật lý của world nếu có"""
+        if self.batch is not None:
+            return self.batch.create_motion(width, height, screen_width, screen_height, x, y,
+                                            layout=layout, surfaces=surfaces)
+        return PetMotion(width, height, screen_width, screen_height, x, y, layout=layout, surfaces=surfaces)
+
+    def spawn(self, pet_type='cat', width=None, height=None, x=None, show=True):
+        """Tạo một pet mới trong world, trả về Pet (None nếu lỗi)"""
+        try:
+            if pet_type not in SUPPORTED_PETS:
+                log.warning("Loại pet %s không được hỗ trợ", pet_type)
+                return None
+            pet = Pet(pet_type, width, height, controller=self.controller, world=self)
+            if x is None:
+                x = pet.motion.screen_left + random.randint(0, max(0, pet.screen_width - pet.width()))
+            pet.x = x
+            pet.motion.update_area()
+            pet.snap_physics_state()
+            pet.render_position(0.0)
+            pet.commit_geometry()
+            self.pets.append(pet)
+            self._index([pet])
+            if show:
+                pet.show()
+            return pet
+        except Exception as e:
+            log.error("Lỗi khi tạo pet trong world: %s", e)
+            return None
+
+    def despawn(self, pet):
+        """Xóa pet khỏi world và dọn tài nguyên của nó"""
+        try:
+            self.discard(pet)
+            pet.cleanup()
+        except Exception as e:
+            log.error("Lỗi khi xóa pet khỏi world: %s", e)
+
+    def discard(self, pet):
+        """Bỏ tham chiếu tới pet (pet tự gọi khi bị đóng từ bên ngoài)"""
+        if pet in self.pets:
+            self.pets.remove(pet)
+        self.deactivate(pet)
+        self._stale.pop(pet, None)
+        self.grid.remove(pet)
+        if isinstance(pet.motion, BatchedMotion):
+            pet.motion.detach()
+
+    def clear(self):
+        """Xóa mọi pet"""
+        for pet in list(self.pets):
+            self.despawn(pet)
+
+    def __len__(self):
+        return len(self.pets)
+
+    def __iter__(self):
+        return iter(list(self.pets))
+
+    # ------------------------------------------------------------------
+    # Vòng lặp chung
+    # ------------------------------------------------------------------
+    def activate(self, pet):
+        """Cho pet vào danh sách được bước mỗi khung hình"""
+        self._active[pet] = None
+        if self._physics_sub is None:
+            self._physics_sub = self.scheduler.subscribe(self._step_pets, PHASE_PHYSICS, 'world:pets')
+            self._attachments_sub = self.scheduler.subscribe(
+                self._update_attachments, PHASE_ATTACHMENTS, 'world:speech')
+            self._commit_sub = self.scheduler.subscribe(self._commit_geometry, PHASE_COMMIT, 'world:commit')
+
+    def deactivate(self, pet):
+        """Bỏ pet khỏi danh sách bước (pet đứng yên hoặc bị xóa)"""
+        self._active.pop(pet, None)
+        if not self._active and self._physics_sub is not None:
+            self.scheduler.unsubscribe(self._physics_sub)
+            self.scheduler.unsubscribe(self._attachments_sub)
+            self.scheduler.unsubscribe(self._commit_sub)
+            self._physics_sub = None
+            self._attachments_sub = None
+            self._commit_sub = None
+
+    def _step_pets(self, now):
+        # Pet có thể tự deactivate trong lúc bước: duyệt bản sao
+        active = list(self._active)
+        if self.batch is None or len(active) < BATCH_MIN_ACTIVE:
+            for pet in active:
+                pet.on_tick(now)
+            movers = [pet for pet in active if not pet._closed]
+        else:
+            self._step_batch(active, now)
+            movers = [pet for pet in active if not pet._closed]
+        # Chỉ mục được cập nhật lười: chỉ khi có pet đang bị ném (cần kiểm tra va chạm) hoặc có truy vấn
+        self._stale.update(dict.fromkeys(movers))
+        if self.collisions:
+            throwers = self._throwers(movers)
+            if throwers:
+                self._flush_index()
+                self._resolve_knocks(throwers)
+
+    def _step_batch(self, active, now):
+        """Bước vật lý mọi pet đang chuyển động trong một lượt MotionBatch rồi vẽ từng pet"""
+        start = time.perf_counter()
+        branches = [pet._tick_branch() for pet in active]
+        stepping, slots, elapsed = [], [], []
+        for pet in active:
+            pet_elapsed = pet._begin_tick(now)
+            if pet_elapsed is not None:
+                stepping.append(pet)
+                slots.append(pet.motion.slot)
+                elapsed.append(pet_elapsed)
+        updates = {}
+        if slots:
+            alphas = self.batch.advance(slots, elapsed)
+            xs, ys = self.batch.interpolate(slots, alphas)
+            rest = self.batch.at_rest(slots)
+            updates = dict(zip(stepping, zip(alphas.tolist(), xs.tolist(), ys.tolist(), rest.tolist())))
+        # Chi phí phần gộp chia đều cho các pet, cộng phần vẽ riêng của từng pet
+        share_ms = (time.perf_counter() - start) * 1000 / len(active)
+        for pet, branch in zip(active, branches):
+            pet_start = time.perf_counter()
+            update = updates.get(pet)
+            if update is not None and not pet._closed:
+                alpha, x, y, at_rest = update
+                if at_rest:
+                    # Hiếm: để pet tự vẽ vị trí cuối và tạm dừng vòng lặp
+                    pet._finish_tick(alpha)
+                elif pet.isVisible():
+                    pet.request_position(x, y)
+            pet.frame_stats.record(branch, share_ms + (time.perf_counter() - pet_start) * 1000, now)
+
+    def _update_attachments(self, now):
+        for pet in list(self._active):
+            pet._update_attachments(now)
+
+    def _commit_geometry(self, now):
+        for pet in list(self._active):
+            pet.commit_geometry(now)
+
+    # ------------------------------------------------------------------
+    # Chỉ mục không gian: va chạm + tìm pet lân cận
+    # ------------------------------------------------------------------
+    def _index(self, pets):
+        update = self.grid.update
+        for pet in pets:
+            motion = pet.motion
+            update(pet, motion.x, motion.y, motion.width, motion.height)
+
+    def _index_batch(self, pets):
+        """Như _index nhưng đọc vị trí thẳng từ mảng của batch (một lần cho cả nhóm)"""
+        batch = self.batch
+        slots = [pet.motion.slot for pet in pets]
+        update = self.grid.update
+        for pet, x, y, width, height in zip(pets, batch.x[slots].tolist(), batch.y[slots].tolist(),
+                                            batch.width[slots].tolist(), batch.height[slots].tolist()):
+            update(pet, x, y, width, height)
+
+    def _flush_index(self):
+        """Ghi vị trí mới của các pet đã di chuyển vào grid (trước khi kiểm tra va chạm/truy vấn)"""
+        if not self._stale:
+            return
+        pets = list(self._stale)
+        self._stale.clear()
+        if self.batch is not None:
+            self._index_batch(pets)
+        else:
+            self._index(pets)
+
+    def _throwers(self, movers):
+        """Các pet đang bị ném trong số pet vừa bước vật lý"""
+        if self.batch is not None:
+            bouncing = self.batch.is_bouncing[[pet.motion.slot for pet in movers]].tolist()
+            return [pet for pet, thrown in zip(movers, bouncing) if thrown]
+        return [pet for pet in movers if pet.motion.is_bouncing]
+
+    def _resolve_knocks(self, throwers):
+        """Pet đang bị ném va vào pet khác: hất pet bị va đi như một cú ném"""
+        for pet, other in find_knocks(self.grid, throwers):
+            vx, vy = pet.motion.knock(other.motion)
+            other.start_throw(vx, vy)
+            self.knocks += 1
+
+    def nearest_pet(self, pet, radius):
+        """Pet khác gần pet này nhất (theo tâm) trong bán kính radius px: (pet, khoảng cách) hoặc None"""
+        self._flush_index()
+        motion = pet.motion
+        return self.grid.nearest(motion.x + motion.width / 2, motion.y + motion.height / 2, radius, exclude=pet)
+
+    def pets_near(self, x, y, radius):
+        """Các (pet, khoảng cách) có tâm cách điểm (x, y) không quá radius px, gần nhất trước"""
+        self._flush_index()
+        return self.grid.within(x, y, radius)
+
+    def stats(self):
+        """Số pet, số pet đang chuyển động, số pet theo loại và chi phí vòng lặp của world"""
+        by_type = {}
+        for pet in self.pets:
+            by_type[pet.pet_type] = by_type.get(pet.pet_type, 0) + 1
+        subs = (self._physics_sub, self._attachments_sub, self._commit_sub)
+        return {
+            'pets': len(self.pets),
+            'active': len(self._active),
+            'by_type': by_type,
+            'animation_managers': len(self._animation_managers),
+            'moves_issued': sum(pet.moves_issued for pet in self.pets),
+            'moves_skipped': sum(pet.moves_skipped for pet in self.pets),
+            'physics': 'batch' if self.batch is not None else 'scalar',
+            'batched_steps': self.batch.batched_steps if self.batch is not None else 0,
+            'knocks': self.knocks,
+            'subscribers': [sub.stats() for sub in subs if sub is not None],
+        }
+
+
+if __name__ == '__main__':
+    import sys
+    app = QApplication(sys.argv)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    world = PetWorld()
+    for _ in range(count):
+        world.spawn(random.choice(list(SUPPORTED_PETS)), 60, 60)
+    log.info("Đã tạo %s pet", len(world))
+    sys.exit(app.exec_())
@@ -0,0 +1,432 @@
+# physics_batch.py - Vật lý gộp cho nhiều pet: trạng thái trong mảng NumPy liền mạch, bước một lần cho cả nhóm
+#
+# Mỗi pet chiếm một slot trong MotionBatch; BatchedMotion là PetMotion đọc/ghi thẳng vào slot đó nên
+# máy trạng thái hoạt động, kéo/ném chuột... vẫn dùng nguyên code vô hướng của pet_core. Chỉ bước
+# vật lý mỗi khung hình chạy theo mảng: mọi pet cùng chế độ (nảy, đường đi nhảy/bay/leo, đi, rơi)
+# được cập nhật bằng một phép toán vector, nên chi phí mỗi pet gần như không đổi khi số pet tăng.
+# NumPy là tùy chọn: không có NumPy thì PetWorld/headless_sim dùng PetMotion như cũ.
+import math
+from pet_core import (PetMotion, PHYSICS_STEP_S, MAX_FRAME_S, BOUNCE_GRAVITY, BOUNCE_FRICTION,
+                      BOUNCE_DAMPING, BOUNCE_STOP_SPEED, PATH_NONE, PATH_JUMP, PATH_FLY, PATH_CLIMB,
+                      JUMP_RISE, JUMP_FALL, FLY_RATE, FLY_BOB, CLIMB_UP_SPEED, CLIMB_FALL_SPEED, CLIMB_KEEP)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HAVE_NUMPY = np is not None
+
+FLOAT_FIELDS = ('x', 'y', 'dx', 'dy', 'prev_x', 'prev_y', 'gravity', 'ground_y', 'accumulator',
+                'path_x0', 'path_y0', 'path_tx', 'path_ty', 'path_v', 'surface_left', 'surface_right', 'surface_top')
+# Kích thước giữ kiểu int như PetMotion (rng.randint cần số nguyên)
+INT_FIELDS = ('width', 'height', 'screen_left', 'screen_top', 'screen_width', 'screen_height', 'physics_steps',
+              'path', 'path_step', 'path_n1', 'path_n2', 'path_end', 'surface')
+BOOL_FIELDS = ('is_on_ground', 'is_dragging', 'is_bouncing', 'is_jumping', 'is_flying', 'is_climbing')
+# Mã hoạt động cho bước vật lý: chỉ cần phân biệt đi/chạy và rơi
+ACTIVITY_OTHER, ACTIVITY_MOVE, ACTIVITY_FALL = 0, 1, 2
+_ACTIVITY_CODES = {'walk': ACTIVITY_MOVE, 'run': ACTIVITY_MOVE, 'fall': ACTIVITY_FALL}
+
+INITIAL_CAPACITY = 16
+
+
+def _slot_attr(name, kind):
+    """Thuộc tính của BatchedMotion đọc/ghi thẳng vào mảng của batch tại slot của pet"""
+    def getter(self):
+        return kind(getattr(self._batch, name)[self._slot])
+
+    def setter(self, value):
+        getattr(self._batch, name)[self._slot] = value
+    return property(getter, setter)
+
+
+class BatchedMotion(PetMotion):
+    """PetMotion lưu trạng thái trong một slot của MotionBatch (bước vật lý do batch chạy cho cả nhóm)"""
+    def __init__(self, batch, width, height, screen_width, screen_height, x=0, y=0, **kwargs):
+        self._batch = batch
+        self._slot = batch._allocate(self)
+        super().__init__(width, height, screen_width, screen_height, x, y, **kwargs)
+
+    @property
+    def slot(self):
+        return self._slot
+
+    @property
+    def surfaces(self):
+        return self._surfaces
+
+    @surfaces.setter
+    def surfaces(self, value):
+        # Cờ trong batch để bước rơi chỉ tra mặt đứng cho những pet có chỉ mục cửa sổ
+        self._surfaces = value
+        self._batch.has_surfaces[self._slot] = value is not None
+
+    @property
+    def current_activity(self):
+        return self._batch.activity[self._slot]
+
+    @current_activity.setter
+    def current_activity(self, value):
+        self._batch.activity[self._slot] = value
+        self._batch.activity_code[self._slot] = _ACTIVITY_CODES.get(value, ACTIVITY_OTHER)
+
+    def detach(self):
+        """Trả slot về cho batch (pet bị xóa khỏi world); trạng thái được chép sang một batch riêng
+        một slot nên motion vẫn dùng được mà không ghi đè lên pet nhận lại slot cũ"""
+        batch, slot = self._batch, self._slot
+        if batch.motions[slot] is not self:
+            return
+        own = MotionBatch(capacity=1)
+        own._allocate(self)
+        for name in FLOAT_FIELDS + INT_FIELDS + BOOL_FIELDS + ('activity_code', 'has_surfaces'):
+            getattr(own, name)[0] = getattr(batch, name)[slot]
+        own.activity[0] = batch.activity[slot]
+        batch._release(slot)
+        self._batch, self._slot = own, 0
+
+
+for _kind, _fields in ((float, FLOAT_FIELDS), (int, INT_FIELDS), (bool, BOOL_FIELDS)):
+    for _name in _fields:
+        setattr(BatchedMotion, _name, _slot_attr(_name, _kind))
+del _kind, _fields, _name
+
+
+class MotionBatch:
+    """Trạng thái chuyển động của nhiều pet trong các mảng NumPy, bước cả nhóm bằng phép toán vector
+
+    Kết quả từng bước khớp PetMotion.step() (sai khác chỉ ở mức làm tròn dấu phẩy động của sin).
+    Sự kiện 'landed', 'climb_up', 'bounce_end' được báo cho từng pet theo thứ tự slot sau mỗi bước,
+    giống thứ tự khi bước từng pet một.
+    """
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        if np is None:
+            raise RuntimeError("MotionBatch cần NumPy (pip install numpy)")
+        self.capacity = 0
+        self.motions = []    # slot -> BatchedMotion (None nếu slot trống)
+        self.activity = []   # slot -> tên hoạt động hiện tại
+        self._free = []
+        self.batched_steps = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        old = self.capacity
+        for name in FLOAT_FIELDS:
+            self._resize(name, np.float64, capacity)
+        for name in INT_FIELDS:
+            self._resize(name, np.int64, capacity)
+        for name in BOOL_FIELDS:
+            self._resize(name, np.bool_, capacity)
+        self._resize('activity_code', np.int8, capacity)
+        self._resize('has_surfaces', np.bool_, capacity)
+        self.motions.extend([None] * (capacity - old))
+        self.activity.extend(['idle'] * (capacity - old))
+        # Slot nhỏ được cấp trước
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self._free.sort(reverse=True)
+        self.capacity = capacity
+
+    def _resize(self, name, dtype, capacity):
+        array = np.zeros(capacity, dtype=dtype)
+        if self.capacity:
+            array[:self.capacity] = getattr(self, name)
+        setattr(self, name, array)
+
+    def _allocate(self, motion):
+        if not self._free:
+            self._grow(self.capacity * 2)
+        slot = self._free.pop()
+        self.motions[slot] = motion
+        return slot
+
+    def _release(self, slot):
+        if self.motions[slot] is None:
+            return
+        self.motions[slot] = None
+        for name in BOOL_FIELDS:
+            getattr(self, name)[slot] = False
+        self.has_surfaces[slot] = False
+        self._free.append(slot)
+        self._free.sort(reverse=True)
+
+    def create_motion(self, width, height, screen_width, screen_height, x=0, y=0, **kwargs):
+        """PetMotion mới có trạng thái nằm trong batch này"""
+        return BatchedMotion(self, width, height, screen_width, screen_height, x, y, **kwargs)
+
+    def __len__(self):
+        return self.capacity - len(self._free)
+
+    # ------------------------------------------------------------------
+    # Bước cố định + nội suy cho cả nhóm
+    # ------------------------------------------------------------------
+    def advance(self, slots, elapsed):
+        """Như PetMotion.advance cho nhiều pet: elapsed là thời gian trôi qua của từng slot,
+        trả về mảng alpha nội suy (mỗi pet có bộ tích lũy riêng nên số bước có thể khác nhau).
+        Pet đang theo đường tính sẵn nhảy thẳng tới đúng bước (không giới hạn MAX_FRAME_S), pet vật lý
+        tự do chỉ bù tối đa MAX_FRAME_S mỗi lần"""
+        slots = np.asarray(slots, dtype=np.intp)
+        elapsed = np.broadcast_to(np.asarray(elapsed, dtype=np.float64), slots.shape)
+        on_path = self.path[slots] != PATH_NONE
+        self.accumulator[slots] += np.where(on_path, elapsed, np.minimum(elapsed, MAX_FRAME_S))
+        scripted = slots[on_path]
+        if scripted.size:
+            steps = np.minimum((self.accumulator[scripted] / PHYSICS_STEP_S).astype(np.int64),
+                               self.path_end[scripted] - self.path_step[scripted])
+            seek = steps > 0
+            if seek.any():
+                seeking, steps = scripted[seek], steps[seek]
+                self._seek_paths(seeking, steps)
+                self.physics_steps[seeking] += steps
+                self.accumulator[seeking] -= steps * PHYSICS_STEP_S
+            # Đường đi vừa xong: phần thời gian còn lại chạy bước thường
+            finished = scripted[self.path[scripted] == PATH_NONE]
+            self.accumulator[finished] = np.minimum(self.accumulator[finished], MAX_FRAME_S)
+        due = slots[self.accumulator[slots] >= PHYSICS_STEP_S]
+        while due.size:
+            self.prev_x[due] = self.x[due]
+            self.prev_y[due] = self.y[due]
+            self.step(due)
+            self.physics_steps[due] += 1
+            self.accumulator[due] -= PHYSICS_STEP_S
+            due = due[self.accumulator[due] >= PHYSICS_STEP_S]
+        return self.accumulator[slots] / PHYSICS_STEP_S
+
+    def interpolate(self, slots, alpha):
+        """Vị trí pixel nội suy (đã làm tròn) của các slot, như PetMotion.interpolate"""
+        slots = np.asarray(slots, dtype=np.intp)
+        prev_x = self.prev_x[slots]
+        prev_y = self.prev_y[slots]
+        x = np.rint(prev_x + (self.x[slots] - prev_x) * alpha).astype(np.int64)
+        y = np.rint(prev_y + (self.y[slots] - prev_y) * alpha).astype(np.int64)
+        return x, y
+
+    def at_rest(self, slots):
+        """Mặt nạ các slot đứng yên trên mặt đất, như PetMotion.is_at_rest"""
+        slots = np.asarray(slots, dtype=np.intp)
+        moving = (self.is_dragging[slots] | self.is_bouncing[slots] | self.is_jumping[slots]
+                  | self.is_flying[slots] | self.is_climbing[slots])
+        return ~moving & self.is_on_ground[slots] & (self.activity_code[slots] != ACTIVITY_MOVE)
+
+    def step(self, slots):
+        """Một bước vật lý cố định cho các slot: chia theo chế độ giống PetMotion.step rồi bước từng nhóm"""
+        slots = np.asarray(slots, dtype=np.intp)
+        if not slots.size:
+            return
+        self.batched_steps += 1
+        bouncing = self.is_bouncing[slots]
+        rest = ~bouncing
+        scripted = rest & (self.path[slots] != PATH_NONE)
+        rest &= ~scripted
+        code = self.activity_code[slots]
+        moving = rest & (code == ACTIVITY_MOVE)
+        rest &= ~moving
+        falling = rest & ((code == ACTIVITY_FALL) | ~self.is_on_ground[slots])
+
+        events = []
+        if bouncing.any():
+            self._bounce_step(slots[bouncing], events)
+        if scripted.any():
+            self._path_step(slots[scripted], events)
+        if moving.any():
+            self._move_step(slots[moving])
+        if falling.any():
+            self._fall_step(slots[falling])
+        if events:
+            self._dispatch(events)
+
+    def _dispatch(self, events):
+        """Báo sự kiện cho từng pet theo thứ tự slot (sort ổn định: sự kiện của cùng một pet giữ thứ tự)"""
+        events.sort(key=lambda item: item[0])
+        for slot, event, message in events:
+            motion = self.motions[slot]
+            if motion is None:
+                continue
+            if message:
+                motion._info(*message)
+            if event:
+                motion._emit(event)
+
+    @staticmethod
+    def _collect(events, slots, event, *message):
+        for slot in slots.tolist():
+            events.append((slot, event, message))
+
+    # ------------------------------------------------------------------
+    # Các bước chuyển động theo mảng (cùng công thức với PetMotion)
+    # ------------------------------------------------------------------
+    def _apply_gravity(self, s):
+        # Nhóm đi/rơi không bao giờ đang leo (leo được ưu tiên ở step)
+        air = s[~self.is_on_ground[s]]
+        if not air.size:
+            return
+        self.dy[air] += self.gravity[air]
+        # Pet có chỉ mục cửa sổ và đang rơi xuống: tra mặt đứng từng pet (chỉ mục là đối tượng Python)
+        landing = air[self.has_surfaces[air] & (self.dy[air] > 0)]
+        previous_bottom = self.y[landing] + self.height[landing]
+        self.y[air] += self.dy[air]
+        for slot, bottom in zip(landing.tolist(), previous_bottom.tolist()):
+            self.motions[slot]._land_on_surface(bottom)
+        hit = air[self.y[air] >= self.ground_y[air]]
+        self.y[hit] = self.ground_y[hit]
+        self.dy[hit] = 0.0
+        self.is_on_ground[hit] = True
+
+    def _move_step(self, s):
+        self._apply_gravity(s)
+        self.x[s] += self.dx[s]
+        x = self.x[s]
+        min_x = self.screen_left[s]
+        right_edge = min_x + self.screen_width[s]
+        max_x = right_edge - self.width[s]
+        left = x <= min_x
+        right = ~left & (x + self.width[s] >= right_edge)
+        turn = left | right
+        self.x[s] = np.where(left, min_x, np.where(right, max_x, x))
+        self.dx[s[turn]] *= -1
+        ground = s[self.is_on_ground[s]]
+        # Đi quá mép cửa sổ đang đứng thì rơi (mặt đất màn hình có khoảng ngang vô hạn)
+        center = self.x[ground] + self.width[ground] / 2
+        off = (center < self.surface_left[ground]) | (center > self.surface_right[ground])
+        if off.any():
+            for slot in ground[off].tolist():
+                self.motions[slot]._leave_surface()
+            ground = ground[~off]
+        self.y[ground] = self.ground_y[ground]
+
+    def _fall_step(self, s):
+        self._apply_gravity(s)
+        ground = s[self.is_on_ground[s]]
+        self.y[ground] = self.ground_y[ground]
+
+    def _path_xy(self, s, n):
+        """Vị trí ở bước n của đường đi tính sẵn: công thức đóng theo số bước (như PetMotion.path_position)"""
+        kind = self.path[s]
+        min_x = self.screen_left[s].astype(np.float64)
+        max_x = min_x + (self.screen_width[s] - self.width[s])
+        ground = self.ground_y[s]
+        n1 = self.path_n1[s]
+        x = self.x[s]
+        y = self.y[s]
+
+        jump = kind == PATH_JUMP
+        if jump.any():
+            up = np.minimum(n, n1)
+            down = np.maximum(0, n - n1)
+            jump_x = self.path_x0[s] + self.path_v[s] * (up + 0.5 * down)
+            x = np.where(jump, np.maximum(min_x, np.minimum(jump_x, max_x)), x)
+            y = np.where(jump, ground - np.maximum(0.0, JUMP_RISE * up - JUMP_FALL * down), y)
+        fly = kind == PATH_FLY
+        if fly.any():
+            t = np.minimum(1.0, n * FLY_RATE)
+            eased = t * t * (3 - 2 * t)
+            bob = np.sin(t * math.pi * 2) * FLY_BOB * (1 - t)
+            x0, y0 = self.path_x0[s], self.path_y0[s]
+            x = np.where(fly, x0 + (self.path_tx[s] - x0) * eased, x)
+            y = np.where(fly, y0 + (self.path_ty[s] - y0) * eased - bob, y)
+        climb = kind == PATH_CLIMB
+        if climb.any():
+            tx, ty, n2 = self.path_tx[s], self.path_ty[s], self.path_n2[s]
+            x = np.where(climb, tx + (self.path_x0[s] - tx) * CLIMB_KEEP ** np.minimum(n, n1), x)
+            climb_y = np.where(n <= n1, ground,
+                               np.where(n <= n2, np.maximum(ty, ground - CLIMB_UP_SPEED * (n - n1)),
+                                        np.minimum(ground, ty + CLIMB_FALL_SPEED * (n - n2))))
+            y = np.where(climb, climb_y, y)
+        return x, y
+
+    def _seek_paths(self, s, steps):
+        """Nhảy thẳng steps bước trên đường đi tính sẵn (O(1) mỗi pet, như PetMotion.seek_path)"""
+        n = self.path_step[s] + steps
+        self.prev_x[s], self.prev_y[s] = self._path_xy(s, n - 1)
+        events = []
+        self._path_step(s, events, n)
+        if events:
+            self._dispatch(events)
+
+    def _path_step(self, s, events, n=None):
+        """Bước kế tiếp (hoặc tới bước n) của đường đi tính sẵn, báo các mốc leo đã vượt qua"""
+        previous = self.path_step[s]
+        if n is None:
+            n = previous + 1
+        n = np.minimum(n, self.path_end[s])
+        self.path_step[s] = n
+        kind = self.path[s]
+        jump = kind == PATH_JUMP
+        fly = kind == PATH_FLY
+        climb = kind == PATH_CLIMB
+        x, y = self._path_xy(s, n)
+        if climb.any():
+            n1, n2 = self.path_n1[s], self.path_n2[s]
+            arrived = s[climb & (previous < n1) & (n1 <= n)]
+            if arrived.size:
+                self._collect(events, arrived, 'climb_up', "Bắt đầu leo lên!")
+            for slot in s[climb & (previous < n2) & (n2 <= n)].tolist():
+                events.append((slot, None, ("Đã leo lên độ cao %d!", self.path_ty[slot])))
+        self.x[s] = x
+        self.y[s] = y
+
+        # Hết đường đi: chạm đất
+        done = n >= self.path_end[s]
+        if done.any():
+            finished = s[done]
+            # Đích bay có thể ở màn hình khác: chuyển vùng làm việc (hiếm, chạy từng pet)
+            for slot in s[done & fly].tolist():
+                motion = self.motions[slot]
+                self.y[slot] = self.path_ty[slot]
+                if motion is not None:
+                    motion.update_area()
+            self.y[finished] = self.ground_y[finished]
+            self.is_on_ground[finished] = True
+            self.is_jumping[finished] = False
+            self.is_flying[finished] = False
+            self.is_climbing[finished] = False
+            self.path[finished] = PATH_NONE
+            # Nhảy/leo có thể đưa pet ra ngoài mép cửa sổ đang đứng
+            for slot in finished[self.surface[finished] >= 0].tolist():
+                self.motions[slot].check_support()
+            self._collect(events, s[done & jump], 'landed')
+            self._collect(events, s[done & fly], 'landed', "Đã bay xuống đất!")
+            self._collect(events, s[done & climb], 'landed', "Đã rơi xuống đất!")
+
+    def _bounce_step(self, s, events):
+        dx = self.dx[s] * BOUNCE_FRICTION
+        dy = (self.dy[s] + BOUNCE_GRAVITY) * BOUNCE_FRICTION
+        x = self.x[s] + dx
+        y = self.y[s] + dy
+        with_surfaces = self.has_surfaces[s]
+        if with_surfaces.any():
+            # Sàn có thể là cạnh cửa sổ: ghi vị trí mới trước rồi tra mặt đứng từng pet như PetMotion
+            previous_bottom = self.y[s] + self.height[s]
+            self.x[s] = x
+            self.y[s] = y
+            self.dy[s] = dy
+            for slot, bottom in zip(s[with_surfaces].tolist(), previous_bottom[with_surfaces].tolist()):
+                self.motions[slot]._bounce_surface(bottom)
+
+        min_x = self.screen_left[s].astype(np.float64)
+        max_x = min_x + (self.screen_width[s] - self.width[s])
+        min_y = self.screen_top[s].astype(np.float64)
+        max_y = self.ground_y[s]
+        left = x <= min_x
+        right = ~left & (x >= max_x)
+        top = y <= min_y
+        floor = ~top & (y >= max_y)
+        x = np.where(left, min_x, np.where(right, max_x, x))
+        dx = np.where(left, np.abs(dx) * BOUNCE_DAMPING, np.where(right, -np.abs(dx) * BOUNCE_DAMPING, dx))
+        y = np.where(top, min_y, np.where(floor, max_y, y))
+        dy = np.where(top, np.abs(dy) * BOUNCE_DAMPING, np.where(floor, -np.abs(dy) * BOUNCE_DAMPING, dy))
+        # Ma sát sàn khi chạm đất
+        dx = np.where(floor, dx * 0.9, dx)
+        bounced = left | right | top | floor
+
+        # Dừng khi đã chậm và đang gần mặt đất
+        speed = np.hypot(dx, dy)
+        near_ground = y >= max_y - 2
+        stop = near_ground & ((speed < BOUNCE_STOP_SPEED) | (bounced & (speed < BOUNCE_STOP_SPEED * 1.5)))
+        self.x[s] = x
+        self.y[s] = np.where(stop, max_y, y)
+        self.dx[s] = np.where(stop, 0.0, dx)
+        self.dy[s] = np.where(stop, 0.0, dy)
+        stopped = s[stop]
+        if stopped.size:
+            self.is_bouncing[stopped] = False
+            self.is_on_ground[stopped] = True
+            self._collect(events, stopped, 'bounce_end')
@@ -0,0 +1,159 @@
+# screen_geometry.py - Vùng làm việc của mọi màn hình, lưu sẵn và cập nhật theo tín hiệu màn hình của Qt
+# (và mặt đứng từ cạnh trên các cửa sổ desktop, đọc định kỳ qua surfaces)
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+from pet_core import ScreenLayout, WorkArea
+from surfaces import SurfaceIndex, create_surface_provider
+from pet_log import get_logger
+
+log = get_logger(__name__)
+
+# Chu kỳ đọc lại danh sách cửa sổ desktop (ms)
+SURFACE_POLL_MS = 500
+
+
+class ScreenGeometry:
+    """Giữ availableGeometry (đã trừ taskbar/dock) của mọi màn hình dưới dạng pet_core.ScreenLayout
+
+    Layout chỉ được dựng lại khi Qt báo thêm/bớt màn hình, đổi màn hình chính hoặc màn hình đổi
+    hình học/vùng làm việc; nhiều tín hiệu liên tiếp (đổi độ phân giải bắn cả geometryChanged lẫn
+    availableGeometryChanged) được gộp thành một lần dựng trong lượt event loop kế tiếp. Layout
+    mới khác layout cũ thì báo cho các listener(layout). Pet tra cứu trên layout đã lưu, không hỏi Qt.
+    """
+    def __init__(self):
+        app = QApplication.instance()
+        self.layout = None
+        self.rebuilds = 0
+        self._listeners = []
+        self._rebuild_pending = False
+        for screen in app.screens():
+            self._watch(screen)
+        app.screenAdded.connect(self._on_screen_added)
+        app.screenRemoved.connect(self._schedule_rebuild)
+        app.primaryScreenChanged.connect(self._schedule_rebuild)
+        self._rebuild()
+
+    def _watch(self, screen):
+        screen.geometryChanged.connect(self._schedule_rebuild)
+        screen.availableGeometryChanged.connect(self._schedule_rebuild)
+
+    def _on_screen_added(self, screen):
+        self._watch(screen)
+        self._schedule_rebuild()
+
+    def _schedule_rebuild(self, *args):
+        if not self._rebuild_pending:
+            self._rebuild_pending = True
+            QTimer.singleShot(0, self._rebuild)
+
+    def _read_layout(self):
+        """Đọc vùng làm việc của các màn hình từ Qt (màn hình chính đứng đầu)"""
+        app = QApplication.instance()
+        primary = app.primaryScreen()
+        screens = sorted(app.screens(), key=lambda screen: screen is not primary)
+        areas = []
+        for screen in screens:
+            rect = screen.availableGeometry()
+            if rect.width() > 0 and rect.height() > 0:
+                areas.append(WorkArea(rect.x(), rect.y(), rect.width(), rect.height()))
+        return ScreenLayout(areas) if areas else None
+
+    def _rebuild(self):
+        self._rebuild_pending = False
+        try:
+            layout = self._read_layout()
+            if layout is None:
+                # Tạm thời không còn màn hình nào (đang cắm/rút): giữ layout cũ
+                log.warning("Không đọc được màn hình nào, giữ vùng làm việc cũ")
+                return
+            if layout == self.layout:
+                return
+            self.layout = layout
+            self.rebuilds += 1
+            log.info("Vùng làm việc màn hình: %s", ', '.join(repr(area) for area in layout.areas))
+            for listener in list(self._listeners):
+                listener(layout)
+        except Exception as e:
+            log.error("Lỗi khi cập nhật hình học màn hình: %s", e)
+
+    def subscribe(self, listener):
+        """Gọi listener(layout) mỗi khi vùng làm việc thay đổi"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def area_at(self, x, y):
+        """Vùng làm việc chứa điểm (toạ độ toàn cục), hoặc vùng gần nhất"""
+        return self.layout.area_at(x, y)
+
+
+# Hình học màn hình dùng chung cho cả process
+_shared_geometry = None
+
+
+def shared_screen_geometry():
+    """ScreenGeometry dùng chung (tạo lần đầu khi cần, sau khi đã có QApplication)"""
+    global _shared_geometry
+    if _shared_geometry is None:
+        _shared_geometry = ScreenGeometry()
+    return _shared_geometry
+
+
+class DesktopSurfaces:
+    """Cạnh trên các cửa sổ desktop làm mặt đứng cho pet: nguồn cửa sổ + surfaces.SurfaceIndex
+
+    Qt không báo cửa sổ của ứng dụng khác dời/đóng nên danh sách được đọc lại mỗi SURFACE_POLL_MS;
+    SurfaceIndex so với lần trước và chỉ cập nhật các đoạn thay đổi, listener(changed) chỉ được gọi
+    khi có mặt đứng bị dời hoặc mất (changed là tập handle). Đứng yên thì mỗi lần đọc chỉ là một so sánh.
+    """
+    def __init__(self, provider, interval_ms=SURFACE_POLL_MS):
+        self.provider = provider
+        self.index = SurfaceIndex()
+        self.polls = 0
+        self._listeners = []
+        self._timer = QTimer()
+        self._timer.timeout.connect(self.poll)
+        self.poll()
+        self._timer.start(interval_ms)
+
+    def poll(self):
+        try:
+            self.polls += 1
+            changed = self.index.sync(self.provider.windows())
+            if changed:
+                log.debug("Mặt đứng thay đổi: %d đoạn", len(changed))
+                for listener in list(self._listeners):
+                    listener(changed)
+        except Exception as e:
+            log.error("Lỗi khi đọc cửa sổ desktop: %s", e)
+
+    def subscribe(self, listener):
+        """Gọi listener(changed) mỗi khi có mặt đứng bị dời hoặc mất"""
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def close(self):
+        self._timer.stop()
+        self.provider.close()
+
+
+# Mặt đứng từ cửa sổ desktop dùng chung cho cả process (False: đã thử, không có nguồn cửa sổ)
+_shared_surfaces = None
+
+
+def shared_desktop_surfaces(provider='auto'):
+    """DesktopSurfaces dùng chung (tạo lần đầu theo tên nguồn cửa sổ), None nếu không dùng được"""
+    global _shared_surfaces
+    if _shared_surfaces is None:
+        source = create_surface_provider(provider)
+        _shared_surfaces = DesktopSurfaces(source) if source is not None else False
+        if source is not None:
+            log.info("Pet đứng được trên cửa sổ (nguồn: %s)", type(source).__name__)
+    return _shared_surfaces or None
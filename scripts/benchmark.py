@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the pet hot paths.
+
+Groups (select with --group, repeatable):
+  tick     - Pet.on_tick per activity branch, PetMotion.bounce_step under heavy throws,
+             headless simulation ticks
+  physics  - one fixed physics step for N pets: PetMotion.step per pet vs MotionBatch.step
+             (NumPy, skipped when NumPy is missing)
+  grid     - pet-to-pet queries for N pets, each against a brute-force scan: one world tick
+             of collision work with 5% of the pets thrown (incremental SpatialHashGrid update
+             + find_knocks; the grid only breaks even around 200 pets and is slower below
+             that), all overlapping pairs, nearest pet within r; window surfaces for N
+             windows: SurfaceIndex.landing for falling pets vs a scan, SurfaceIndex.sync
+             after one window moved
+  effects  - FireworksEffect._on_tick and paintEvent
+  frames   - Pet.load_animation (cached / decode), Pet.set_size (cached / preview),
+             AnimationManager construction per pet type
+  assets   - scripts/make_5frame_gifs.py stages (mouth, atlas, pack) into a temp directory
+
+Runs on the offscreen Qt platform by default, so no display is needed. Every benchmark
+runs `number` calls per repeat; the reported figures are per call, in microseconds.
+Results are printed as a table and can be written as JSON (--json). Comparison is opt-in:
+--save-baseline stores this machine's results locally (scripts/benchmark_baseline.json,
+not tracked by git, or --baseline PATH), and a later run with --baseline PATH compares
+against it using the fastest repeat (the least noisy estimate on a shared machine);
+anything slower than --tolerance is reported as a regression and makes the script exit
+with status 1. Baselines are only meaningful on the machine that recorded them, so none
+is shipped with the repository.
+"""
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'scripts'))
+# The app loads assets relative to the repository root
+os.chdir(ROOT)
+
+DEFAULT_BASELINE = ROOT / 'scripts' / 'benchmark_baseline.json'
+GROUPS = ['tick', 'physics', 'grid', 'effects', 'frames', 'assets']
+FRAME_S = 1 / 60
+
+
+class Runner:
+    """Collects per-call timings for named benchmarks."""
+
+    def __init__(self, repeat, scale, name_filter=None):
+        self.repeat = repeat
+        self.scale = scale
+        self.name_filter = name_filter
+        self.results = {}
+
+    def bench(self, name, fn, number=100, setup=None, repeat=None):
+        if self.name_filter and self.name_filter not in name:
+            return
+        number = max(1, int(number * self.scale))
+        samples = []
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            # Like timeit: keep garbage collection out of the timed loop
+            gc_enabled = gc.isenabled()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                for _ in range(number):
+                    fn()
+                samples.append((time.perf_counter() - start) / number)
+            finally:
+                if gc_enabled:
+                    gc.enable()
+        samples.sort()
+        us = [s * 1e6 for s in samples]
+        self.results[name] = {
+            'median_us': round(statistics.median(us), 3),
+            'min_us': round(us[0], 3),
+            'mean_us': round(statistics.fmean(us), 3),
+            'p95_us': round(us[min(len(us) - 1, int(len(us) * 0.95))], 3),
+            'repeat': len(us),
+            'number': number,
+        }
+        # sys.__stdout__: benchmarks may run inside quiet()
+        print(f'{name:<40} {self.results[name]["median_us"]:>12.2f} us  (min {us[0]:.2f})',
+              file=sys.__stdout__, flush=True)
+
+
+def quiet():
+    """Silence the app's progress prints while timing."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+def bench_tick(runner, app):
+    from pet_python import Pet
+    from pet_core import PetMotion
+    from headless_sim import HeadlessSimulation
+
+    with quiet():
+        pet = Pet('cat', 100, 100)
+    clock = {'now': 0.0}
+
+    def start(activity):
+        def setup():
+            with quiet():
+                pet.activity_manager.start_activity(activity)
+                if activity == 'idle':
+                    # idle branch with the pet still in the air (falls under gravity)
+                    pet.y = 0
+                    pet.is_on_ground = False
+            clock['now'] += 1.0
+            pet._last_tick_time = clock['now']
+        return setup
+
+    def tick():
+        clock['now'] += FRAME_S
+        pet.on_tick(clock['now'])
+
+    with quiet():
+        for activity in ('idle', 'walk', 'run', 'jump', 'fly', 'climb', 'fall'):
+            runner.bench(f'pet.on_tick[{activity}]', tick, number=60, setup=start(activity), repeat=runner.repeat * 3)
+
+        def throw():
+            clock['now'] += 1.0
+            pet._last_tick_time = clock['now']
+            pet.x, pet.y = 400, 200
+            pet.start_throw(55, -40)
+        runner.bench('pet.on_tick[bounce]', tick, number=60, setup=throw, repeat=runner.repeat * 3)
+        pet.cleanup()
+
+    motion = PetMotion(100, 100, 1920, 1080, 400, 200, log=None)
+
+    def heavy_throw():
+        motion.x, motion.y = 400, 200
+        motion.throw(55, -55)
+    runner.bench('motion.bounce_step[heavy throw]', motion.bounce_step, number=300, setup=heavy_throw)
+
+    sim = HeadlessSimulation(seed=1, trace_every=0)
+    for _ in range(10):
+        sim.add_pet()
+    runner.bench('headless.step[10 pets]', sim.step, number=2000)
+
+
+def bench_physics(runner, app):
+    import random
+    from pet_core import PetMotion
+    from physics_batch import MotionBatch, HAVE_NUMPY
+
+    activities = ('walk', 'run', 'jump', 'fly', 'climb', 'fall', 'idle')
+
+    def spawn(create, count):
+        motions = [create(100, 100, 1920, 1080, 0, 0, rng=random.Random(i), log=None) for i in range(count)]
+
+        def setup():
+            # Same mix of movement modes for every repeat
+            for i, motion in enumerate(motions):
+                motion.rng.seed(i)
+                motion.stop_activity()
+                motion.x, motion.y = (i * 37) % 1800, 400
+                motion.begin_activity(activities[i % len(activities)])
+        return motions, setup
+
+    for count in (10, 100, 1000):
+        number = max(20, 2000 // count)
+        motions, setup = spawn(PetMotion, count)
+
+        def scalar_step(motions=motions):
+            for motion in motions:
+                motion.step()
+        runner.bench(f'physics.scalar[{count} pets]', scalar_step, number=number, setup=setup)
+
+        if not HAVE_NUMPY:
+            continue
+        batch = MotionBatch()
+        motions, setup = spawn(batch.create_motion, count)
+        slots = [motion.slot for motion in motions]
+        runner.bench(f'physics.batch[{count} pets]', lambda slots=slots: batch.step(slots),
+                     number=number, setup=setup)
+
+
+def bench_grid(runner, app):
+    import random
+    from pet_core import PetMotion
+    from spatial_grid import SpatialHashGrid, find_knocks
+
+    def overlaps(a, b):
+        return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+    for count in (50, 200, 500):
+        rng = random.Random(count)
+        # Pets spread over two 1920x1080 screens, each drifting a few px per tick like walking pets
+        start = [[rng.uniform(0, 3740), rng.uniform(0, 980), 100, 100, rng.choice((-3, -1.5, 1.5, 3))]
+                 for _ in range(count)]
+        pets = [list(p) for p in start]
+        grid = SpatialHashGrid()
+
+        def setup():
+            for pet, initial in zip(pets, start):
+                pet[:] = initial
+            grid.clear()
+            for i, pet in enumerate(pets):
+                grid.update(i, *pet[:4])
+
+        def drift():
+            for pet in pets:
+                pet[0] = (pet[0] + pet[4]) % 3740
+
+        def grid_pairs():
+            drift()
+            update = grid.update
+            for i, pet in enumerate(pets):
+                update(i, pet[0], pet[1], pet[2], pet[3])
+            return grid.pairs()
+
+        def brute_pairs():
+            drift()
+            found = []
+            for i in range(count):
+                a = pets[i]
+                for j in range(i + 1, count):
+                    if overlaps(a, pets[j]):
+                        found.append((i, j))
+            return found
+
+        def grid_nearest():
+            for i in range(0, count, 10):
+                pet = pets[i]
+                grid.nearest(pet[0] + 50, pet[1] + 50, 300, exclude=i)
+
+        def brute_nearest():
+            for i in range(0, count, 10):
+                x, y = pets[i][0] + 50, pets[i][1] + 50
+                best = None
+                for j, other in enumerate(pets):
+                    if j != i:
+                        d = ((other[0] + 50 - x) ** 2 + (other[1] + 50 - y) ** 2) ** 0.5
+                        if d <= 300 and (best is None or d < best[1]):
+                            best = (j, d)
+
+        # World tick: every pet moved, 5% of them thrown and checked against everyone else
+        class Body:
+            __slots__ = ('motion',)
+
+            def __init__(self, motion):
+                self.motion = motion
+
+        bodies = [Body(PetMotion(100, 100, 3840, 1080, p[0], p[1], log=None)) for p in start]
+        for body in bodies[::20]:
+            body.motion.is_bouncing = True
+            body.motion.dx, body.motion.dy = 20, -10
+        tick_grid = SpatialHashGrid()
+
+        def tick_setup():
+            tick_grid.clear()
+            for body, initial in zip(bodies, start):
+                body.motion.x = initial[0]
+
+        def grid_tick():
+            # Như PetWorld: grid chỉ được cập nhật khi có pet đang bị ném
+            for body, initial in zip(bodies, start):
+                body.motion.x = (body.motion.x + initial[4]) % 3740
+            throwers = [body for body in bodies if body.motion.is_bouncing]
+            if not throwers:
+                return []
+            update = tick_grid.update
+            for body in bodies:
+                motion = body.motion
+                update(body, motion.x, motion.y, motion.width, motion.height)
+            return find_knocks(tick_grid, throwers)
+
+        def brute_tick():
+            found = []
+            for body, initial in zip(bodies, start):
+                body.motion.x = (body.motion.x + initial[4]) % 3740
+            for body in bodies:
+                m = body.motion
+                if not m.is_bouncing:
+                    continue
+                for other in bodies:
+                    o = other.motion
+                    if (other is not body and not o.is_bouncing and m.x < o.x + o.width and o.x < m.x + m.width
+                            and m.y < o.y + o.height and o.y < m.y + m.height):
+                        found.append((body, other))
+            return found
+
+        number = max(5, 2000 // count)
+        runner.bench(f'grid.tick[{count} pets]', grid_tick, number=number, setup=tick_setup)
+        runner.bench(f'brute.tick[{count} pets]', brute_tick, number=number, setup=tick_setup)
+        runner.bench(f'grid.pairs[{count} pets]', grid_pairs, number=number, setup=setup)
+        runner.bench(f'brute.pairs[{count} pets]', brute_pairs, number=max(2, number // 4), setup=setup)
+        # count // 10 queries per call
+        runner.bench(f'grid.nearest[{count} pets]', grid_nearest, number=number, setup=setup)
+        runner.bench(f'brute.nearest[{count} pets]', brute_nearest, number=max(2, number // 4), setup=setup)
+
+    bench_surfaces(runner)
+
+
+def bench_surfaces(runner):
+    import random
+    from surfaces import FakeSurfaceProvider, SurfaceIndex
+
+    for count in (20, 100):
+        rng = random.Random(count)
+        provider = FakeSurfaceProvider((i, (rng.randint(0, 3400), rng.randint(50, 900), rng.randint(300, 900),
+                                            rng.randint(200, 600))) for i in range(count))
+        index = SurfaceIndex()
+        index.sync(provider.windows())
+        edges = index.surfaces()
+        # 100 falling pets, each one physics step (a few px) somewhere on the desktop
+        falls = [(rng.uniform(0, 3840), rng.uniform(0, 1000)) for _ in range(100)]
+
+        def surface_landing():
+            for x, bottom in falls:
+                index.landing(x, bottom, bottom + 12)
+
+        def brute_landing():
+            for x, bottom in falls:
+                best = None
+                for edge in edges:
+                    if edge.left <= x <= edge.right and bottom <= edge.top <= bottom + 12 and (
+                            best is None or edge.top < best.top):
+                        best = edge
+
+        moved = count // 2
+
+        def surface_sync():
+            left, top, width, height = provider.windows()[moved][1]
+            provider.set_window(moved, left + 7, top, width, height)
+            return index.sync(provider.windows())
+
+        runner.bench(f'surfaces.landing[{count} windows]', surface_landing, number=20)
+        runner.bench(f'brute.landing[{count} windows]', brute_landing, number=20)
+        runner.bench(f'surfaces.sync[{count} windows]', surface_sync, number=20)
+
+
+def bench_effects(runner, app):
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtGui import QPixmap
+    from pet_python import FireworksEffect
+
+    state = {'fx': None, 'now': 0.0}
+
+    def new_effect(warmup_s):
+        def setup():
+            if state['fx'] is not None:
+                state['fx'].close()
+            fx = FireworksEffect(500, 500, duration_ms=600000)
+            state['fx'] = fx
+            state['now'] = fx._start
+            # Advance until every burst is live so the timed loop covers all particles
+            while state['now'] - fx._start < warmup_s:
+                state['now'] += FRAME_S
+                fx._on_tick(state['now'])
+        return setup
+
+    def tick():
+        state['now'] += FRAME_S
+        state['fx']._on_tick(state['now'])
+
+    runner.bench('fireworks._on_tick', tick, number=60, setup=new_effect(0.8))
+
+    canvas = QPixmap(260, 260)
+
+    def paint():
+        canvas.fill(Qt.transparent)
+        state['fx'].render(canvas)
+    runner.bench('fireworks.paintEvent[flash]', paint, number=20, setup=new_effect(0.76))
+    runner.bench('fireworks.paintEvent[particles]', paint, number=20, setup=new_effect(1.2))
+    if state['fx'] is not None:
+        state['fx'].close()
+
+
+def bench_frames(runner, app):
+    from config import SUPPORTED_PETS
+    from pet_python import Pet, AnimationManager
+
+    with quiet():
+        pet = Pet('dog', 100, 100)
+    manager = pet.animation_manager
+    animation = manager.get_random_animation('walk')
+
+    def load_cached():
+        pet.load_animation(animation, block=True)
+    with quiet():
+        load_cached()
+        runner.bench('pet.load_animation[cached]', load_cached, number=50)
+        runner.bench('pet.load_animation[decode]', load_cached, number=1,
+                     setup=manager.frame_cache.clear, repeat=runner.repeat * 5)
+
+    sizes = {'i': 0}
+    cached_sizes = [(100, 100), (150, 150)]
+    with quiet():
+        for size in cached_sizes:
+            pet.set_size(*size)
+            pet.load_animation(animation, block=True)
+
+        def resize_cached():
+            sizes['i'] += 1
+            pet.set_size(*cached_sizes[sizes['i'] % 2])
+        runner.bench('pet.set_size[cached]', resize_cached, number=50)
+
+        def resize_preview():
+            # Sizes never decoded before: scaled preview + coalesced background rescale
+            sizes['i'] += 1
+            pet.set_size(101 + sizes['i'] % 97, 101 + sizes['i'] % 97)
+        runner.bench('pet.set_size[preview]', resize_preview, number=50)
+        pet.cleanup()
+
+    for pet_type in SUPPORTED_PETS:
+        def construct(pet_type=pet_type):
+            with quiet():
+                AnimationManager(pet_type)
+        runner.bench(f'animation_manager.init[{pet_type}]', construct, number=5)
+
+
+def bench_assets(runner, app):
+    try:
+        import make_5frame_gifs as build
+    except ImportError as e:
+        print(f'skipping assets group: {e}')
+        return
+
+    tmp = Path(tempfile.mkdtemp(prefix='pet-bench-'))
+    atlas_root, bundle_path = build.ATLAS_ROOT, build.BUNDLE_PATH
+    # Stages write into module-level output paths; point them at the temp directory.
+    # The pack stage reads the committed atlases and only writes the bundle.
+    build.BUNDLE_PATH = tmp / 'assets.pack'
+    source = sorted((build.ROOT / 'dog').glob('*.gif'))[0]
+    try:
+        with quiet():
+            runner.bench('assets.mouth[one gif]', lambda: build.expand_mouth(str(source)), number=1)
+            build.ATLAS_ROOT = tmp / 'atlases'
+            runner.bench('assets.atlas[cat]', lambda: build.build_atlas('cat'), number=1)
+            build.ATLAS_ROOT = atlas_root
+            runner.bench('assets.pack', build.build_pack, number=1)
+    finally:
+        build.ATLAS_ROOT, build.BUNDLE_PATH = atlas_root, bundle_path
+
+
+BENCHMARKS = {
+    'tick': bench_tick,
+    'physics': bench_physics,
+    'grid': bench_grid,
+    'effects': bench_effects,
+    'frames': bench_frames,
+    'assets': bench_assets,
+}
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+def compare(results, baseline, tolerance, key='min_us'):
+    """Print current vs baseline timings; return the names that regressed."""
+    regressions = []
+    print(f'\n{"benchmark (" + key + ")":<40} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f'{name:<40} {"-":>12} {current[key]:>12.2f}      new')
+            continue
+        ratio = current[key] / base[key] if base[key] else 1.0
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            flag = '  faster'
+        print(f'{name:<40} {base[key]:>12.2f} {current[key]:>12.2f} {ratio - 1:>+8.0%}{flag}')
+    return regressions
+
+
+def metadata():
+    from PyQt5.QtCore import QT_VERSION_STR
+    return {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'qt': QT_VERSION_STR,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'qpa': os.environ.get('QT_QPA_PLATFORM'),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--group', action='append', choices=GROUPS, dest='groups',
+                        help='only run this group (repeatable); default: every group')
+    parser.add_argument('--filter', help='only run benchmarks whose name contains this text')
+    parser.add_argument('--repeat', type=int, default=7, help='timed repeats per benchmark')
+    parser.add_argument('--quick', action='store_true', help='fewer calls per repeat (smoke run)')
+    parser.add_argument('--json', metavar='PATH', help='write results as JSON')
+    parser.add_argument('--baseline', metavar='PATH',
+                        help='compare against this baseline JSON (recorded on this machine)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f'store these results as the baseline (--baseline PATH, default: {DEFAULT_BASELINE})')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed slowdown before it counts as a regression (0.3 = 30%%)')
+    args = parser.parse_args(argv)
+
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    runner = Runner(args.repeat, 0.2 if args.quick else 1.0, args.filter)
+    for group in args.groups or GROUPS:
+        BENCHMARKS[group](runner, app)
+
+    report = {'meta': metadata(), 'results': runner.results}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'wrote {args.json}')
+
+    if args.save_baseline:
+        baseline_path = Path(args.baseline or DEFAULT_BASELINE)
+        # Keep baseline entries for benchmarks that were not part of this run
+        stored = {}
+        if baseline_path.exists():
+            stored = json.loads(baseline_path.read_text(encoding='utf-8')).get('results', {})
+        stored.update(runner.results)
+        baseline_path.write_text(json.dumps({'meta': report['meta'], 'results': stored}, indent=2) + '\n',
+                                 encoding='utf-8')
+        print(f'saved baseline {baseline_path}')
+        return 0
+    if args.baseline:
+        baseline_path = Path(args.baseline)
+        if not baseline_path.exists():
+            print(f'baseline {baseline_path} not found (record one with --save-baseline)')
+            return 2
+        baseline = json.loads(baseline_path.read_text(encoding='utf-8'))
+        print(f'\ncomparing against {baseline_path} ({baseline["meta"].get("date")}, '
+              f'{baseline["meta"].get("machine")})')
+        regressions = compare(runner.results, baseline['results'], args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
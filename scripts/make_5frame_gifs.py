@@ -1,13 +1,66 @@
 #!/usr/bin/env python3
-"""Expand non-cat pet GIFs to smooth 5-frame open/close mouth loops."""
+"""Build-time asset compiler for pet animations.
+
+Stages:
+  mouth  - expand non-cat pet GIFs to smooth 5-frame open/close mouth loops
+  atlas  - pack every pet's GIF frames into one sprite sheet per pet, pre-scaled
+           to the sizes allowed by PET_SIZE_SETTINGS, plus a JSON manifest
+  pack   - write every GIF and atlas into the single-file bundle (assets.pack)
+           that the app reads through mmap
+
+Work fans out over a process pool (one job per pet and unique source GIF).
+assets/.build_stamp.json records input/output hashes and build parameters so
+unchanged assets are skipped on the next run; pass --force to rebuild anyway.
+"""
 from PIL import Image, ImageDraw, ImageFilter
+import argparse
+import hashlib
+import io
+import json
 import math
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
 
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from config import SUPPORTED_PETS, ACTIVITIES, PET_SIZE_SETTINGS, ASSET_BUNDLE  # noqa: E402
+from asset_bundle import write_bundle  # noqa: E402
+
 PETS = ['dog', 'bird', 'rabbit', 'hamster']
 ROOT = Path(__file__).resolve().parents[1] / 'assets' / 'animations'
+ATLAS_ROOT = ROOT.parent / 'atlases'
+STAMP_PATH = ROOT.parent / '.build_stamp.json'
+BUNDLE_PATH = ROOT.parents[1] / ASSET_BUNDLE
 SCALES = [0.0, 0.35, 1.0, 0.45, 0.08]
 DURATION_MS = 80
+ATLAS_VERSION = 1
+ATLAS_STEP = 50
+
+# Wall-clock seconds spent per stage, reported at the end of a run
+STAGE_TIMES = defaultdict(float)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_TIMES[stage] += time.perf_counter() - start
+
+
+def report_timings():
+    if not STAGE_TIMES:
+        return
+    print('stage timings:')
+    for stage, seconds in STAGE_TIMES.items():
+        print(f'  {stage:<8} {seconds * 1000:9.1f} ms')
 
 
 def load_all(path):
@@ -19,71 +72,97 @@ def load_all(path):
     return frames
 
 
+def load_durations(path):
+    im = Image.open(path)
+    durations = []
+    for i in range(im.n_frames):
+        im.seek(i)
+        durations.append(int(im.info.get('duration') or 100))
+    return durations
+
+
+def _dark_mask(px, threshold):
+    """Opaque pixels whose RGB sum is below threshold (px is an int32 HxWx4 array)."""
+    return (px[..., 3] > 200) & (px[..., :3].sum(axis=2) < threshold)
+
+
 def pick_closed_open(frames):
     scores = []
     for f in frames:
-        px = f.load()
         w, h = f.size
-        dark = 0
-        for y in range(int(h * 0.4), h):
-            for x in range(int(w * 0.2), int(w * 0.8)):
-                r, g, b, a = px[x, y]
-                if a > 200 and (r + g + b) < 90:
-                    dark += 1
-        scores.append(dark)
+        region = np.asarray(f, dtype=np.int32)[int(h * 0.4):h, int(w * 0.2):int(w * 0.8)]
+        scores.append(int(np.count_nonzero(_dark_mask(region, 90))))
     open_i = max(range(len(scores)), key=lambda i: scores[i])
     closed_i = min(range(len(scores)), key=lambda i: scores[i])
     return frames[closed_i].copy(), frames[open_i].copy()
 
 
 def mouth_diff_info(closed, open_img):
-    cp = closed.load()
-    op = open_img.load()
+    cp = np.asarray(closed, dtype=np.int32)
+    op = np.asarray(open_img, dtype=np.int32)
     w, h = closed.size
-    pts = []
-    for y in range(h):
-        for x in range(w):
-            r2, g2, b2, a2 = op[x, y]
-            r1, g1, b1, a1 = cp[x, y]
-            open_dark = a2 > 200 and (r2 + g2 + b2) < 100
-            closed_dark = a1 > 200 and (r1 + g1 + b1) < 100
-            if open_dark and not closed_dark:
-                pts.append((x, y))
-            elif open_dark and closed_dark and (r1 + g1 + b1) - (r2 + g2 + b2) > 40:
-                pts.append((x, y))
-    if len(pts) < 20:
-        for y in range(int(h * 0.45), h):
-            for x in range(int(w * 0.25), int(w * 0.75)):
-                r2, g2, b2, a2 = op[x, y]
-                if a2 > 200 and (r2 + g2 + b2) < 90:
-                    pts.append((x, y))
-    if not pts:
+    sum_closed = cp[..., :3].sum(axis=2)
+    sum_open = op[..., :3].sum(axis=2)
+    open_dark = (op[..., 3] > 200) & (sum_open < 100)
+    closed_dark = (cp[..., 3] > 200) & (sum_closed < 100)
+    # Pixels that turn dark, or get clearly darker, when the mouth opens
+    ys, xs = np.nonzero(open_dark & (~closed_dark | (sum_closed - sum_open > 40)))
+    if len(xs) < 20:
+        y0, x0 = int(h * 0.45), int(w * 0.25)
+        fy, fx = np.nonzero(_dark_mask(op[y0:h, x0:int(w * 0.75)], 90))
+        ys = np.concatenate([ys, fy + y0])
+        xs = np.concatenate([xs, fx + x0])
+    if not len(xs):
         return w / 2, h * 0.72, min(w, h) * 0.2
-    cx = sum(p[0] for p in pts) / len(pts)
-    cy = sum(p[1] for p in pts) / len(pts)
-    dists = sorted(math.hypot(x - cx, y - cy) for x, y in pts)
-    rad = dists[int(len(dists) * 0.92)] * 1.12
+    cx = int(xs.sum()) / len(xs)
+    cy = int(ys.sum()) / len(ys)
+    dists = np.hypot(xs - cx, ys - cy)
+    k = int(len(dists) * 0.92)
+    i = np.argsort(dists, kind='stable')[k]
+    rad = math.hypot(xs[i] - cx, ys[i] - cy) * 1.12
     return cx, cy, max(rad, 8)
 
 
-def make_frame(closed, open_img, scale, cx, cy, max_r):
-    if scale <= 0.05:
-        return closed.copy()
-    if scale >= 0.97:
-        return open_img.copy()
-    out = closed.copy()
-    r = max(2.0, max_r * scale)
-    mask = Image.new('L', closed.size, 0)
+def _mouth_mask(size, cx, cy, r):
+    mask = Image.new('L', size, 0)
     draw = ImageDraw.Draw(mask)
     draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=255)
-    mask = mask.filter(ImageFilter.GaussianBlur(radius=1.2))
-    out.paste(open_img, (0, 0), mask)
-    return out
+    return np.asarray(mask.filter(ImageFilter.GaussianBlur(radius=1.2)), dtype=np.uint32)
+
+
+def make_frames(closed, open_img, scales, cx, cy, max_r):
+    """Blend open/closed mouth frames for every scale in one batched array op."""
+    frames = [None] * len(scales)
+    blend = []
+    for i, scale in enumerate(scales):
+        if scale <= 0.05:
+            frames[i] = closed.copy()
+        elif scale >= 0.97:
+            frames[i] = open_img.copy()
+        else:
+            blend.append(i)
+    if blend:
+        masks = np.stack([_mouth_mask(closed.size, cx, cy, max(2.0, max_r * scales[i])) for i in blend])
+        masks = masks[..., None]
+        cp = np.asarray(closed, dtype=np.uint32)[None]
+        op = np.asarray(open_img, dtype=np.uint32)[None]
+        # Same rounding as PIL's Image.paste with an "L" mask
+        tmp = cp * (255 - masks) + op * masks + 128
+        out = (((tmp >> 8) + tmp) >> 8).astype(np.uint8)
+        for j, i in enumerate(blend):
+            frames[i] = Image.fromarray(out[j], 'RGBA')
+    return frames
+
+
+def make_frame(closed, open_img, scale, cx, cy, max_r):
+    return make_frames(closed, open_img, [scale], cx, cy, max_r)[0]
 
 
 def save_gif(frames, path):
+    """Write frames as a looping GIF to a path or a binary file object."""
     frames[0].save(
         path,
+        format='GIF',
         save_all=True,
         append_images=frames[1:],
         duration=DURATION_MS,
@@ -93,15 +172,213 @@ def save_gif(frames, path):
     )
 
 
-def main():
-    for pet in PETS:
+def file_hash(path):
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+def load_stamp():
+    try:
+        with open(STAMP_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_stamp(stamp):
+    with open(STAMP_PATH, 'w', encoding='utf-8') as f:
+        json.dump(stamp, f, indent=1, sort_keys=True)
+
+
+def mouth_params():
+    return {'scales': SCALES, 'duration_ms': DURATION_MS}
+
+
+def atlas_params():
+    return {'version': ATLAS_VERSION, 'sizes': atlas_sizes()}
+
+
+def expand_mouth(gif_path):
+    """Worker: build the 5-frame loop for one source GIF, return (gif bytes, stage times)."""
+    STAGE_TIMES.clear()
+    with timed('load'):
+        frames = load_all(gif_path)
+    with timed('pick'):
+        closed, open_img = pick_closed_open(frames)
+    with timed('mouth'):
+        cx, cy, max_r = mouth_diff_info(closed, open_img)
+    with timed('frames'):
+        new_frames = make_frames(closed, open_img, SCALES, cx, cy, max_r)
+    with timed('save'):
+        buf = io.BytesIO()
+        save_gif(new_frames, buf)
+    return buf.getvalue(), dict(STAGE_TIMES)
+
+
+def merge_times(times):
+    for stage, seconds in times.items():
+        STAGE_TIMES[stage] += seconds
+
+
+def build_mouth(pool, pets, stamp, force=False):
+    """Expand each unique source GIF once and write the result to every identical copy."""
+    records = stamp.setdefault('mouth', {})
+    params = mouth_params()
+    jobs = {}
+    for pet in pets:
+        groups = defaultdict(list)
         for gif_path in sorted((ROOT / pet).glob('*.gif')):
-            frames = load_all(gif_path)
-            closed, open_img = pick_closed_open(frames)
-            cx, cy, max_r = mouth_diff_info(closed, open_img)
-            new_frames = [make_frame(closed, open_img, s, cx, cy, max_r) for s in SCALES]
-            save_gif(new_frames, gif_path)
-            print(f'wrote {gif_path.relative_to(ROOT)} ({Image.open(gif_path).n_frames} frames)')
+            groups[file_hash(gif_path)].append(gif_path)
+        for digest, paths in groups.items():
+            keys = [str(p.relative_to(ROOT).as_posix()) for p in paths]
+            fresh = all(
+                records.get(k, {}).get('output') == digest and records[k].get('params') == params
+                for k in keys
+            )
+            if fresh and not force:
+                print(f'up to date {pet} ({len(paths)} files, {digest[:12]})')
+                continue
+            jobs[pool.submit(expand_mouth, str(paths[0]))] = (digest, paths, keys)
+
+    for future, (digest, paths, keys) in jobs.items():
+        data, times = future.result()
+        merge_times(times)
+        out_digest = hashlib.sha1(data).hexdigest()
+        for gif_path, key in zip(paths, keys):
+            gif_path.write_bytes(data)
+            records[key] = {'input': digest, 'output': out_digest, 'params': params}
+        print(f'wrote {len(paths)} x {keys[0].split("/")[0]} ({digest[:12]} -> {out_digest[:12]})')
+
+
+def atlas_sizes():
+    """Square sizes baked into every atlas, stepping through the allowed range."""
+    lo = max(PET_SIZE_SETTINGS['min_width'], PET_SIZE_SETTINGS['min_height'])
+    hi = min(PET_SIZE_SETTINGS['max_width'], PET_SIZE_SETTINGS['max_height'])
+    sizes = set(range(lo, hi + 1, ATLAS_STEP))
+    sizes.update({hi, PET_SIZE_SETTINGS['default_width']})
+    return sorted(sizes)
+
+
+def activity_of(name):
+    for activity in ACTIVITIES:
+        if name.startswith(f'{activity}_'):
+            return activity
+    return None
+
+
+def build_atlas(pet):
+    """Write atlases/<pet>.png + <pet>.json from assets/animations/<pet>/*.gif."""
+    src_dir = ROOT / pet
+    activities = {}
+    sequences = {}
+    for gif_path in sorted(src_dir.glob('*.gif')):
+        activity = activity_of(gif_path.name)
+        if activity is None:
+            continue
+        digest = hashlib.sha1(gif_path.read_bytes()).hexdigest()
+        activities.setdefault(activity, {})[gif_path.name] = digest
+        if digest not in sequences:
+            sequences[digest] = (load_all(gif_path), load_durations(gif_path))
+    if not sequences:
+        print(f'skip {pet}: no GIFs in {src_dir}')
+        return None
+
+    sizes = atlas_sizes()
+    total_frames = sum(len(frames) for frames, _ in sequences.values())
+    sheet = Image.new('RGBA', (total_frames * sizes[-1], sum(sizes)), (0, 0, 0, 0))
+    manifest_sequences = {
+        digest: {'durations': durations, 'frames': {}}
+        for digest, (_, durations) in sequences.items()
+    }
+    y = 0
+    for size in sizes:
+        x = 0
+        key = f'{size}x{size}'
+        for digest, (frames, _) in sequences.items():
+            rects = []
+            for frame in frames:
+                sheet.paste(frame.resize((size, size), Image.LANCZOS), (x, y))
+                rects.append([x, y, size, size])
+                x += size
+            manifest_sequences[digest]['frames'][key] = rects
+        y += size
+
+    ATLAS_ROOT.mkdir(parents=True, exist_ok=True)
+    image_name = f'{pet}.png'
+    sheet.save(ATLAS_ROOT / image_name, optimize=True)
+    manifest = {
+        'version': ATLAS_VERSION,
+        'pet': pet,
+        'image': image_name,
+        'sizes': [[s, s] for s in sizes],
+        'sequences': manifest_sequences,
+        'activities': activities,
+    }
+    with open(ATLAS_ROOT / f'{pet}.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    print(f'wrote atlases/{image_name} ({len(sequences)} unique GIFs, {total_frames} frames, sizes {sizes})')
+    return {name: digest for files in activities.values() for name, digest in files.items()}
+
+
+def atlas_job(pet):
+    """Worker: build one pet's atlas, return (input hashes, stage times)."""
+    STAGE_TIMES.clear()
+    with timed('atlas'):
+        inputs = build_atlas(pet)
+    return inputs, dict(STAGE_TIMES)
+
+
+def build_atlases(pool, pets, stamp, force=False):
+    records = stamp.setdefault('atlas', {})
+    params = atlas_params()
+    jobs = {}
+    for pet in pets:
+        inputs = {p.name: file_hash(p) for p in sorted((ROOT / pet).glob('*.gif')) if activity_of(p.name)}
+        record = records.get(pet, {})
+        outputs_exist = (ATLAS_ROOT / f'{pet}.png').exists() and (ATLAS_ROOT / f'{pet}.json').exists()
+        if not force and outputs_exist and record.get('inputs') == inputs and record.get('params') == params:
+            print(f'up to date atlases/{pet}.png')
+            continue
+        jobs[pool.submit(atlas_job, pet)] = pet
+    for future, pet in jobs.items():
+        inputs, times = future.result()
+        merge_times(times)
+        if inputs is not None:
+            records[pet] = {'inputs': inputs, 'params': params}
+
+
+def build_pack():
+    """Bundle every pet GIF plus the atlases, with names relative to assets/."""
+    assets = ROOT.parent
+    names = [p.relative_to(assets).as_posix() for p in sorted(ROOT.glob('*/*.gif'))]
+    names += [p.relative_to(assets).as_posix() for p in sorted(ATLAS_ROOT.glob('*')) if p.suffix in ('.json', '.png')]
+    with timed('pack'):
+        files, blobs, size = write_bundle(str(BUNDLE_PATH), str(assets), names)
+    print(f'wrote {BUNDLE_PATH.name} ({files} files, {blobs} unique blobs, {size} bytes)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stage', choices=['mouth', 'atlas', 'pack', 'all'], default='all')
+    parser.add_argument('--pet', action='append', dest='pets', metavar='NAME',
+                        help='only build this pet (repeatable); default: every pet')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--force', action='store_true', help='ignore the build stamp and rebuild')
+    args = parser.parse_args(argv)
+
+    atlas_pets = args.pets or list(SUPPORTED_PETS)
+    mouth_pets = [p for p in (args.pets or PETS) if p in PETS]
+    stamp = load_stamp()
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        try:
+            if args.stage in ('mouth', 'all'):
+                build_mouth(pool, mouth_pets, stamp, args.force)
+            if args.stage in ('atlas', 'all'):
+                build_atlases(pool, atlas_pets, stamp, args.force)
+        finally:
+            save_stamp(stamp)
+    if args.stage in ('pack', 'all'):
+        build_pack()
+    report_timings()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,206 @@
+# spatial_grid.py - Lưới băm không gian đều: tra cứu va chạm và pet lân cận mà không so từng cặp
+#
+# Không phụ thuộc Qt: PetWorld (app) và headless_sim dùng chung. Khóa là đối tượng bất kỳ
+# (Pet, SimulatedPet...), mỗi khóa ứng với một hình chữ nhật (x, y, width, height) toạ độ toàn cục.
+from pet_core import THROW_MIN_SPEED
+
+# Cạnh ô lưới (px): cỡ một pet mặc định, mỗi pet thường chỉ nằm trong 1-4 ô
+DEFAULT_CELL_SIZE = 128
+
+
+class SpatialHashGrid:
+    """Lưới ô vuông cell_size px, mỗi khóa được ghi vào mọi ô mà hình chữ nhật của nó chạm tới
+
+    update() chỉ chuyển ô khi hình chữ nhật sang ô khác (phần lớn khung hình pet chỉ nhích vài px
+    nên chỉ ghi lại toạ độ). Truy vấn chỉ xét các khóa trong những ô giao với vùng hỏi. Kết quả có
+    thứ tự ổn định (theo thứ tự vào ô), không phụ thuộc hash của khóa.
+    """
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self._cells = {}   # (cx, cy) -> {khóa: None} (dict giữ thứ tự)
+        self._items = {}   # khóa -> [x, y, width, height, (cx0, cy0, cx1, cy1), khoảng pixel của các ô đó]
+        self.cell_moves = 0  # Số lần một khóa phải chuyển ô
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def _span(self, x, y, width, height):
+        size = self.cell_size
+        return int(x // size), int(y // size), int((x + width) // size), int((y + height) // size)
+
+    def _link(self, key, span):
+        cells = self._cells
+        cx0, cy0, cx1, cy1 = span
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cells[(cx, cy)] = {key: None}
+                else:
+                    cell[key] = None
+
+    def _unlink(self, key, span):
+        cells = self._cells
+        cx0, cy0, cx1, cy1 = span
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells[(cx, cy)]
+                del cell[key]
+                if not cell:
+                    del cells[(cx, cy)]
+
+    def update(self, key, x, y, width, height):
+        """Thêm khóa hoặc cập nhật hình chữ nhật của nó"""
+        item = self._items.get(key)
+        if item is not None:
+            # Đường nhanh: các cạnh vẫn nằm trong những ô cũ -> chỉ ghi lại toạ độ (không phép chia)
+            x_lo, x_hi, y_lo, y_hi, r_lo, r_hi, b_lo, b_hi = item[5]
+            if x_lo <= x < x_hi and y_lo <= y < y_hi and r_lo <= x + width < r_hi and b_lo <= y + height < b_hi:
+                item[0] = x
+                item[1] = y
+                item[2] = width
+                item[3] = height
+                return
+        size = self.cell_size
+        span = cx0, cy0, cx1, cy1 = self._span(x, y, width, height)
+        # Khoảng pixel của ô chứa từng cạnh (trái, trên, phải, dưới)
+        bounds = (cx0 * size, cx0 * size + size, cy0 * size, cy0 * size + size,
+                  cx1 * size, cx1 * size + size, cy1 * size, cy1 * size + size)
+        if item is None:
+            self._items[key] = [x, y, width, height, span, bounds]
+            self._link(key, span)
+            return
+        if item[4] != span:
+            self._unlink(key, item[4])
+            self._link(key, span)
+            self.cell_moves += 1
+        item[:] = x, y, width, height, span, bounds
+
+    def remove(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self._unlink(key, item[4])
+
+    def clear(self):
+        self._cells.clear()
+        self._items.clear()
+
+    def rect(self, key):
+        """Hình chữ nhật (x, y, width, height) đã ghi của khóa (None nếu không có)"""
+        item = self._items.get(key)
+        return tuple(item[:4]) if item is not None else None
+
+    def query_rect(self, x, y, width, height, exclude=None):
+        """Các khóa có hình chữ nhật giao với vùng (x, y, width, height)"""
+        found = {}
+        items = self._items
+        cells = self._cells
+        cx0, cy0, cx1, cy1 = self._span(x, y, width, height)
+        right, bottom = x + width, y + height
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                for key in cell:
+                    if key in found or key is exclude:
+                        continue
+                    ix, iy, iw, ih, _, _ = items[key]
+                    if ix < right and x < ix + iw and iy < bottom and y < iy + ih:
+                        found[key] = None
+        return list(found)
+
+    def column(self, x, y0, y1):
+        """Các khóa trong những ô của cột chứa x, từ hàng chứa y0 tới hàng chứa y1
+
+        Chỉ là ứng viên (chưa so với hình chữ nhật, khóa trải nhiều hàng có thể lặp lại): dùng cho truy
+        vấn dọc một đường thẳng đứng ngắn, nhanh hơn query_rect vì không lọc trùng.
+        """
+        size = self.cell_size
+        cells = self._cells
+        cx = int(x // size)
+        found = []
+        for cy in range(int(y0 // size), int(y1 // size) + 1):
+            cell = cells.get((cx, cy))
+            if cell is not None:
+                found.extend(cell)
+        return found
+
+    def within(self, x, y, radius, exclude=None):
+        """Các (khóa, khoảng cách) có tâm cách điểm (x, y) không quá radius, gần nhất trước"""
+        found = {}
+        items = self._items
+        cells = self._cells
+        limit = radius * radius
+        cx0, cy0, cx1, cy1 = self._span(x - radius, y - radius, 2 * radius, 2 * radius)
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    continue
+                for key in cell:
+                    if key in found or key is exclude:
+                        continue
+                    ix, iy, iw, ih, _, _ = items[key]
+                    ddx = ix + iw / 2 - x
+                    ddy = iy + ih / 2 - y
+                    distance_sq = ddx * ddx + ddy * ddy
+                    if distance_sq <= limit:
+                        found[key] = distance_sq
+        # sorted ổn định: khoảng cách bằng nhau thì giữ thứ tự tìm thấy
+        return sorted(((key, distance_sq ** 0.5) for key, distance_sq in found.items()), key=lambda item: item[1])
+
+    def nearest(self, x, y, radius, exclude=None):
+        """Khóa có tâm gần điểm (x, y) nhất trong bán kính radius: (khóa, khoảng cách) hoặc None"""
+        found = self.within(x, y, radius, exclude)
+        return found[0] if found else None
+
+    def pairs(self):
+        """Mọi cặp khóa có hình chữ nhật giao nhau, mỗi cặp một lần
+
+        Hai hình giao nhau có thể cùng nằm trong nhiều ô; cặp chỉ được báo ở ô chứa góc trên-trái
+        của phần giao, nên không cần tập hợp để lọc trùng.
+        """
+        result = []
+        items = self._items
+        size = self.cell_size
+        for (cx, cy), cell in self._cells.items():
+            if len(cell) < 2:
+                continue
+            keys = list(cell)
+            for i, a in enumerate(keys):
+                ax, ay, aw, ah, _, _ = items[a]
+                for b in keys[i + 1:]:
+                    bx, by, bw, bh, _, _ = items[b]
+                    if (ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+                            and int(max(ax, bx) // size) == cx and int(max(ay, by) // size) == cy):
+                        result.append((a, b))
+        return result
+
+
+def find_knocks(grid, movers):
+    """Va chạm khi pet đang bị ném bay vào pet khác: danh sách (pet ném, pet bị va)
+
+    movers là các pet vừa bước vật lý (khóa trong grid, có thuộc tính motion). Chỉ pet đang nảy đủ
+    nhanh mới va được; pet bị va phải đang không bị kéo, không nảy và không chết. Mỗi pet bị va tối
+    đa một lần mỗi bước; người gọi áp dụng va chạm bằng PetMotion.knock() rồi ném pet bị va.
+    """
+    knocks = []
+    hit = set()
+    min_speed_sq = THROW_MIN_SPEED * THROW_MIN_SPEED
+    for pet in movers:
+        motion = pet.motion
+        if not motion.is_bouncing or motion.dx * motion.dx + motion.dy * motion.dy < min_speed_sq:
+            continue
+        for other in grid.query_rect(motion.x, motion.y, motion.width, motion.height, exclude=pet):
+            if other in hit:
+                continue
+            target = other.motion
+            if target.is_bouncing or target.is_dragging or target.current_activity == 'die':
+                continue
+            hit.add(other)
+            knocks.append((pet, other))
+    return knocks
@@ -0,0 +1,268 @@
+# surfaces.py - Mặt đứng cho pet từ cạnh trên các cửa sổ desktop: nguồn cửa sổ thay được + chỉ mục không gian
+#
+# Nguồn cửa sổ (provider) chỉ cần một hàm windows() trả về [(id, (left, top, width, height)), ...]
+# theo thứ tự xếp chồng từ dưới lên trên (toạ độ toàn cục, tính cả khung/thanh tiêu đề) và close():
+#   FakeSurfaceProvider - danh sách cửa sổ trong bộ nhớ (mô phỏng headless, môi trường không có desktop)
+#   X11SurfaceProvider  - đọc cửa sổ thật qua python-xlib (tùy chọn, chỉ khi có X11)
+# SurfaceIndex nhận danh sách đó, tính các đoạn cạnh trên còn nhìn thấy (không bị cửa sổ phía trên che)
+# và chỉ cập nhật lưới không gian cho những đoạn thay đổi. Không phụ thuộc Qt.
+import os
+from spatial_grid import SpatialHashGrid
+from pet_log import get_logger
+
+try:
+    from Xlib import X, display as xdisplay
+    from Xlib.error import XError
+except ImportError:
+    xdisplay = None
+
+log = get_logger(__name__)
+
+HAVE_XLIB = xdisplay is not None
+PROVIDERS = ('auto', 'x11', 'fake', 'none')
+# Đoạn cạnh trên hẹp hơn chừng này (px) không dùng làm mặt đứng
+MIN_SURFACE_WIDTH = 40
+# Ô lưới của chỉ mục mặt đứng: cửa sổ lớn hơn pet nhiều
+SURFACE_CELL_SIZE = 256
+
+
+class Surface:
+    """Một đoạn cạnh trên cửa sổ pet đứng được: từ left tới right ở độ cao top"""
+    __slots__ = ('handle', 'key', 'left', 'right', 'top')
+
+    def __init__(self, handle, key, left, right, top):
+        self.handle = handle
+        self.key = key
+        self.left = left
+        self.right = right
+        self.top = top
+
+    def __repr__(self):
+        return f"Surface({self.handle}, {self.left}..{self.right} @ {self.top})"
+
+
+def visible_edges(windows):
+    """Các đoạn cạnh trên còn nhìn thấy: {(id cửa sổ, thứ tự đoạn): (left, right, top)}
+
+    windows theo thứ tự xếp chồng dưới lên trên; phần cạnh trên nằm dưới một cửa sổ phía trên bị cắt bỏ.
+    """
+    edges = {}
+    for i, (window_id, (left, top, width, height)) in enumerate(windows):
+        if width <= 0 or height <= 0:
+            continue
+        segments = [(left, left + width)]
+        for _, (a_left, a_top, a_width, a_height) in windows[i + 1:]:
+            if not (a_top <= top < a_top + a_height):
+                continue
+            a_right = a_left + a_width
+            clipped = []
+            for s_left, s_right in segments:
+                if a_right <= s_left or a_left >= s_right:
+                    clipped.append((s_left, s_right))
+                    continue
+                if s_left < a_left:
+                    clipped.append((s_left, a_left))
+                if a_right < s_right:
+                    clipped.append((a_right, s_right))
+            segments = clipped
+            if not segments:
+                break
+        n = 0
+        for s_left, s_right in segments:
+            if s_right - s_left >= MIN_SURFACE_WIDTH:
+                edges[(window_id, n)] = (s_left, s_right, top)
+                n += 1
+    return edges
+
+
+class SurfaceIndex:
+    """Chỉ mục các mặt đứng (cạnh trên cửa sổ) trong một SpatialHashGrid
+
+    sync(windows) so với lần trước và chỉ thêm/dời/xóa các đoạn thay đổi. Mỗi đoạn có một handle số
+    nguyên cố định trong suốt thời gian tồn tại (pet lưu handle của mặt đang đứng). landing() tìm mặt
+    đầu tiên pet rơi qua trong một bước, get() tra mặt theo handle, đều không duyệt mọi cửa sổ.
+    """
+    def __init__(self, cell_size=SURFACE_CELL_SIZE):
+        self.grid = SpatialHashGrid(cell_size)
+        self._by_key = {}
+        self._by_handle = {}
+        self._next_handle = 0
+        self._windows = None
+        self.syncs = 0
+        self.changes = 0
+
+    def __len__(self):
+        return len(self._by_handle)
+
+    def surfaces(self):
+        return list(self._by_handle.values())
+
+    def get(self, handle):
+        """Mặt đứng theo handle (None nếu đã mất: cửa sổ bị đóng, bị che hoặc thu nhỏ)"""
+        return self._by_handle.get(handle)
+
+    def sync(self, windows):
+        """Cập nhật theo danh sách cửa sổ mới, trả về tập handle đã dời hoặc đã mất"""
+        self.syncs += 1
+        # Phần lớn các lần đọc không có cửa sổ nào thay đổi
+        if windows == self._windows:
+            return set()
+        self._windows = windows
+        edges = visible_edges(windows)
+        changed = set()
+        grid = self.grid
+        for key, (left, right, top) in edges.items():
+            surface = self._by_key.get(key)
+            if surface is None:
+                surface = Surface(self._next_handle, key, left, right, top)
+                self._next_handle += 1
+                self._by_key[key] = surface
+                self._by_handle[surface.handle] = surface
+            elif surface.left == left and surface.right == right and surface.top == top:
+                continue
+            else:
+                surface.left, surface.right, surface.top = left, right, top
+                changed.add(surface.handle)
+            grid.update(surface.handle, left, top, right - left, 1)
+        for key in [key for key in self._by_key if key not in edges]:
+            surface = self._by_key.pop(key)
+            del self._by_handle[surface.handle]
+            grid.remove(surface.handle)
+            changed.add(surface.handle)
+        self.changes += len(changed)
+        return changed
+
+    def landing(self, x, from_bottom, to_bottom):
+        """Mặt đứng đầu tiên mà chân pet (tâm ngang x) đi qua khi rơi từ from_bottom xuống to_bottom"""
+        best = None
+        by_handle = self._by_handle
+        for handle in self.grid.column(x, from_bottom, to_bottom):
+            surface = by_handle[handle]
+            top = surface.top
+            if (from_bottom <= top <= to_bottom and surface.left <= x <= surface.right
+                    and (best is None or top < best.top)):
+                best = surface
+        return best
+
+
+class FakeSurfaceProvider:
+    """Danh sách cửa sổ trong bộ nhớ: cửa sổ thêm sau nằm trên (mô phỏng, môi trường không có desktop)"""
+    def __init__(self, windows=None):
+        self._windows = {}
+        for window_id, rect in (windows or []):
+            self.set_window(window_id, *rect)
+
+    def set_window(self, window_id, left, top, width, height):
+        """Thêm cửa sổ (lên trên cùng) hoặc dời/đổi kích thước cửa sổ đã có (giữ thứ tự xếp chồng)"""
+        self._windows[window_id] = (left, top, width, height)
+
+    def remove_window(self, window_id):
+        self._windows.pop(window_id, None)
+
+    def raise_window(self, window_id):
+        rect = self._windows.pop(window_id, None)
+        if rect is not None:
+            self._windows[window_id] = rect
+
+    def windows(self):
+        return list(self._windows.items())
+
+    def close(self):
+        pass
+
+
+class X11SurfaceProvider:
+    """Cửa sổ thật trên X11 qua python-xlib: _NET_CLIENT_LIST_STACKING của window manager
+
+    Bỏ qua cửa sổ của chính process này (các pet), cửa sổ đang thu nhỏ/ẩn, ở desktop ảo khác,
+    và cửa sổ loại desktop/dock. Kích thước tính cả khung cửa sổ (_NET_FRAME_EXTENTS).
+    """
+    def __init__(self, display_name=None):
+        if xdisplay is None:
+            raise RuntimeError("X11SurfaceProvider cần python-xlib (pip install python-xlib)")
+        self.display = xdisplay.Display(display_name)
+        self.root = self.display.screen().root
+        atom = self.display.intern_atom
+        self._client_list = atom('_NET_CLIENT_LIST_STACKING')
+        self._wm_pid = atom('_NET_WM_PID')
+        self._wm_state = atom('_NET_WM_STATE')
+        self._state_hidden = atom('_NET_WM_STATE_HIDDEN')
+        self._wm_desktop = atom('_NET_WM_DESKTOP')
+        self._current_desktop = atom('_NET_CURRENT_DESKTOP')
+        self._wm_type = atom('_NET_WM_WINDOW_TYPE')
+        self._skip_types = {atom('_NET_WM_WINDOW_TYPE_DESKTOP'), atom('_NET_WM_WINDOW_TYPE_DOCK')}
+        self._frame_extents = atom('_NET_FRAME_EXTENTS')
+        self._pid = os.getpid()
+
+    def _property(self, window, name):
+        prop = window.get_full_property(name, X.AnyPropertyType)
+        return prop.value if prop is not None else None
+
+    def _visible(self, window, desktop):
+        pid = self._property(window, self._wm_pid)
+        if pid is not None and len(pid) and pid[0] == self._pid:
+            return False
+        state = self._property(window, self._wm_state)
+        if state is not None and self._state_hidden in state:
+            return False
+        window_types = self._property(window, self._wm_type)
+        if window_types is not None and self._skip_types.intersection(window_types):
+            return False
+        if desktop is not None:
+            window_desktop = self._property(window, self._wm_desktop)
+            # 0xFFFFFFFF: cửa sổ hiện trên mọi desktop ảo
+            if window_desktop is not None and len(window_desktop) and window_desktop[0] not in (desktop, 0xFFFFFFFF):
+                return False
+        return window.get_attributes().map_state == X.IsViewable
+
+    def windows(self):
+        ids = self._property(self.root, self._client_list)
+        current = self._property(self.root, self._current_desktop)
+        desktop = current[0] if current is not None and len(current) else None
+        result = []
+        for window_id in ids if ids is not None else []:
+            try:
+                window = self.display.create_resource_object('window', window_id)
+                if not self._visible(window, desktop):
+                    continue
+                geometry = window.get_geometry()
+                origin = self.root.translate_coords(window, 0, 0)
+                left, top = origin.x, origin.y
+                width, height = geometry.width, geometry.height
+                extents = self._property(window, self._frame_extents)
+                if extents is not None and len(extents) == 4:
+                    frame_left, frame_right, frame_top, frame_bottom = extents
+                    left -= frame_left
+                    top -= frame_top
+                    width += frame_left + frame_right
+                    height += frame_top + frame_bottom
+                result.append((window_id, (left, top, width, height)))
+            except XError:
+                # Cửa sổ vừa bị đóng giữa chừng
+                continue
+        return result
+
+    def close(self):
+        self.display.close()
+
+
+def create_surface_provider(name='auto'):
+    """Tạo nguồn cửa sổ theo tên ('auto', 'x11', 'fake', 'none'); None nếu tắt hoặc không dùng được
+
+    'auto' dùng X11 khi có python-xlib và đang chạy trong phiên X11 (DISPLAY), ngược lại tắt.
+    """
+    name = str(name).lower()
+    if name == 'none':
+        return None
+    if name == 'fake':
+        return FakeSurfaceProvider()
+    if name == 'auto' and not (HAVE_XLIB and os.environ.get('DISPLAY')):
+        return None
+    if name not in ('auto', 'x11'):
+        log.warning("Nguồn cửa sổ không hợp lệ: %s", name)
+        return None
+    try:
+        return X11SurfaceProvider()
+    except Exception as e:
+        log.warning("Không dùng được cửa sổ X11 làm mặt đứng: %s", e)
+        return None
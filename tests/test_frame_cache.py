@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt5.QtGui import QImage
+
+from animation_cache import FrameCache, FrameSet
+
+
+def _frame_set(size, count=1):
+    # QImage có width()/height() như QPixmap nhưng không cần QApplication
+    return FrameSet([QImage(size, size, QImage.Format_ARGB32) for _ in range(count)], [100] * count)
+
+
+def test_put_over_budget_evicts_least_recently_used_first():
+    one = _frame_set(10).nbytes
+    cache = FrameCache(budget_bytes=3 * one)
+    for key in 'abc':
+        cache.put(key, _frame_set(10))
+    assert cache.get('a') is not None      # a thành mới dùng nhất: b là cũ nhất
+    assert cache.get('x') is None
+    cache.put('d', _frame_set(10))
+    assert [key for key, _ in cache.items()] == ['c', 'a', 'd']
+    cache.put('e', _frame_set(10))
+    assert [key for key, _ in cache.items()] == ['a', 'd', 'e']
+    assert cache.get('b') is None
+    assert cache.get('d') is not None
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (2, 2)
+    assert stats['hit_rate'] == 0.5
+    assert (stats['evictions'], stats['evicted_bytes']) == (2, 2 * one)
+    assert (stats['entries'], stats['total_bytes']) == (3, 3 * one)
+
+    # Mục mới lớn hơn cả ngân sách vẫn được giữ (một mình nó)
+    big = _frame_set(10, count=5)
+    cache.put('big', big)
+    assert [key for key, _ in cache.items()] == ['big']
+    assert cache.total_bytes == big.nbytes
+    assert cache.stats()['evictions'] == 5
+
+    # Ghi đè một key không tính hai lần số byte
+    cache.put('big', _frame_set(10))
+    assert cache.total_bytes == one
+
+
+def test_set_budget_evicts_immediately():
+    one = _frame_set(10).nbytes
+    cache = FrameCache(budget_bytes=10 * one)
+    for key in range(6):
+        cache.put(key, _frame_set(10))
+    cache.get(0)
+    assert cache.stats()['evictions'] == 0
+
+    cache.set_budget(2 * one)
+    assert [key for key, _ in cache.items()] == [5, 0]
+    assert cache.total_bytes == 2 * one
+    assert cache.stats()['evictions'] == 4
+    assert cache.stats()['budget_bytes'] == 2 * one
+
+    cache.set_budget(0)
+    assert [key for key, _ in cache.items()] == [0]
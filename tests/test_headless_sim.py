@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pet_log import set_log_level
+from headless_sim import HeadlessSimulation, main
+
+
+def _run(batch):
+    sim = HeadlessSimulation(seed=7, trace_every=5, batch=batch, collisions=True, throws=12)
+    for _ in range(30):
+        sim.add_pet()
+    sim.run(120)
+    return sim
+
+
+def test_seeded_throws_knock_pets_same_in_batch_and_scalar():
+    set_log_level('ERROR')
+    scalar = _run(batch=False)
+    batch = _run(batch=True)
+    assert scalar.throws > 0
+    assert scalar.knocks > 0
+    assert (batch.throws, batch.knocks) == (scalar.throws, scalar.knocks)
+    assert batch.events == scalar.events
+    assert batch.trace == scalar.trace
+
+
+def test_throws_off_keeps_pets_untouched():
+    set_log_level('ERROR')
+    sim = HeadlessSimulation(seed=7, collisions=True)
+    for _ in range(30):
+        sim.add_pet()
+    sim.run(60)
+    assert sim.throws == 0
+    assert sim.knocks == 0
+
+
+def test_csv_write_failure_exits_non_zero(tmp_path, capsys):
+    set_log_level('ERROR')
+    missing = str(tmp_path / 'missing' / 'events.csv')
+    assert main(['--seconds', '5', '--seed', '1', '--events', missing]) == 1
+    assert capsys.readouterr().out == ''
+    trace = tmp_path / 'trace.csv'
+    assert main(['--seconds', '5', '--seed', '1', '--trace', str(trace)]) == 0
+    assert trace.read_text(encoding='utf-8').startswith('t,pet,x,y,activity')
@@ -0,0 +1,34 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pet_core import PetMotion, PATH_CLIMB, CLIMB_UP_SPEED, CLIMB_FALL_SPEED
+from surfaces import FakeSurfaceProvider, SurfaceIndex
+
+
+def test_climb_from_high_surface_goes_up_step_by_step():
+    # Cạnh trên cửa sổ ở y=60: cao hơn mọi độ cao leo (10% - 40% màn hình)
+    surfaces = SurfaceIndex()
+    surfaces.sync(FakeSurfaceProvider([(1, (0, 60, 1920, 400))]).windows())
+    for seed in range(20):
+        motion = PetMotion(100, 100, 1920, 1080, x=900, y=-80, rng=random.Random(seed), log=None,
+                           surfaces=surfaces)
+        motion.is_on_ground = False
+        while not motion.is_on_ground:
+            motion.fall_step()
+        assert motion.surface >= 0
+        floor = motion.ground_y
+        assert floor == 60 - 100
+
+        motion.begin_activity('climb')
+        assert motion.path == PATH_CLIMB
+        assert motion.path_ty < floor
+        assert motion.path_n2 > motion.path_n1
+        previous = motion.y
+        while motion.path == PATH_CLIMB:
+            motion.step()
+            assert previous - CLIMB_UP_SPEED <= motion.y <= previous + CLIMB_FALL_SPEED
+            assert motion.y <= floor
+            previous = motion.y
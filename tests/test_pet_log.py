@@ -0,0 +1,64 @@
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pet_log import CallSiteRateLimiter, RingBufferHandler, RATE_BURST, RATE_WINDOW_S
+
+
+class FakeClock:
+    """Đặt record.created theo giờ giả thay cho time.time()"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def record(self, msg, *args, lineno=10, pathname='pet_python.py'):
+        record = logging.LogRecord('pet.test', logging.INFO, pathname, lineno, msg, args, None)
+        record.created = self.now
+        return record
+
+
+def test_rate_limiter_drops_sixth_record_and_resumes_after_window():
+    clock = FakeClock()
+    limiter = CallSiteRateLimiter()
+    passed = []
+    for i in range(RATE_BURST + 1):
+        record = clock.record("Pet %s rơi", i)
+        if limiter.filter(record):
+            passed.append(record.getMessage())
+        clock.now += 0.5
+    assert passed == [f"Pet {i} rơi" for i in range(RATE_BURST)]
+    assert limiter.suppressed_total == 1
+
+    # Vị trí gọi khác không bị ảnh hưởng
+    assert limiter.filter(clock.record("Pet 9 rơi", lineno=11))
+
+    # Vẫn trong cửa sổ: tiếp tục bị bỏ
+    clock.now = 1000.0 + RATE_WINDOW_S - 0.1
+    assert not limiter.filter(clock.record("Pet %s rơi", 7))
+    # Hết cửa sổ: ghi lại, kèm số bản ghi đã bị bỏ
+    clock.now = 1000.0 + RATE_WINDOW_S
+    record = clock.record("Pet %s rơi", 8)
+    assert limiter.filter(record)
+    assert record.getMessage() == "Pet 8 rơi (bỏ qua 2 bản ghi lặp lại)"
+    assert limiter.suppressed_total == 2
+
+
+def test_rate_limiter_drops_exact_repeats_within_window():
+    clock = FakeClock()
+    limiter = CallSiteRateLimiter()
+    assert limiter.filter(clock.record("Lỗi khi load: %s", 'x'))
+    clock.now += 1
+    assert not limiter.filter(clock.record("Lỗi khi load: %s", 'x'))
+    assert limiter.filter(clock.record("Lỗi khi load: %s", 'y'))
+    clock.now += RATE_WINDOW_S
+    assert limiter.filter(clock.record("Lỗi khi load: %s", 'y'))
+
+
+def test_ring_buffer_keeps_only_newest_records():
+    clock = FakeClock()
+    ring = RingBufferHandler(capacity=3)
+    ring.setFormatter(logging.Formatter('%(message)s'))
+    for i in range(5):
+        ring.handle(clock.record("dòng %s", i))
+    assert list(ring.lines) == ["dòng 2", "dòng 3", "dòng 4"]
@@ -0,0 +1,123 @@
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial_grid import SpatialHashGrid, find_knocks
+
+
+def _cells_of(grid, rect):
+    x, y, width, height = rect
+    size = grid.cell_size
+    return {(cx, cy)
+            for cx in range(int(x // size), int((x + width) // size) + 1)
+            for cy in range(int(y // size), int((y + height) // size) + 1)}
+
+
+def _random_rect(rng):
+    return (rng.uniform(-300, 1500), rng.uniform(-300, 900), rng.choice((50, 100, 150, 200)),
+            rng.choice((50, 100, 150, 200)))
+
+
+def _overlaps(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def test_update_keeps_cell_membership_as_keys_move():
+    rng = random.Random(3)
+    grid = SpatialHashGrid(cell_size=128)
+    rects = {key: _random_rect(rng) for key in range(40)}
+    for key, rect in rects.items():
+        grid.update(key, *rect)
+    for _ in range(500):
+        key = rng.randrange(40)
+        x, y, width, height = rects[key]
+        if rng.random() < 0.7:
+            # Bước nhỏ như một khung hình, thường vẫn trong những ô cũ
+            rect = (x + rng.uniform(-6, 6), y + rng.uniform(-6, 6), width, height)
+        else:
+            rect = _random_rect(rng)
+        rects[key] = rect
+        grid.update(key, *rect)
+
+        expected = {}
+        for k, r in rects.items():
+            for cell in _cells_of(grid, r):
+                expected.setdefault(cell, set()).add(k)
+        assert {cell: set(keys) for cell, keys in grid._cells.items()} == expected
+        assert grid.rect(key) == rect
+    assert grid.cell_moves > 0
+
+    for key in range(0, 40, 2):
+        grid.remove(key)
+        del rects[key]
+    assert len(grid) == 20
+    assert set(k for keys in grid._cells.values() for k in keys) == set(rects)
+
+
+def test_queries_match_brute_force():
+    rng = random.Random(8)
+    grid = SpatialHashGrid(cell_size=128)
+    rects = {key: _random_rect(rng) for key in range(120)}
+    for key, rect in rects.items():
+        grid.update(key, *rect)
+
+    for _ in range(200):
+        area = _random_rect(rng)
+        exclude = rng.randrange(120)
+        expected = {k for k, r in rects.items() if k != exclude and _overlaps(r, area)}
+        found = grid.query_rect(*area, exclude=exclude)
+        assert len(found) == len(set(found))
+        assert set(found) == expected
+
+        x, y, radius = rng.uniform(-200, 1400), rng.uniform(-200, 800), rng.uniform(10, 400)
+        distances = {k: ((r[0] + r[2] / 2 - x) ** 2 + (r[1] + r[3] / 2 - y) ** 2) ** 0.5
+                     for k, r in rects.items() if k != exclude}
+        near = {k: d for k, d in distances.items() if d <= radius}
+        result = grid.within(x, y, radius, exclude=exclude)
+        assert {k for k, _ in result} == set(near)
+        assert [d for _, d in result] == sorted(d for _, d in result)
+        for k, d in result:
+            assert abs(d - near[k]) < 1e-9
+
+        nearest = grid.nearest(x, y, radius, exclude=exclude)
+        if near:
+            assert abs(nearest[1] - min(near.values())) < 1e-9
+        else:
+            assert nearest is None
+
+    expected_pairs = {frozenset((a, b)) for a in rects for b in rects if a < b and _overlaps(rects[a], rects[b])}
+    pairs = grid.pairs()
+    assert len(pairs) == len(expected_pairs)
+    assert {frozenset(pair) for pair in pairs} == expected_pairs
+
+
+class FakePet:
+    def __init__(self, name, motion):
+        self.name = name
+        self.motion = motion
+
+
+def _pet(name, x, y, dx=0.0, dy=0.0, bouncing=False, activity='idle'):
+    motion = SimpleNamespace(x=x, y=y, width=100, height=100, dx=dx, dy=dy, is_bouncing=bouncing,
+                             is_dragging=False, current_activity=activity)
+    return FakePet(name, motion)
+
+
+def test_find_knocks_skips_thrower_pairs_and_hits_each_pet_once():
+    grid = SpatialHashGrid()
+    thrower = _pet('thrower', 100, 100, dx=30, dy=-10, bouncing=True)
+    other_thrower = _pet('other_thrower', 150, 120, dx=-25, dy=5, bouncing=True)
+    slow = _pet('slow', 120, 300, dx=1, dy=1, bouncing=True)
+    standing = _pet('standing', 160, 160)
+    dead = _pet('dead', 90, 90, activity='die')
+    under_slow = _pet('under_slow', 130, 320)
+    pets = [thrower, other_thrower, slow, standing, dead, under_slow]
+    for pet in pets:
+        grid.update(pet, pet.motion.x, pet.motion.y, pet.motion.width, pet.motion.height)
+
+    knocks = find_knocks(grid, pets)
+    # Hai pet đang bị ném chồng lên nhau không hất nhau; pet đứng chỉ bị hất một lần (bởi pet ném đầu tiên)
+    assert [(a.name, b.name) for a, b in knocks] == [('thrower', 'standing')]
@@ -0,0 +1,81 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from surfaces import FakeSurfaceProvider, SurfaceIndex, visible_edges, MIN_SURFACE_WIDTH
+
+
+def _handles(index):
+    return {surface.key: surface.handle for surface in index.surfaces()}
+
+
+def test_window_partly_covered_splits_into_two_segments():
+    provider = FakeSurfaceProvider([(1, (100, 500, 800, 300)),
+                                    (2, (400, 450, 200, 200))])
+    edges = visible_edges(provider.windows())
+    # Cửa sổ 2 nằm trên, che đoạn 400..600 của cạnh trên cửa sổ 1
+    assert edges == {(1, 0): (100, 400, 500), (1, 1): (600, 900, 500), (2, 0): (400, 600, 450)}
+
+    # Cửa sổ nằm dưới không che cửa sổ phía trên
+    provider.raise_window(1)
+    edges = visible_edges(provider.windows())
+    assert edges == {(2, 0): (400, 600, 450), (1, 0): (100, 900, 500)}
+
+
+def test_segments_narrower_than_min_width_are_dropped():
+    gap = MIN_SURFACE_WIDTH - 1
+    provider = FakeSurfaceProvider([(1, (100, 500, 400, 300)),
+                                    (2, (100 + gap, 400, 400 - gap - MIN_SURFACE_WIDTH, 300)),
+                                    (3, (1000, 500, gap, 300))])
+    edges = visible_edges(provider.windows())
+    # Bên trái còn gap px (bị bỏ), bên phải còn đúng MIN_SURFACE_WIDTH px (giữ); cửa sổ 3 quá hẹp
+    assert edges == {(1, 0): (500 - MIN_SURFACE_WIDTH, 500, 500), (2, 0): (100 + gap, 500 - MIN_SURFACE_WIDTH, 400)}
+
+
+def test_sync_moves_only_the_moved_window_handle():
+    provider = FakeSurfaceProvider([(1, (0, 600, 500, 300)), (2, (800, 400, 500, 300))])
+    index = SurfaceIndex()
+    index.sync(provider.windows())
+    before = _handles(index)
+    assert len(before) == 2
+    assert index.sync(provider.windows()) == set()
+
+    provider.set_window(2, 820, 380, 500, 300)
+    changed = index.sync(provider.windows())
+    assert changed == {before[(2, 0)]}
+    assert _handles(index) == before
+    moved = index.get(before[(2, 0)])
+    assert (moved.left, moved.right, moved.top) == (820, 1320, 380)
+    assert index.landing(1000, 300, 500) is moved
+
+
+def test_sync_closing_a_window_removes_its_handle():
+    provider = FakeSurfaceProvider([(1, (0, 600, 500, 300)), (2, (800, 400, 500, 300))])
+    index = SurfaceIndex()
+    index.sync(provider.windows())
+    handles = _handles(index)
+
+    provider.remove_window(2)
+    assert index.sync(provider.windows()) == {handles[(2, 0)]}
+    assert index.get(handles[(2, 0)]) is None
+    assert index.get(handles[(1, 0)]) is not None
+    assert len(index) == 1
+    assert index.landing(1000, 300, 500) is None
+
+
+def test_landing_returns_highest_surface_crossed_in_one_step():
+    provider = FakeSurfaceProvider([(1, (0, 700, 1000, 300)),
+                                    (2, (200, 500, 400, 100)),
+                                    (3, (300, 300, 200, 100))])
+    index = SurfaceIndex(cell_size=128)
+    index.sync(provider.windows())
+    # Một bước rơi dài qua cả ba cạnh trên: đáp lên cạnh cao nhất (y nhỏ nhất)
+    landed = index.landing(400, 250, 800)
+    assert (landed.left, landed.right, landed.top) == (300, 500, 300)
+    # Bắt đầu dưới cạnh của cửa sổ 3: đáp lên cửa sổ 2
+    assert index.landing(400, 301, 800).top == 500
+    # Ngoài bề ngang cửa sổ 2 và 3: chỉ còn cửa sổ 1
+    assert index.landing(900, 250, 800).top == 700
+    # Bước không tới cạnh nào
+    assert index.landing(400, 310, 450) is None